@@ -2,6 +2,7 @@ import os
 import os.path
 import sys
 import importlib
+import importlib.util
 
 import warnings
 
@@ -31,21 +32,40 @@ __all__ = [
 
 from .core import config   # module
 
-from .core.rmap import get_cached_mapping, asmapping
 from .core.config import locate_mapping, locate_file
 
 from .core import exceptions
 from .core.exceptions import *
 from .core.constants import ALL_OBSERVATORIES, INSTRUMENT_KEYWORDS
 
-from .core.heavy_client import getreferences, getrecommendations
-from .core.heavy_client import get_symbolic_mapping, get_pickled_mapping
-from .core.heavy_client import get_context_name
+# ============================================================================
 
-from crds.client import api
-from crds.client import get_default_context
+'''The remaining package root attributes are loaded on first use with a module
+__getattr__() (PEP 562) so that a plain "import crds" does not pay for loading
+rmap, heavy_client, the web client,  and bestrefs along with their astropy and
+numpy dependencies.   The server proxy,  and hence the network setup, is likewise
+deferred until crds.api or one of the web client functions is first used.
+'''
 
-from crds.bestrefs import assign_bestrefs
+_LAZY_ATTRIBUTES = {
+    "get_cached_mapping" : "crds.core.rmap",
+    "asmapping" : "crds.core.rmap",
+    "getreferences" : "crds.core.heavy_client",
+    "getrecommendations" : "crds.core.heavy_client",
+    "get_symbolic_mapping" : "crds.core.heavy_client",
+    "get_pickled_mapping" : "crds.core.heavy_client",
+    "get_context_name" : "crds.core.heavy_client",
+    "get_default_context" : "crds.client",
+    "assign_bestrefs" : "crds.bestrefs",
+    }
+
+_LAZY_MODULES = {
+    "api" : "crds.client.api",
+    "client" : "crds.client",
+    "bestrefs" : "crds.bestrefs",
+    "misc" : "crds.misc",
+    "refactoring" : "crds.refactoring",
+    }
 
 # ============================================================================
 
@@ -56,17 +76,64 @@ is made more difficult by the inapplicability of namespace packages because this
 __init__ is not empty.
 
 The strategy employed here is to implement core packages normally in crds.core,
-then alias them into the top level crds namespace using importlib.import_module()
-and sys.modules to make it appear as if each core package has already been imported
-and belongs to the top level namespace.
+then alias them into the top level crds namespace with a meta path finder which
+resolves e.g. "import crds.rmap" to the module object of crds.core.rmap,  and
+with __getattr__() for attribute access like crds.rmap.   Aliased modules are
+only imported when first used.
 '''
+_ALIASED_MODULES = {}
+
 def _alias_subpackage_module(subpkg, modules):
     """Alias each module from `modules` of `subpkg` to appear in this
     namespace.
     """
     for module in modules:
-        globals()[module] = importlib.import_module(subpkg + "." + module)
-        sys.modules["crds." + module] = sys.modules[subpkg + "." + module]
+        _ALIASED_MODULES["crds." + module] = subpkg + "." + module
+
+class _AliasImporter:
+    """Meta path finder and loader which import aliased module names as their
+    sub-package modules.
+    """
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname in _ALIASED_MODULES:
+            origin = importlib.util.find_spec(_ALIASED_MODULES[fullname]).origin
+            return importlib.util.spec_from_loader(fullname, self, origin=origin)
+        return None
+
+    def create_module(self, spec):
+        return importlib.import_module(_ALIASED_MODULES[spec.name])
+
+    def exec_module(self, module):
+        pass
+
+    def is_package(self, fullname):
+        return False
+
+    def get_code(self, fullname):
+        """Support python -m for aliased modules,  running the sub-package module."""
+        name = _ALIASED_MODULES[fullname]
+        return importlib.util.find_spec(name).loader.get_code(name)
+
+if not any(isinstance(finder, _AliasImporter) for finder in sys.meta_path):
+    sys.meta_path.insert(0, _AliasImporter())
+
+def __getattr__(name):
+    """Load lazy package attributes and aliased modules on first use."""
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    elif name in _LAZY_MODULES:
+        value = importlib.import_module(_LAZY_MODULES[name])
+    elif "crds." + name in _ALIASED_MODULES:
+        value = importlib.import_module("crds." + name)
+    else:
+        raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_LAZY_MODULES) |
+                  {name[len("crds."):] for name in _ALIASED_MODULES})
 
 _CORE_MODULES = [
     "pysh",
@@ -125,4 +192,3 @@ _alias_subpackage_module("crds.misc", _MISC_MODULES)
 # ============================================================================
 
 URL = os.environ.get("CRDS_SERVER_URL", "https://crds-serverless-mode.stsci.edu")
-api.set_crds_server(URL)
@@ -12,7 +12,7 @@ from collections import namedtuple, OrderedDict
 # ===================================================================
 
 import crds
-from crds.core import log, config, utils, timestamp, cmdline, heavy_client
+from crds.core import log, config, utils, timestamp, cmdline, heavy_client, rmap
 from crds import diff, matches
 from . import table_effects, headers
 from crds.client import api
@@ -275,6 +275,9 @@ than errors as the default.
         config.ALLOW_BAD_RULES.set(self.args.allow_bad_rules)
         config.ALLOW_BAD_REFERENCES.set(self.args.allow_bad_references)
 
+        if self.args.bestref_cache_size is not None:
+            rmap.set_bestref_cache_size(self.args.bestref_cache_size)
+
         cmdline.UniqueErrorsMixin.__init__(self, *args, **keys)
 
         self.updates = OrderedDict()  # map of reference updates
@@ -534,6 +537,10 @@ than errors as the default.
         self.add_argument("-z", "--optimize-tables", action="store_true",
                           help="If set, apply row-based optimizations to screen out inconsequential table updates.")
 
+        self.add_argument("--bestref-cache-size", type=int, default=None,
+                          help="Memoize up to this many lookups per rmap for datasets sharing matching parameters.  "
+                          "Defaults to CRDS_BESTREF_CACHE_SIZE,  0 disables.")
+
         self.add_argument("--eliminate-duplicate-cases", action="store_true",
                           help="Categorize unique bestrefs results as errors to determine representative test cases...  Replaces normal error counts with coverage counts and ids.")
 
@@ -666,6 +673,9 @@ than errors as the default.
 
     def main(self):
         """Compute bestrefs for datasets."""
+        rmap.clear_bestref_cache_stats()
+        rmap.clear_mapping_intern_stats()
+        utils.clear_condition_value_memo()
         # Finish __init__() inside --pdb
         if self.complex_init():
             for i, dataset in enumerate(self.new_headers):
@@ -673,6 +683,7 @@ than errors as the default.
                     log.verbose(self.get_stat("datasets"), "sources processed", verbosity=5)
                 self.process(dataset)
             self.post_processing()
+        self.add_bestref_cache_stats()
         self.report_stats()
         if self.args.eliminate_duplicate_cases:
             log.warning("Running in --eliminate-duplicate-cases mode;  even successful bestrefs are categorized as errors for analysis.")
@@ -681,6 +692,27 @@ than errors as the default.
         log.standard_status()
         return log.errors()
 
+    def add_bestref_cache_stats(self):
+        """Add any rmap bestref cache hits, misses, and evictions to the script stats,
+        and report the hit rate of the header value conditioning memo.
+        """
+        for name, count in rmap.get_bestref_cache_stats().items():
+            if count:
+                self.increment_stat("bestref-cache-" + name, count)
+        condition_stats = utils.get_condition_value_stats()
+        for name in ["hits", "misses"]:
+            if condition_stats[name]:
+                self.increment_stat("condition-value-" + name, condition_stats[name])
+        if self.args.stats and condition_stats["hits"] + condition_stats["misses"]:
+            log.info("Header value conditioning memo hit rate {:.1%} for {} unique values.".format(
+                condition_stats["hit_rate"], condition_stats["size"]))
+        intern_stats = rmap.get_mapping_intern_stats(sizes=self.args.stats)
+        if intern_stats["shared"]:
+            self.increment_stat("interned-rmaps-shared", intern_stats["shared"])
+            if self.args.stats:
+                log.info("Contexts shared {} duplicate rmaps saving about {:.1f} MB.".format(
+                    intern_stats["shared"], intern_stats["bytes_saved"] / 2**20))
+
     def process(self, dataset):
         """Process best references for `dataset`,  printing dataset output,  collecting stats, trapping exceptions."""
         with log.error_on_exception("Failed processing", repr(dataset)):
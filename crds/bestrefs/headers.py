@@ -11,7 +11,7 @@ import gc
 # ===================================================================
 
 import crds
-from crds.core import log, utils, heavy_client
+from crds.core import log, utils, heavy_client, config
 from crds.core.exceptions import CrdsError
 from crds import data_file, matches
 from crds.client import api
@@ -294,17 +294,24 @@ class InstrumentHeaderGenerator(HeaderGenerator):
         return self.headers[source]
 
     def fetch_source_segment(self, source):
-        """Return the segment of dataset ids which surrounds id `source`."""
+        """Fetch the segment of dataset ids which surrounds id `source`.   When all
+        headers are kept for save_pickles,  also fetch the segments following it,
+        up to CRDS_RPC_BATCH_SIZE segments pipelined in one JSON-RPC batch.
+        """
         try:
             index = self.sources.index(source) // self.segment_size
         except ValueError as exc:
             raise CrdsError("Unknown dataset id " + repr(source)) from exc
         lower = index * self.segment_size
-        upper = (index + 1) * self.segment_size
-        segment_ids = self.sources[lower:upper]
-        log.verbose("Dumping", len(segment_ids), "datasets from indices", lower, "to",
-                    lower + len(segment_ids), verbosity=20)
-        dumped_headers = api.get_dataset_headers_by_id(self.context, segment_ids)
+        n_segments = max(config.RPC_BATCH_SIZE.get(), 1) if self.save_pickles else 1
+        upper = min((index + n_segments) * self.segment_size, len(self.sources))
+        segments = [self.sources[start : start + self.segment_size]
+                    for start in range(lower, upper, self.segment_size)]
+        log.verbose("Dumping", upper - lower, "datasets from indices", lower, "to", upper,
+                    "in", len(segments), "segments", verbosity=20)
+        dumped_headers = {}
+        for segment_headers in api.get_dataset_headers_by_id_batch(self.context, segments):
+            dumped_headers.update(segment_headers)
         log.verbose("Dumped", len(dumped_headers), "datasets", verbosity=20)
         if self.save_pickles:  # keep all headers,  causes memory problems with multiple instruments on ~8G ram.
             self.headers.update(dumped_headers)
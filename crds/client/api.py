@@ -8,10 +8,18 @@ import base64
 import re
 import zlib
 import html
-from urllib import request
 import warnings
 import json
 import ast
+import uuid
+import hashlib
+import contextlib
+from concurrent import futures
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
 
 # ==============================================================================
 
@@ -48,6 +56,7 @@ __all__ = [
     "get_flex_uri",
     "get_file_info",
     "get_file_info_map",
+    "get_file_info_map_unlimited",
     "get_sqlite_db",
 
     "get_mapping_names",
@@ -61,6 +70,7 @@ __all__ = [
     "cache_best_references",
 
     "get_dataset_headers_by_id",
+    "get_dataset_headers_by_id_batch",
     "get_dataset_headers_by_instrument",
     "get_dataset_ids",
     "get_best_references_by_ids",
@@ -222,6 +232,25 @@ def _get_file_info_map(observatory, files, fields):
     infos = S.get_file_info_map(observatory, files, fields)
     return infos
 
+MAX_FILES_PER_RPC = 5000
+
+def get_file_info_map_unlimited(observatory, files, fields=None):
+    """Return the info { filename : { info } } on `files` of `observatory`,
+    potentially more `files` than should be requested in a single JSONRPC call.
+    The files are requested in slices of MAX_FILES_PER_RPC pipelined in
+    JSON-RPC batches.   Not memory cached.
+    """
+    files = sorted(files)
+    if fields is not None:
+        fields = tuple(sorted(fields))
+    with S._batch() as batch:
+        calls = [batch.get_file_info_map(observatory, files[i : i + MAX_FILES_PER_RPC], fields)
+                 for i in range(0, len(files), MAX_FILES_PER_RPC)]
+    infos = {}
+    for call in calls:
+        infos.update(call.result())
+    return infos
+
 def get_total_bytes(info_map):
     """Return the total byte count of file info map `info_map`."""
     try:
@@ -406,6 +435,16 @@ def get_dataset_headers_by_id(context, dataset_ids, datasets_since=None):
     context = os.path.basename(context)
     return S.get_dataset_headers_by_id(context, dataset_ids, datasets_since)
 
+def get_dataset_headers_by_id_batch(context, id_slices, datasets_since=None):
+    """Return [ { dataset_id : { header } }, ...] for each list of dataset ids in
+    `id_slices`,  pipelining the get_dataset_headers_by_id() calls in JSON-RPC
+    batches.
+    """
+    context = os.path.basename(context)
+    with S._batch() as batch:
+        calls = [batch.get_dataset_headers_by_id(context, ids, datasets_since) for ids in id_slices]
+    return [call.result() for call in calls]
+
 def get_dataset_ids(context, instrument, datasets_since=None):
     """Return [ dataset_id, ...] for `instrument`."""
     context = os.path.basename(context)
@@ -434,12 +473,14 @@ def get_dataset_headers_unlimited(context, ids):
     `header` will be returned as a string / error message.
     """
     max_ids_per_rpc = get_server_info().get("max_headers_per_rpc", 500)
-    for i in range(0, len(ids), max_ids_per_rpc):
+    max_ids_per_batch = max_ids_per_rpc * max(config.RPC_BATCH_SIZE.get(), 1)
+    for i in range(0, len(ids), max_ids_per_batch):
         log.verbose("Dumping dataset headers", i , "of", len(ids), verbosity=20)
-        id_slice = ids[i : i + max_ids_per_rpc]
-        header_slice = get_dataset_headers_by_id(context, id_slice)
-        for item in header_slice.items():
-            yield item
+        id_slices = [ids[j : j + max_ids_per_rpc]
+                     for j in range(i, min(i + max_ids_per_batch, len(ids)), max_ids_per_rpc)]
+        for header_slice in get_dataset_headers_by_id_batch(context, id_slices):
+            for item in header_slice.items():
+                yield item
 
 def get_affected_datasets(observatory, old_context=None, new_context=None):
     """Return a structure describing the ids affected by the last context change."""
@@ -543,6 +584,29 @@ def observatory_from_string(string):
 
 # ==============================================================================
 
+def _lock_file(handle):
+    """Try to take an exclusive advisory lock on open file `handle` without
+    blocking,  returning True on success or where locking is unavailable.
+    The lock is released when `handle` is closed.
+    """
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+def remove_partial_download(path):
+    """Remove the partial download file at `path` unless a download in progress
+    holds its lock,  returning True IFF it was removed.
+    """
+    with open(path, "ab") as handle:
+        if not _lock_file(handle):
+            return False
+        os.remove(path)
+    return True
+
 def file_progress(activity, name, path, bytes, bytes_so_far, total_bytes, nth_file, total_files):
     """Output progress information for `activity` on file `name` at `path`."""
     return "{activity}  {path!s:<55}  {bytes} bytes  ({nth_file} / {total_files} files) ({bytes_so_far} / {total_bytes} bytes)".format(
@@ -619,31 +683,68 @@ class FileCacher:
         return int(self.info_map[os.path.basename(name)]["size"])
 
     def download_files(self, downloads, localpaths):
-        """Serial file-by-file download."""
+        """Download the files named in list `downloads` to dict `localpaths`,
+        returning the number of bytes downloaded.
+        """
         download_metadata = get_download_metadata()
         self.info_map = {}
         for filename in downloads:
             self.info_map[filename] = download_metadata.get(filename, "NOT FOUND unknown to server")
         if config.writable_cache_or_verbose("Readonly cache, skipping download of (first 5):", repr(downloads[:5]), verbosity=70):
-            bytes_so_far = 0
-            total_files = len(downloads)
-            total_bytes = get_total_bytes(self.info_map)
-            for nth_file, name in enumerate(downloads):
-                try:
-                    if "NOT FOUND" in self.info_map[name]:
-                        raise CrdsDownloadError("file is not known to CRDS server.")
-                    bytes, path = self.catalog_file_size(name), localpaths[name]
-                    log.info(file_progress("Fetching", name, path, bytes, bytes_so_far, total_bytes, nth_file, total_files))
-                    self.download(name, path)
-                    bytes_so_far += os.stat(path).st_size
-                except Exception as exc:
-                    if self.raise_exceptions:
-                        raise
-                    else:
-                        log.error("Failure downloading file", repr(name), ":", str(exc))
-            return bytes_so_far
+            return self.fetch_files(downloads, localpaths)
         return 0
 
+    def fetch_files(self, downloads, localpaths, threads=None):
+        """Download `downloads` described by self.info_map to `localpaths` with
+        up to `threads` concurrent downloads,  defaulting to CRDS_DOWNLOAD_THREADS.
+        Each file is retried,  verified,  and removed on failure individually
+        by download().   Returns the number of bytes downloaded.
+
+        Progress and failures are reported in the order of `downloads` with the
+        same messages and byte counts as a serial download.   When
+        raise_exceptions is set,  the first failure in that order cancels the
+        downloads which have not started and is re-raised after the others finish.
+        """
+        threads = min(threads or config.DOWNLOAD_THREADS.get(), len(downloads))
+        if threads <= 1:
+            return self.report_downloads(downloads, localpaths, {})
+        log.verbose("Downloading", len(downloads), "files with", threads, "threads.")
+        with futures.ThreadPoolExecutor(threads) as pool:
+            pending = { name : pool.submit(self.download, name, localpaths[name])
+                        for name in downloads if "NOT FOUND" not in self.info_map[name] }
+            try:
+                return self.report_downloads(downloads, localpaths, pending)
+            except BaseException:
+                for future in pending.values():
+                    future.cancel()
+                raise
+
+    def report_downloads(self, downloads, localpaths, pending):
+        """Download each of `downloads` in order,  or wait for its future in dict
+        `pending`,  logging progress and failures.   Returns the number of bytes
+        downloaded.
+        """
+        bytes_so_far = 0
+        total_files = len(downloads)
+        total_bytes = get_total_bytes(self.info_map)
+        for nth_file, name in enumerate(downloads):
+            try:
+                if "NOT FOUND" in self.info_map[name]:
+                    raise CrdsDownloadError("file is not known to CRDS server.")
+                bytes, path = self.catalog_file_size(name), localpaths[name]
+                log.info(file_progress("Fetching", name, path, bytes, bytes_so_far, total_bytes, nth_file, total_files))
+                if name in pending:
+                    pending[name].result()
+                else:
+                    self.download(name, path)
+                bytes_so_far += os.stat(path).st_size
+            except Exception as exc:
+                if self.raise_exceptions:
+                    raise
+                else:
+                    log.error("Failure downloading file", repr(name), ":", str(exc))
+        return bytes_so_far
+
     def download(self, name, localpath):
         """Download a single file."""
         # This code is complicated by the desire to blow away failed downloads.  For the specific
@@ -674,19 +775,104 @@ class FileCacher:
             log.verbose("Exception during file removal of", repr(localpath))
 
     def download_core(self, name, localpath):
-        """Download and verify file `name` under context `pipeline_context` to `localpath`."""
+        """Download and verify file `name` under context `pipeline_context` to `localpath`.
+
+        HTTP downloads are written to a hidden partial download file in the same
+        directory,  checksummed as they are written,  and renamed to `localpath`
+        only once verified,  so partially written files never appear at
+        `localpath`.   A partial download left by an earlier failed attempt,  in
+        this or a prior process,  is resumed with an HTTP Range request from its
+        last written byte.   A complete download which fails verification,  or an
+        empty one,  is removed so the next attempt starts over.   Partial downloads
+        which are never completed are removed by crds.sync --purge-references or
+        --purge-mappings.
+        """
         if config.get_download_plugin():
             self.plugin_download(name, localpath)
+            self.verify_file(name, localpath)
         else:
-            generator = self.get_data_http(name)
-            self.generator_download(generator, localpath)
-        self.verify_file(name, localpath)
+            with self.partial_download(localpath) as part_path:
+                try:
+                    offset = self.resume_offset(name, part_path)
+                    generator = self.get_data_http(name, offset)
+                    length, sha1sum = self.generator_download(generator, part_path, offset)
+                    try:
+                        self.verify_file(name, part_path, length, sha1sum)
+                    except Exception:
+                        if length >= self.catalog_file_size(name):   # complete but corrupt
+                            self.remove_file(part_path)
+                        raise
+                    os.replace(part_path, localpath)
+                except:   # including control-c,  drop partial downloads with nothing to resume
+                    if os.path.exists(part_path) and not os.path.getsize(part_path):
+                        self.remove_file(part_path)
+                    raise
+
+    @contextlib.contextmanager
+    def partial_download(self, localpath):
+        """Yield the path of the partial download file for `localpath`,  locked
+        against other processes downloading the same file.   If the partial
+        download is already locked,  yield a unique temporary path instead which
+        is removed on exit.
+        """
+        dirname, basename = os.path.split(localpath)
+        part_path = os.path.join(dirname, "." + basename + ".part")
+        with open(part_path, "ab") as part_file:   # create without truncating
+            if _lock_file(part_file):
+                yield part_path
+                return
+        log.verbose("Partial download", repr(part_path), "is locked,  downloading without resume.")
+        temp_path = self.download_temp_path(localpath)
+        try:
+            yield temp_path
+        finally:
+            if os.path.exists(temp_path):
+                self.remove_file(temp_path)
 
-    def generator_download(self, generator, localpath):
-        """Read all bytes from `generator` until file is downloaded to `localpath.`"""
-        with open(localpath, "wb+") as outfile:
+    def download_temp_path(self, localpath):
+        """Return a unique hidden path in the directory of `localpath` to download it to."""
+        dirname, basename = os.path.split(localpath)
+        return os.path.join(dirname, "." + basename + "." + uuid.uuid4().hex + ".tmp")
+
+    def resume_offset(self, name, part_path):
+        """Return the byte offset at which to resume downloading `name` into
+        partial download `part_path`,  or 0 to start over.
+        """
+        try:
+            offset = os.stat(part_path).st_size
+        except FileNotFoundError:
+            return 0
+        if offset > self.catalog_file_size(name):
+            log.verbose("Partial download", repr(part_path), "is larger than the server file,  starting over.")
+            return 0
+        if offset:
+            log.verbose("Resuming download of", repr(name), "at byte", offset)
+        return offset
+
+    def generator_download(self, generator, localpath, offset=0):
+        """Read all bytes from `generator` until file is downloaded to `localpath`
+        after its first `offset` bytes,  returning (length, sha1sum) of the whole
+        file.   sha1sum is None when CRDS_DOWNLOAD_CHECKSUMS is False.
+        """
+        xsum = hashlib.sha1() if config.get_checksum_flag() else None
+        with open(localpath, "r+b" if offset else "wb+") as outfile:
+            if xsum is not None:   # checksum the bytes already downloaded
+                remaining = offset
+                while remaining > 0:
+                    data = outfile.read(min(config.CRDS_CHECKSUM_BLOCK_SIZE, remaining))
+                    if not data:
+                        break
+                    xsum.update(data)
+                    remaining -= len(data)
+            outfile.seek(offset)
+            outfile.truncate()
+            length = offset
             for data in generator:
                 outfile.write(data)
+                length += len(data)
+                if xsum is not None:
+                    xsum.update(data)
+        return length, xsum.hexdigest() if xsum is not None else None
 
     def plugin_download(self, filename, localpath):
         """Run an external program defined by CRDS_DOWNLOAD_PLUGIN to download filename to localpath."""
@@ -706,15 +892,29 @@ class FileCacher:
                     "Plugin download fail status =", repr(status),
                     "with command:", srepr(plugin_cmd))
 
-    def get_data_http(self, filename):
-        """Yield the data returned from `filename` of `pipeline_context` in manageable chunks."""
+    def get_data_http(self, filename, offset=0):
+        """Yield the data returned from `filename` of `pipeline_context` in manageable chunks,
+        starting at byte `offset` of the file.
+        """
         url = self.get_url(filename)
+        if offset and offset >= self.catalog_file_size(filename):
+            return
         try:
-            infile = request.urlopen(url)
+            if offset:
+                infile = proxy.get_session().open(url, headers={"Range" : "bytes={}-".format(offset)})
+                skip = self.range_skip(url, infile, offset)
+            else:
+                infile = proxy.get_session().open(url)
+                skip = 0
             file_size = utils.human_format_number(self.catalog_file_size(filename)).strip()
             stats = utils.TimingStats()
             data = infile.read(config.CRDS_DATA_CHUNK_SIZE)
             while data:
+                if skip:
+                    data, skip = data[skip:], max(skip - len(data), 0)
+                    if not data:
+                        data = infile.read(config.CRDS_DATA_CHUNK_SIZE)
+                        continue
                 stats.increment("bytes", len(data))
                 status = stats.status("bytes")
                 bytes_so_far = " ".join(status[0].split()[:-1])
@@ -731,14 +931,35 @@ class FileCacher:
             except UnboundLocalError:   # maybe the open failed.
                 pass
 
+    def range_skip(self, url, infile, offset):
+        """Return the number of leading bytes of response `infile` to a Range
+        request for `url` from `offset` which precede `offset`:  0 when the
+        server returned the requested range,  `offset` when it ignored the
+        Range header and returned the whole file.
+        """
+        if infile.getcode() != 206:
+            log.verbose("Server ignored Range request for", repr(url), "skipping", offset, "bytes.")
+            return offset
+        content_range = infile.headers.get("Content-Range", "")
+        if not content_range.startswith("bytes {}-".format(offset)):
+            raise CrdsDownloadError(
+                "Server returned Content-Range", srepr(content_range),
+                "resuming download at byte", offset)
+        return 0
+
     def get_url(self, filename):
         """Return the URL used to fetch `filename` of `pipeline_context`."""
         return get_flex_uri(filename, self.observatory)
 
-    def verify_file(self, filename, localpath):
-        """Check that the size and checksum of downloaded `filename` match the server."""
+    def verify_file(self, filename, localpath, local_length=None, local_sha1sum=None):
+        """Check that the size and checksum of downloaded `filename` match the server.
+
+        `local_length` and `local_sha1sum`,  when computed during the download,
+        are used instead of re-reading `localpath`.
+        """
         remote_info = self.info_map[filename]
-        local_length = os.stat(localpath).st_size
+        if local_length is None:
+            local_length = os.stat(localpath).st_size
         original_length = int(remote_info["size"])
         if original_length != local_length and config.get_length_flag():
             raise CrdsDownloadError(
@@ -748,7 +969,8 @@ class FileCacher:
             log.verbose("Skipping sha1sum with CRDS_DOWNLOAD_CHECKSUMS=False")
         elif remote_info["sha1sum"] not in ["", "none"]:
             original_sha1sum = remote_info["sha1sum"]
-            local_sha1sum = utils.checksum(localpath)
+            if local_sha1sum is None:
+                local_sha1sum = utils.checksum(localpath)
             if original_sha1sum != local_sha1sum:
                 raise CrdsDownloadError(
                     "downloaded file", srepr(filename),
@@ -937,3 +1159,10 @@ def get_minimum_header(context, dataset, ignore_cache=False):
     dump_mappings(context, ignore_cache=ignore_cache)
     ctx = crds.get_pickled_mapping(context)   # reviewed
     return ctx.get_minimum_header(dataset)
+
+# ============================================================================
+
+# Configure the default server when the web client is first used rather than
+# on "import crds".
+from crds import URL as _DEFAULT_URL
+set_crds_server(_DEFAULT_URL)
@@ -7,8 +7,13 @@ import uuid
 import json
 import time
 import os
+import io
+import zlib
+import threading
+import functools
+import http.client
 
-from urllib import request
+from urllib import request, parse, error
 import html
 import gzip
 import base64
@@ -18,20 +23,276 @@ from crds.core import exceptions, log, config
 
 # ============================================================================
 
+_URLOPEN_INITIALIZED = False
+
 def init_urlopen():
-    """Call urlopen() once at import time to prepare for possible calls within
-    multiprocessing processes.  This is magic which avoids a segfault on OS-X
-    when urlopen() is called for the first time in a subprocess.
+    """Call urlopen() once before the first fork to prepare for possible calls
+    within multiprocessing processes.  This is magic which avoids a segfault on
+    OS-X when urlopen() is called for the first time in a subprocess.
 
     %time showed this at around 2 msec on OS-X 10.11.67 El Capitain,  fine for
-    a CRDS client unconditional one-off.
+    a CRDS client one-off,  but it is deferred from import time to the first
+    fork so that importing CRDS does no network setup.
     """
+    global _URLOPEN_INITIALIZED
+    if _URLOPEN_INITIALIZED:
+        return
+    _URLOPEN_INITIALIZED = True
     try:
         request.urlopen('')
     except Exception:
         pass
 
-init_urlopen()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=init_urlopen)
+else:
+    init_urlopen()
+
+# ============================================================================
+
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+_MAX_REDIRECTS = 10
+
+_USER_AGENT = "Python-urllib/%d.%d" % sys.version_info[:2]
+
+class HTTPSession:
+    """HTTPSession issues HTTP requests over persistent connections,  keeping up
+    to `pool_size` idle keep-alive connections per server,  defaulting to
+    CRDS_HTTP_POOL_SIZE.   It is thread safe,  each connection serving one
+    request at a time,  and counts the connections `opened` and `reused` and
+    the total `requests`.
+
+    URLs which are not http or https,  or which are configured to go through
+    a proxy,  are opened with request.urlopen() instead.
+    """
+    def __init__(self, pool_size=None):
+        self.pool_size = config.HTTP_POOL_SIZE.get() if pool_size is None else pool_size
+        self.opened = 0
+        self.reused = 0
+        self.requests = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(pool_size=%d, opened=%d, reused=%d, requests=%d)" % (
+            self.pool_size, self.opened, self.reused, self.requests)
+
+    def counts(self):
+        """Return dict(opened=, reused=, requests=) connection and request counts."""
+        with self._lock:
+            return dict(opened=self.opened, reused=self.reused, requests=self.requests)
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def open(self, url, data=None, headers=None, accept_gzip=False):
+        """GET `url`,  or POST `data` to it,  and return a file-like response
+        with read(),  getcode(),  geturl(),  and headers,  like request.urlopen().
+        Redirects are followed and HTTP error statuses raise urllib HTTPError.
+        If `accept_gzip` is True,  a gzip compressed response is requested and
+        transparently decompressed.
+        """
+        headers = dict(headers or {})
+        for _redirect in range(_MAX_REDIRECTS):
+            parts = parse.urlsplit(url)
+            if not self.pooled(parts):
+                return request.urlopen(request.Request(url, data, headers))
+            key = (parts.scheme, parts.netloc)
+            connection, response = self._request(key, parts, data,
+                dict(headers, **{"Accept-Encoding" : "gzip"}) if accept_gzip else headers)
+            if response.status in _REDIRECT_CODES and response.getheader("Location"):
+                body = self._drain(key, connection, response)
+                if data is not None and response.status not in (301, 302, 303):
+                    raise error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+                url, data = parse.urljoin(url, response.getheader("Location")), None
+                continue
+            if response.status >= 400:
+                body = self._drain(key, connection, response)
+                raise error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+            return SessionResponse(self, key, connection, response, url)
+        raise error.HTTPError(url, response.status, "Too many redirects", response.headers, None)
+
+    def pooled(self, parts):
+        """Return True IFF the URL split into `parts` is opened with a pooled connection."""
+        if parts.scheme not in ("http", "https"):
+            return False
+        return not (request.getproxies().get(parts.scheme) and not request.proxy_bypass(parts.hostname))
+
+    def _request(self, key, parts, data, headers):
+        """Send a request for `parts` on an idle or new connection for `key`,
+        returning (connection, http.client.HTTPResponse).   A request which fails
+        because the server closed an idle connection is retried once on a new one.
+        """
+        path = parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        headers = dict(headers)
+        headers.setdefault("User-Agent", _USER_AGENT)
+        if data is not None:
+            headers.setdefault("Content-Type", "application/x-www-form-urlencoded")
+        with self._lock:
+            self.requests += 1
+        while True:
+            connection = self._checkout(key)
+            reused = connection.sock is not None
+            with self._lock:
+                if reused:
+                    self.reused += 1
+                else:
+                    self.opened += 1
+            if not reused:
+                log.verbose("Opening HTTP connection to", repr(parts.netloc), verbosity=60)
+            try:
+                connection.request("GET" if data is None else "POST", path, body=data, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.BadStatusLine, ConnectionError) as exc:
+                connection.close()
+                if not reused:
+                    raise error.URLError(exc) from exc
+                log.verbose("Idle HTTP connection to", repr(parts.netloc), "was closed,  reconnecting.", verbosity=60)
+            except OSError as exc:   # report like request.urlopen()
+                connection.close()
+                raise error.URLError(exc) from exc
+            except Exception:
+                connection.close()
+                raise
+
+    def _checkout(self, key):
+        """Return an idle connection for `key` or a new unconnected one."""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        scheme, netloc = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc)
+        else:
+            return http.client.HTTPConnection(netloc)
+
+    def _checkin(self, key, connection, response):
+        """Return `connection` to the idle pool for `key` if its `response` was
+        completely read and the connection can be kept alive,  else close it.
+        """
+        if response.will_close or response.length or not response.isclosed():
+            connection.close()
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _drain(self, key, connection, response):
+        """Read and return the body of `response` and release `connection`."""
+        try:
+            return response.read()
+        finally:
+            self._checkin(key, connection, response)
+
+class SessionResponse:
+    """SessionResponse is the file-like response of an HTTPSession request,  which
+    returns its connection to the session's pool once the body has been read or
+    closes it when the response is closed early.
+
+    A gzip Content-Encoding is decompressed,  so read(amt) may return more than
+    `amt` bytes.
+    """
+    def __init__(self, session, key, connection, response, url):
+        self.url = url
+        self.status = response.status
+        self.headers = response.headers
+        self._session = session
+        self._key = key
+        self._connection = connection
+        self._response = response
+        if (response.getheader("Content-Encoding") or "").lower() == "gzip":
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            self._decompressor = None
+
+    def getcode(self):
+        """Return the HTTP status code of this response."""
+        return self.status
+
+    def geturl(self):
+        """Return the final URL of this response after redirects."""
+        return self.url
+
+    def read(self, amt=None):
+        """Read and return up to `amt` bytes of the body,  or all of it,  b'' at the end."""
+        if self._response is None:
+            return b""
+        data = self._response.read(amt)
+        if self._decompressor is not None:
+            while data:
+                decompressed = self._decompressor.decompress(data)
+                if decompressed or amt is None:
+                    data = decompressed
+                    break
+                data = self._response.read(amt)
+            else:
+                data = self._decompressor.flush()
+        if not data or self._response.isclosed():
+            self._release()
+        return data
+
+    def _release(self):
+        """Return the connection of this fully read response to the session."""
+        response, self._response = self._response, None
+        self._session._checkin(self._key, self._connection, response)
+
+    def close(self):
+        """Release the connection,  closing it if the body was not completely read."""
+        if self._response is not None:
+            if not self._response.isclosed():
+                self._connection.close()
+                self._response.close()
+            self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+def get_session():
+    """Return the HTTPSession shared by the JSON RPC proxies and file downloads
+    of this process.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = HTTPSession()
+        return _SESSION
+
+def reset_session():
+    """Close the idle connections of the shared HTTPSession and start a new one,
+    e.g. to pick up a changed CRDS_HTTP_POOL_SIZE.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        session, _SESSION = _SESSION, None
+    if session is not None:
+        session.close()
+
+def _forget_session():
+    """Drop the shared HTTPSession inherited from the parent of a forked process,
+    leaving its connections to the parent.
+    """
+    global _SESSION, _SESSION_LOCK
+    _SESSION = None
+    _SESSION_LOCK = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_session)
 
 # ============================================================================
 
@@ -91,6 +352,10 @@ class CheckingProxy:
         return self.__class__.__name__ + "(url='%s', version='%s')" % \
             (self.__service_url, self.__version)
 
+    def _batch(self):
+        """Return a ServiceBatch which pipelines JSON RPC calls to this proxy's service."""
+        return ServiceBatch(self.__service_url, self.__version)
+
 class ServiceCallBinding:
     """When called,  ServiceCallBinding issues a JSONRPC call to the associated
     service URL.
@@ -147,14 +412,17 @@ class ServiceCallBinding:
         if not isinstance(parameters, bytes):
             parameters = parameters.encode("utf-8")
         try:
-            channel = request.urlopen(url, parameters)
-            return channel.read().decode("utf-8")
+            with get_session().open(url, parameters, accept_gzip=config.HTTP_GZIP.get()) as channel:
+                return channel.read().decode("utf-8")
         except Exception as exc:
             raise exceptions.ServiceError("CRDS jsonrpc failure " + repr(self.__service_name) + " " + str(exc)) from exc
 
     def __call__(self, *args, **kwargs):
-        jsonrpc = self._call(*args, **kwargs)
-        if jsonrpc["error"]:
+        return self._decode(self._call(*args, **kwargs))
+
+    def _decode(self, jsonrpc):
+        """Return the decoded result of `jsonrpc` response or raise its error."""
+        if jsonrpc.get("error"):
             decoded = html.unescape(jsonrpc["error"]["message"])
             raise self.classify_exception(decoded)
         else:
@@ -177,6 +445,160 @@ class ServiceCallBinding:
 
 # ============================================================================
 
+# Service URLs whose servers answered a JSON-RPC 2.0 batch request with a 4xx
+# HTTP error or with something other than a batch response.
+_BATCH_UNSUPPORTED = set()
+
+class ServiceBatch:
+    """ServiceBatch pipelines JSON RPC calls,  sending them to the service URL
+    together as JSON-RPC 2.0 batch requests of up to CRDS_RPC_BATCH_SIZE calls
+    each,  one HTTP round trip per batch.
+
+    Like CheckingProxy,  calling a method of ServiceBatch names a JSON RPC
+    method,  but instead of returning the result it queues the call and returns
+    a BatchCall.   Queued calls are sent when the batch exits a with-block or
+    the result() of any queued call is requested:
+
+    with proxy._batch() as batch:
+        calls = [batch.get_dataset_headers_by_id(context, ids) for ids in id_slices]
+    headers = [call.result() for call in calls]
+
+    Servers which do not support batch requests are called once per method,  as
+    are the calls of a batch which fails with a 5xx HTTP error.
+
+    XXX NOTE: As with CheckingProxy,  always underscore new methods.
+    """
+    def __init__(self, service_url, version="1.0"):
+        self.__service_url = service_url
+        self.__version = str(version)
+        self.__queued = []
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(url='%s', queued=%d)" % (self.__service_url, len(self.__queued))
+
+    def __getattr__(self, name):
+        """Return a callable which queues a call to JSONRPC method `name`."""
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return functools.partial(self._queue, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._execute()
+
+    def _queue(self, name, *args, **kwargs):
+        """Queue a call to JSONRPC method `name` with `args` or `kwargs`,  returning its BatchCall."""
+        call = BatchCall(self, name, ServiceCallBinding(self.__service_url, name, self.__version), args, kwargs)
+        self.__queued.append(call)
+        return call
+
+    def _execute(self):
+        """Send all queued calls in batches of up to CRDS_RPC_BATCH_SIZE calls."""
+        queued, self.__queued = self.__queued, []
+        batch_size = max(config.RPC_BATCH_SIZE.get(), 1)
+        for i in range(0, len(queued), batch_size):
+            self._execute_batch(queued[i : i + batch_size])
+
+    def _execute_batch(self, calls):
+        """Send `calls` as one JSON-RPC 2.0 batch request,  or individually if
+        there is only one or the server does not support batches.
+        """
+        if len(calls) == 1 or self.__service_url in _BATCH_UNSUPPORTED:
+            for call in calls:
+                call._call()
+            return
+        requests = [dict(jsonrpc="2.0", method=call.name, params=call.params, id=message_id())
+                    for call in calls]
+        url = self.__service_url + "batch/" + requests[0]["id"] + "/"
+        if "serverless" in url or "server-less" in url:
+            raise exceptions.ServiceError("Configured for server-less mode.  Skipping JSON RPC batch.")
+        log.verbose("CRDS JSON RPC batch of", len(calls), "calls", sorted(set(call.name for call in calls)), "-->")
+        binding = ServiceCallBinding(self.__service_url, "batch", self.__version)
+        try:
+            response = apply_with_retries(binding._call_service, json.dumps(requests), url)
+            responses = json.loads(response)
+        except exceptions.ServiceError as exc:
+            if not isinstance(exc.__cause__, error.HTTPError):
+                for call in calls:
+                    call._fail(exc)
+                return
+            if 400 <= exc.__cause__.code < 500:   # the server rejected the batch
+                responses = None
+            else:   # possibly transient server failure,  don't rule out batches
+                log.verbose("CRDS JSON RPC batch failed,  calling methods individually:", str(exc))
+                for call in calls:
+                    call._call()
+                return
+        except Exception as exc:
+            log.warning("Invalid CRDS jsonrpc response:\n", response)
+            for call in calls:
+                call._fail(exc)
+            return
+        if not isinstance(responses, list):
+            log.verbose("CRDS server does not support JSON RPC batches,  calling methods individually.")
+            _BATCH_UNSUPPORTED.add(self.__service_url)
+            for call in calls:
+                call._call()
+            return
+        by_id = { jsonrpc.get("id") : jsonrpc for jsonrpc in responses if isinstance(jsonrpc, dict) }
+        for call, jsonrpc in zip(calls, requests):
+            call._receive(by_id.get(jsonrpc["id"],
+                {"error" : {"message" : "No response to batched call " + jsonrpc["id"]}}))
+
+class BatchCall:
+    """BatchCall is a JSON RPC call queued in a ServiceBatch."""
+    def __init__(self, batch, name, binding, args, kwargs):
+        self.batch = batch
+        self.name = name
+        self.binding = binding
+        self.params = kwargs if len(kwargs) else args
+        self.done = False
+        self._result = None
+        self._exception = None
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(method='%s', done=%s)" % (self.name, self.done)
+
+    def result(self):
+        """Return the result of this call,  sending its batch if not yet sent,
+        or raise the call's exception.
+        """
+        if not self.done:
+            self.batch._execute()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def _call(self):
+        """Issue this call by itself."""
+        try:
+            params = self.params
+            if isinstance(params, dict):
+                self._result = self.binding(**params)
+            else:
+                self._result = self.binding(*params)
+        except Exception as exc:
+            self._exception = exc
+        self.done = True
+
+    def _fail(self, exc):
+        """Record `exc` as the exception of this call."""
+        self._exception = exc
+        self.done = True
+
+    def _receive(self, jsonrpc):
+        """Record the result or exception of batch response `jsonrpc` for this call."""
+        try:
+            self._result = self.binding._decode(jsonrpc)
+        except Exception as exc:
+            self._exception = exc
+        self.done = True
+
+# ============================================================================
+
 # These operate transparently in the proxy and are optionally used by the server.
 #
 # This makes a new client with crds_decoder compatible with both encoding and
@@ -0,0 +1,4 @@
+"""Submodules of this package are imported on first attribute access."""
+from .lazy import make_getattr
+
+__getattr__ = make_getattr(__name__)
@@ -0,0 +1,80 @@
+"""This module defines the closure index of CRDS mappings,  the sorted names of
+each mapping and of every mapping and reference file it refers to directly or
+indirectly,  i.e. mapping_names() + reference_names() of the loaded mapping.
+
+Computing the closure of a context by loading it reads and parses every .imap
+and .rmap of the context.   Adjacent contexts differ in only a few of them,  so
+get_closure() instead computes the closure of a mapping from the closures of
+the mappings it names,  loading only the mapping itself,  and memoizes the
+result for each mapping in the process.   When CRDS_MAPPING_CLOSURE_INDEX is
+True each closure is also saved as:
+
+    <CRDS pickles path>/closures/<mapping basename>.<sha1 of mapping text>.json
+
+so later processes only read and checksum the text of the root mapping.   Since
+mappings are immutable once named,  an entry remains valid as long as the text
+of its root mapping is unchanged.
+"""
+import os
+import json
+
+from . import log, config, utils, rmap, parse_cache
+
+# ===================================================================
+
+__all__ = [
+    "get_closure",
+    "load",
+    "save",
+    ]
+
+def get_closure(mapping):
+    """Return the sorted list of the names of `mapping` and every mapping and
+    reference file it refers to.
+    """
+    return sorted(_get_closure(mapping))
+
+@utils.cached
+def _get_closure(mapping):
+    """Return the frozenset closure of `mapping`,  from the index if possible."""
+    basename = os.path.basename(mapping)
+    sha1 = None
+    if config.MAPPING_CLOSURE_INDEX:
+        sha1 = parse_cache.text_sha1(utils.get_uri_content(config.locate_mapping(mapping)))
+        names = load(basename, sha1)
+        if names is not None:
+            return frozenset(names)
+    loaded = rmap.fetch_mapping(mapping)
+    if isinstance(loaded, rmap.ContextMapping):
+        names = {basename}
+        for child in loaded.selections.normal_names():
+            names |= _get_closure(child)
+    else:
+        names = set(loaded.mapping_names() + loaded.reference_names())
+    if sha1 is not None:
+        save(basename, sha1, sorted(names))
+    return frozenset(names)
+
+def load(basename, sha1):
+    """Return the indexed closure names of mapping `basename` with text checksum
+    `sha1`,  or None if there is no usable entry.
+    """
+    path = config.locate_closure_index(basename, sha1)
+    try:
+        with open(path) as handle:
+            names = json.load(handle)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        log.verbose_warning("Failed loading closure index entry", repr(path), ":", repr(exc))
+        return None
+    log.verbose("Loaded closure of", repr(basename), "from", repr(path), verbosity=55)
+    return names
+
+def save(basename, sha1, names):
+    """Save list `names` as the closure index entry for mapping `basename` with
+    text checksum `sha1`.
+    """
+    from . import heavy_client
+    path = config.locate_closure_index(basename, sha1)
+    heavy_client.cache_atomic_write(path, json.dumps(names), "MAPPING CLOSURE INDEX")
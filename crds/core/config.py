@@ -553,11 +553,89 @@ USE_PICKLED_CONTEXTS = BooleanConfigItem("CRDS_USE_PICKLED_CONTEXTS", False,
 AUTO_PICKLE_CONTEXTS = BooleanConfigItem("CRDS_AUTO_PICKLE_CONTEXTS", False,
     "When True, CRDS contexts should be automatically pickled and cached after loading.")
 
+def locate_split_pickle(mapping, observatory=None):
+    """Return the absolute path where the pipeline context shell of the split pickle
+    of `mapping` should be located.
+    """
+    if os.path.dirname(mapping):
+        return mapping
+    if observatory is None:
+        observatory = mapping_to_observatory(mapping)
+    return os.path.join(get_crds_picklepath(observatory), mapping + ".split.pkl")
+
+SPLIT_PICKLED_CONTEXTS = BooleanConfigItem("CRDS_SPLIT_PICKLED_CONTEXTS", False,
+    "When True, .pmaps are pickled as a shell plus one pickle per .imap closure,  loaded on first use.")
+
+def locate_snapshot(mapping, observatory=None):
+    """Return the absolute path where the context snapshot of `mapping` should be located."""
+    if os.path.dirname(mapping):
+        return mapping
+    if observatory is None:
+        observatory = mapping_to_observatory(mapping)
+    return os.path.join(get_crds_picklepath(observatory), mapping + ".snap")
+
+USE_CONTEXT_SNAPSHOTS = BooleanConfigItem("CRDS_USE_CONTEXT_SNAPSHOTS", False,
+    "When True,  CRDS contexts should be loaded lazily from a context snapshot if possible.")
+
+AUTO_SNAPSHOT_CONTEXTS = BooleanConfigItem("CRDS_AUTO_SNAPSHOT_CONTEXTS", False,
+    "When True, CRDS contexts should be automatically snapshotted and cached after loading.")
+
+def locate_parsed_mapping(mapping, text_sha1, observatory=None):
+    """Return the absolute path where the parse cache entry for `mapping` with
+    contents checksum `text_sha1` should be located.
+    """
+    if observatory is None:
+        observatory = mapping_to_observatory(mapping)
+    return os.path.join(get_crds_picklepath(observatory), "parsed",
+                        os.path.basename(mapping) + "." + text_sha1 + ".pkl")
+
+MAPPING_PARSE_CACHE = BooleanConfigItem("CRDS_MAPPING_PARSE_CACHE", False,
+    "When True, parsed mappings are saved in and reloaded from the CRDS cache keyed on name, contents, and CRDS version.")
+
+def locate_closure_index(mapping, text_sha1, observatory=None):
+    """Return the absolute path where the closure index entry for `mapping` with
+    contents checksum `text_sha1` should be located.
+    """
+    if observatory is None:
+        observatory = mapping_to_observatory(mapping)
+    return os.path.join(get_crds_picklepath(observatory), "closures",
+                        os.path.basename(mapping) + "." + text_sha1 + ".json")
+
+MAPPING_CLOSURE_INDEX = BooleanConfigItem("CRDS_MAPPING_CLOSURE_INDEX", True,
+    "When True, the names of all files referred to by each mapping are saved in and reloaded from the CRDS cache.")
+
 # -------------------------------------------------------------------------------------
 
 FORCE_COMPLETE_LOAD = BooleanConfigItem("CRDS_FORCE_COMPLETE_LOAD", False,
     "When True, force CRDS contexts to load in their entirety rather than based on what is actually used.")
 
+FAST_MAPPING_READER = BooleanConfigItem("CRDS_FAST_MAPPING_READER", True,
+    "When True, parse mappings with the literal-only mapping reader,  falling back to verifying and exec'ing them.")
+
+BESTREF_CACHE_SIZE = IntConfigItem("CRDS_BESTREF_CACHE_SIZE", 0,
+    "Maximum number of bestrefs lookups memoized per rmap.  0 disables the cache.")
+
+INTERN_MAPPINGS = BooleanConfigItem("CRDS_INTERN_MAPPINGS", True,
+    "When True, identical named rmaps loaded by different cached, pickled, or snapshot contexts share one object.")
+
+CLOSURE_LOAD_THREADS = IntConfigItem("CRDS_CLOSURE_LOAD_THREADS", 8,
+    "Number of threads reading mapping files concurrently when a context closure is loaded in bulk.")
+
+CLOSURE_LOAD_PROCESSES = IntConfigItem("CRDS_CLOSURE_LOAD_PROCESSES", 0,
+    "Number of worker processes parsing .rmaps when a context closure is loaded in bulk.  0 or 1 parses in-process.")
+
+DOWNLOAD_THREADS = IntConfigItem("CRDS_DOWNLOAD_THREADS", 4,
+    "Number of files downloaded concurrently when syncing or caching files.  1 downloads serially.")
+
+HTTP_POOL_SIZE = IntConfigItem("CRDS_HTTP_POOL_SIZE", 4,
+    "Number of idle persistent HTTP connections kept open per server for JSON RPC calls and file downloads.  0 disables keep-alive.")
+
+RPC_BATCH_SIZE = IntConfigItem("CRDS_RPC_BATCH_SIZE", 8,
+    "Maximum number of JSON RPC calls sent together in one JSON-RPC 2.0 batch request.  1 disables batching.")
+
+HTTP_GZIP = BooleanConfigItem("CRDS_HTTP_GZIP", True,
+    "When True, request gzip compressed JSON RPC responses from the CRDS server.")
+
 EXPLICIT_GARBAGE_COLLECTION = BooleanConfigItem("CRDS_EXPLICIT_GARBAGE_COLLECTION", True,
     "When False, the @gc_collected function decorator skips garbage collection.")
 # -------------------------------------------------------------------------------------
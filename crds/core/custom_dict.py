@@ -94,6 +94,18 @@ class LazyFileDict(TransformedDict):
         """Drop all loaded selections reverting to pre-demand-loaded state."""
         super(LazyFileDict, self).__init__()
 
+    def set_loader(self, loader):
+        """Demand load selections not yet loaded by calling `loader` instead of
+        the original loader.
+        """
+        self._xx_load_keys = dict(self._xx_load_keys, loader=loader)
+
+    def reduce_unloaded(self):
+        """Return a pickle reduction of this dict which omits the loaded values,
+        unpickling in the pre-demand-loaded state.
+        """
+        return self.__class__, (dict(self._xx_selector), self._xx_load_keys)
+
     def __getstate__(self):
         """Drop dictionary attributes which correspond to loaded/cached members."""
         return dict(
@@ -146,6 +158,10 @@ class LazyFileDict(TransformedDict):
     def __len__(self):
         return len(self._xx_selector)
 
+    def __contains__(self, name):
+        """NOTE:  does not load the value of `name`."""
+        return self.transform_key(name) in self._xx_selector
+
     def keys(self):
         """
         NOTE:  does not require full load
@@ -159,6 +175,39 @@ class LazyFileDict(TransformedDict):
         """
         return sorted([key for key in self.keys() if not self.is_special_value(self._xx_selector[key])])
 
+    def normal_names(self):
+        """Return the unloaded selector values,  e.g. file names,  of the normal keys.
+
+        NOTE:  Does not require full load.
+        """
+        return [self._xx_selector[key] for key in self.normal_keys()]
+
+    def same_file(self, other, name):
+        """Return True IFF `name` selects the same file or special value in
+        `self` and LazyFileDict `other`,  loaded the same way.
+
+        NOTE:  Does not load anything.
+        """
+        name = self.transform_key(name)
+        return (self._xx_selector[name] == other._xx_selector[name] and
+                self._xx_load_keys.get("path") == other._xx_load_keys.get("path"))
+
+    def loaded_items(self):
+        """Return the sorted items whose values have already been loaded.
+
+        NOTE:  Does not load anything.
+        """
+        return sorted(self._contents.items())
+
+    def replace_loaded(self, name, value):
+        """Replace the already loaded value of `name` with `value` without
+        changing the selector,  e.g. to substitute an identical shared object.
+        """
+        name = self.transform_key(name)
+        if name not in self._contents:
+            raise KeyError(name)
+        super(LazyFileDict, self).__setitem__(name, value)
+
     def special_keys(self):
         """Each of these keys has a corresponding values which IS special.
 
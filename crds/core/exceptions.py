@@ -186,6 +186,9 @@ class JsonFormatError(FileFormatError):
 class YamlFormatError(FileFormatError):
     """What should be valid YAML didn't parse / load."""
 
+class SnapshotFormatError(FileFormatError):
+    """A context snapshot is corrupt,  incomplete,  or was written by a different CRDS."""
+
 class UnsupportedFileOpError(CrdsError, NotImplementedError):
     """In CRDS,  some function is not supported for a particular file format."""
 
@@ -32,7 +32,8 @@ through the network, parameter, or environment variable mechanisms.
 7. Implementation of bad files handling,  resulting in an exception or warning
 when bad rules or references are used anyway.
 
-8. Implementation of context pickling.
+8. Implementation of context pickling,  split per-instrument context pickles,
+and lazily loaded context snapshots.
 
 9. Translation of symbolic contexts where used (e.g. jwst-edit
 vs. jwst_0442.pmap).
@@ -54,10 +55,12 @@ import traceback
 import uuid
 import fnmatch
 import pickle
+import io
 
 # ============================================================================
 
-from . import rmap, log, utils, config
+from . import rmap, log, utils, config, snapshot
+from .custom_dict import LazyFileDict
 from .constants import ALL_OBSERVATORIES
 from .log import srepr
 from .exceptions import CrdsError, CrdsBadRulesError, CrdsBadReferenceError, CrdsConfigError, CrdsDownloadError
@@ -674,9 +677,13 @@ def get_symbolic_mapping(
 # ============================================================================
 
 @utils.cached   # check callers for .uncached before removing.
-def get_pickled_mapping(mapping, cached=True, use_pickles=None, save_pickles=None, **keys):
+def get_pickled_mapping(mapping, cached=True, use_pickles=None, save_pickles=None,
+                        use_snapshots=None, save_snapshots=None, **keys):
     """Load CRDS mapping from a context pickle if possible, nominally as a file
     system optimization to prevent 100+ file reads.
+
+    When `use_snapshots` is set,  a context snapshot takes precedence over the
+    context pickle and only the sub-mappings actually used are loaded.
     """
     assert config.is_mapping(mapping) or isinstance(mapping, rmap.Mapping), \
         "`mapping` must be a literal CRDS mapping name, not a date-based context specification."
@@ -684,7 +691,18 @@ def get_pickled_mapping(mapping, cached=True, use_pickles=None, save_pickles=Non
         use_pickles = config.USE_PICKLED_CONTEXTS
     if save_pickles is None:
         save_pickles = config.AUTO_PICKLE_CONTEXTS
-    if use_pickles and config.is_simple_crds_mapping(mapping):
+    if use_snapshots is None:
+        use_snapshots = config.USE_CONTEXT_SNAPSHOTS
+    if save_snapshots is None:
+        save_snapshots = config.AUTO_SNAPSHOT_CONTEXTS
+    if use_snapshots and config.is_simple_crds_mapping(mapping):
+        try:
+            loaded = load_context_snapshot(mapping)
+        except Exception:
+            loaded = rmap.asmapping(mapping, cached=cached, **keys)
+            if save_snapshots:
+                save_context_snapshot(mapping, loaded)
+    elif use_pickles and config.is_simple_crds_mapping(mapping):
         try:
             loaded = load_pickled_mapping(mapping)
         except Exception:
@@ -701,18 +719,27 @@ def load_pickled_mapping(mapping):
 
     Although pickles for sub-mappings may exist, only the highest level pickle
     in the hierarchy is read.  In general pickles for sub-mappings should not
-    exist because of storage waste.
+    exist because of storage waste,  the exception being the per-instrument
+    pickles of split pickled contexts.
     """
-    pickle_uri = config.get_uri(mapping + ".pkl")
-    if pickle_uri == "none":
-        pickle_uri = config.locate_pickle(mapping)
-    pickled = utils.get_uri_content(pickle_uri, mode="binary")
-    loaded = pickle.loads(pickled)
+    if config.SPLIT_PICKLED_CONTEXTS and mapping.endswith(".pmap"):
+        return load_split_pickled_mapping(mapping)
+    loaded = rmap.intern_context(_read_pickle(mapping + ".pkl", config.locate_pickle(mapping)))
     log.info("Loaded pickled context", repr(mapping))
     return loaded
 
+def _read_pickle(uri_name, pickle_file):
+    """Return the unpickled contents of `uri_name` in the CRDS cache,  nominally `pickle_file`."""
+    pickle_uri = config.get_uri(uri_name)
+    if pickle_uri == "none":
+        pickle_uri = pickle_file
+    pickled = utils.get_uri_content(pickle_uri, mode="binary")
+    return pickle.loads(pickled)
+
 def save_pickled_mapping(mapping, loaded):
     """Save live mapping `loaded` as a pickle under named based on `mapping` name."""
+    if config.SPLIT_PICKLED_CONTEXTS and mapping.endswith(".pmap"):
+        return save_split_pickled_mapping(mapping, loaded)
     pickle_file = config.locate_pickle(mapping)
     if not utils.is_writable(pickle_file):  # Don't even bother pickling
         log.verbose("Pickle file", repr(pickle_file), "is not writable,  skipping pickle save.")
@@ -724,8 +751,15 @@ def save_pickled_mapping(mapping, loaded):
         log.info("Saved pickled context", repr(pickle_file))
 
 def remove_pickled_mapping(mapping):
-    """Delete the pickle for `mapping` from the CRDS cache."""
-    pickle_file = config.locate_pickle(mapping)
+    """Delete the pickle for `mapping` from the CRDS cache.
+
+    For split pickled contexts only the pipeline context shell is removed since
+    the instrument context pickles are shared with other contexts.
+    """
+    if config.SPLIT_PICKLED_CONTEXTS and mapping.endswith(".pmap"):
+        pickle_file = config.locate_split_pickle(mapping)
+    else:
+        pickle_file = config.locate_pickle(mapping)
     if not utils.is_writable(pickle_file):  # Don't even bother pickling
         log.verbose("Pickle file", repr(pickle_file), "is not writable,  skipping pickle remove.")
         return
@@ -735,3 +769,109 @@ def remove_pickled_mapping(mapping):
     with log.warn_on_exception("Failed removing pickle for", repr(mapping)):
         os.remove(pickle_file)
         log.info("Removed pickle for context", repr(pickle_file))
+
+# ============================================================================
+
+class InstrumentPickleLoader:
+    """Selections loader of the pipeline context shell of a split context pickle.
+    Each InstrumentContext is loaded on first access from its own pickle,  or from
+    the CRDS cache mapping files if it has no usable pickle.
+    """
+
+    def __call__(self, mapping, **keys):
+        try:
+            return load_pickled_instrument(os.path.basename(mapping))
+        except Exception as exc:
+            log.verbose_warning("Failed loading pickled instrument context", repr(mapping),
+                                ":", str(exc), ":  loading mapping files instead.")
+            return rmap.get_cached_mapping(mapping, **keys)
+
+    def __repr__(self):
+        return self.__class__.__name__ + "()"
+
+class _ShellPickler(pickle.Pickler):
+    """Pickler which writes a pipeline context with its instrument contexts
+    unloaded,  to be demand loaded by InstrumentPickleLoader.
+    """
+
+    def reducer_override(self, obj):
+        if isinstance(obj, LazyFileDict):
+            cls, (selector, load_keys) = obj.reduce_unloaded()
+            return cls, (selector, dict(load_keys, loader=InstrumentPickleLoader()))
+        return NotImplemented
+
+@utils.cached
+def load_pickled_instrument(mapping):
+    """Load the pickled closure of InstrumentContext `mapping` from the CRDS cache,
+    sharing it between all split pickled contexts which refer to it.
+    """
+    loaded = rmap.intern_context(_read_pickle(mapping + ".pkl", config.locate_pickle(mapping)))
+    log.verbose("Loaded pickled instrument context", repr(mapping))
+    return loaded
+
+def load_split_pickled_mapping(mapping):
+    """Load the pipeline context shell of the split pickle for `mapping`.  Its
+    instrument contexts are loaded from their own pickles as they are first used.
+    """
+    loaded = _read_pickle(mapping + ".split.pkl", config.locate_split_pickle(mapping))
+    log.info("Loaded split pickled context", repr(mapping))
+    return loaded
+
+def save_split_pickled_mapping(mapping, loaded):
+    """Save live pipeline context `loaded` as a split pickle named based on
+    `mapping`:  a shell for the .pmap plus a pickle of the full closure of each
+    .imap.   Existing .imap pickles are reused since named mappings don't change.
+    """
+    shell_file = config.locate_split_pickle(mapping)
+    if not utils.is_writable(shell_file):
+        log.verbose("Pickle file", repr(shell_file), "is not writable,  skipping pickle save.")
+        return
+    with log.verbose_warning_on_exception("Failed saving split pickle for", repr(mapping), "to", repr(shell_file)):
+        for imap in loaded.selections.normal_values():
+            imap_file = config.locate_pickle(imap.basename)
+            if not os.path.exists(imap_file):
+                imap.force_load()
+                cache_atomic_write(imap_file, pickle.dumps(imap), "INSTRUMENT CONTEXT PICKLE")
+        shell = io.BytesIO()
+        _ShellPickler(shell).dump(loaded)
+        cache_atomic_write(shell_file, shell.getvalue(), "CONTEXT PICKLE")
+        log.info("Saved split pickled context", repr(shell_file))
+
+# ============================================================================
+
+def load_context_snapshot(mapping):
+    """Open the context snapshot for `mapping` located in the CRDS cache and
+    return its root Mapping.   Sub-mappings are loaded from the memory mapped
+    snapshot as they are first used.
+    """
+    snapshot_file = config.locate_snapshot(mapping)
+    loaded = snapshot.ContextSnapshot.from_file(snapshot_file).load_root()
+    log.info("Loaded context snapshot", repr(mapping))
+    return loaded
+
+def save_context_snapshot(mapping, loaded):
+    """Save live mapping `loaded` as a context snapshot named based on `mapping` name.
+
+    NOTE:  this fully loads `loaded`.
+    """
+    snapshot_file = config.locate_snapshot(mapping)
+    if not utils.is_writable(snapshot_file):
+        log.verbose("Snapshot file", repr(snapshot_file), "is not writable,  skipping snapshot save.")
+        return
+    with log.verbose_warning_on_exception(
+            "Failed saving snapshot for", repr(mapping), "to", repr(snapshot_file)):
+        cache_atomic_write(snapshot_file, snapshot.dumps(loaded), "CONTEXT SNAPSHOT")
+        log.info("Saved context snapshot", repr(snapshot_file))
+
+def remove_context_snapshot(mapping):
+    """Delete the context snapshot for `mapping` from the CRDS cache."""
+    snapshot_file = config.locate_snapshot(mapping)
+    if not utils.is_writable(snapshot_file):
+        log.verbose("Snapshot file", repr(snapshot_file), "is not writable,  skipping snapshot remove.")
+        return
+    if not os.path.exists(snapshot_file):
+        log.verbose("Snapshot file", repr(snapshot_file), "does not exist,  skipping snapshot remove.")
+        return
+    with log.warn_on_exception("Failed removing snapshot for", repr(mapping)):
+        os.remove(snapshot_file)
+        log.info("Removed snapshot for context", repr(snapshot_file))
@@ -0,0 +1,20 @@
+"""This module supports packages whose submodules are imported on first attribute
+access,  e.g. crds.core.rmap,  as they were when "import crds" imported them all.
+"""
+import importlib
+
+def make_getattr(package_name):
+    """Return a module __getattr__ for package `package_name` which imports its
+    submodules on first use.
+    """
+    def __getattr__(name):
+        """Import submodule `name` of this package on first use."""
+        if not name.startswith("__"):
+            module_name = package_name + "." + name
+            try:
+                return importlib.import_module(module_name)
+            except ModuleNotFoundError as exc:
+                if exc.name != module_name:
+                    raise
+        raise AttributeError("module " + repr(package_name) + " has no attribute " + repr(name))
+    return __getattr__
@@ -51,6 +51,17 @@ Output should now occur since verbosity=60:
 >>> log.verbose("this is a test verbose 60 message.", verbosity=60)
 CRDS - DEBUG - this is a test verbose 60 message.
 
+Hot code paths can skip building message arguments entirely by guarding
+with enabled(),  or defer expensive formatting with Deferred:
+
+>>> log.enabled(60)
+True
+>>> log.enabled(70)
+False
+>>> log.verbose("deferred repr", log.Deferred(repr, "value"), verbosity=60)
+CRDS - DEBUG - deferred repr 'value'
+>>> log.verbose("never formatted", log.Deferred(lambda: 1/0), verbosity=70)
+
 A number of context managers are defined for succinctly mapping nested
 exceptions onto CRDS messages or adding information:
 
@@ -193,6 +204,12 @@ class CrdsLogger:
         self.debugs += 1
         self.logger.debug(self.eformat(self.msg_count, *args, **keys))
 
+    def enabled(self, verbosity=DEFAULT_VERBOSITY_LEVEL):
+        """Return True IFF verbose messages at level `verbosity` will be output.
+        Cheap guard for skipping message formatting in hot loops.
+        """
+        return self.verbose_level >= verbosity
+
     def should_output(self, *args, **keys):
         verbosity = keys.get("verbosity", DEFAULT_VERBOSITY_LEVEL)
         return not self.verbose_level < verbosity
@@ -283,6 +300,7 @@ warning = THE_LOGGER.warn
 verbose_warning = THE_LOGGER.verbose_warning
 verbose = THE_LOGGER.verbose
 should_output = THE_LOGGER.should_output
+enabled = THE_LOGGER.enabled
 debug = THE_LOGGER.debug
 fatal_error = THE_LOGGER.fatal_error
 status = THE_LOGGER.status
@@ -441,13 +459,15 @@ class PP:
 
 class Deferred:
     """A wrapper to delay calling a callable until after it's known a verbose
-    message will definitely be output.
+    message will definitely be output,  e.g. Deferred(repr, obj).
     """
-    def __init__(self, ppobj):
+    def __init__(self, ppobj, *args, **keys):
         self.ppobj = ppobj
+        self.args = args
+        self.keys = keys
 
     def __str__(self):
-        return str(self.ppobj())
+        return str(self.ppobj(*self.args, **self.keys))
 
 # ===========================================================================
 
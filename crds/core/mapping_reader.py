@@ -0,0 +1,225 @@
+"""Defines read_mapping(),  a tokenizer and recursive descent parser for the
+declarative subset of Python used by CRDS mappings:  'header', 'selector', and
+'comment' assignments of literal dicts, tuples, lists, strings, numbers,  and
+selector constructors like Match({...}).
+
+read_mapping() produces the same namespace as verifying,  compiling,  and
+exec'ing the mapping with MAPPING_VERIFIER,  but directly from the text and
+several times faster,  so it is used to load mappings with the verifier path
+kept as the fallback.   Anything outside the restricted grammar raises a
+MappingFormatError,  on which the caller should fall back to MAPPING_VERIFIER
+which either handles the construct or reports the canonical error.
+
+>>> namespace = read_mapping('''
+... header = {
+...     'name' : 'hst_acs_biasfile.rmap',
+...     'parkey' : (('DETECTOR',), ('DATE-OBS', 'TIME-OBS')),
+...     'tpn_values' : (1, -2.5, True, None, ()),
+... }
+...
+... selector = Match({
+...     ('HRC',) : UseAfter({
+...         '1991-01-01 00:00:00' : "j4d1435ij_bia.fits",
+...     }),
+... })
+... ''')
+
+>>> namespace["header"]
+{'name': 'hst_acs_biasfile.rmap', 'parkey': (('DETECTOR',), ('DATE-OBS', 'TIME-OBS')), 'tpn_values': (1, -2.5, True, None, ())}
+
+>>> namespace["selector"]
+Match
+
+>>> namespace["selector"].selections
+dict_items([(('HRC',), UseAfter)])
+
+Constructs the reader doesn't handle are rejected rather than guessed at:
+
+>>> read_mapping("header = {'a' : 1 + 2}")
+Traceback (most recent call last):
+...
+crds.core.exceptions.MappingFormatError: Expected ',' at line 1
+
+>>> read_mapping("header = {} selector = {}")
+Traceback (most recent call last):
+...
+crds.core.exceptions.MappingFormatError: Expected end of statement at line 1
+
+>>> read_mapping("header = {\\n    'a' : os,\\n}")
+Traceback (most recent call last):
+...
+crds.core.exceptions.MappingFormatError: Unsupported name 'os' at line 2
+"""
+import re
+import ast
+
+from . import exceptions as crexc
+from . import selectors
+
+# ===================================================================
+
+_TOKENS = [
+    r"[{}()\[\]:,=\-]",                                 # punctuation
+    r"'(?!'')[^'\\\n]*(?:\\.[^'\\\n]*)*'",              # 'string'
+    r'"(?!"")[^"\\\n]*(?:\\.[^"\\\n]*)*"',              # "string"
+    r"[A-Za-z_]\w*",                                    # name
+    r"(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?(?![\w.])",   # number
+    r'"""(?:[^"\\]|\\.|"(?!""))*"""',                   # """string"""
+    r"'''(?:[^'\\]|\\.|'(?!''))*'''",                   # '''string'''
+    r"\S",                                              # anything else,  rejected by parser
+    ]
+
+# Each match is (leading white space and comments, token).   Token kinds are
+# distinguished by their first character.   Alternatives are ordered by their
+# frequency in real mappings.
+_TOKEN_RE = re.compile(r"(\s*(?:#[^\n]*\s*)*)(" + "|".join(_TOKENS) + ")", re.DOTALL | re.ASCII)
+
+_STRING_START = frozenset("\"'")
+
+_NUMBER_START = frozenset("0123456789.")
+
+_CONSTANTS = {
+    "True" : True,
+    "False" : False,
+    "None" : None,
+    }
+
+_SECTIONS = ("header", "selector", "comment")
+
+def read_mapping(text):
+    """Parse mapping `text` and return the dict of its section assignments."""
+    return MappingReader(text).read()
+
+class MappingReader:
+    """MappingReader parses the text of one CRDS mapping into the namespace
+    dictionary its assignments define,  without compiling or executing it.
+    """
+
+    def __init__(self, text):
+        self._matches = _TOKEN_RE.findall(text) + [("\n", "")]
+        self._tokens = [match[1] for match in self._matches]
+        self._pos = 0
+
+    def read(self):
+        """Return the dict of section assignments of this mapping."""
+        namespace = {}
+        while self._pos < len(self._tokens) - 1:
+            self._statement(namespace)
+        return namespace
+
+    # ---------------------------------------------------------------
+
+    def _error(self, *args):
+        """Raise a MappingFormatError for the current token."""
+        line = 1 + sum(space.count("\n") + token.count("\n") for (space, token) in self._matches[:self._pos])
+        line += self._matches[self._pos][0].count("\n")
+        raise crexc.MappingFormatError(*args + ("at line", line))
+
+    def _at_line_start(self):
+        """Return True IFF the current token begins a line at column 0."""
+        space = self._matches[self._pos][0]
+        return space.endswith("\n") or (self._pos == 0 and not space)
+
+    def _expect(self, token):
+        """Consume punctuation `token` or fail."""
+        if self._tokens[self._pos] != token:
+            self._error("Expected", repr(token))
+        self._pos += 1
+
+    def _statement(self, namespace):
+        """Parse one section assignment into `namespace`."""
+        name = self._tokens[self._pos]
+        if not self._at_line_start() or name not in _SECTIONS:
+            self._error("Only define 'header' or 'selector' or 'comment' sections")
+        self._pos += 1
+        self._expect("=")
+        token = self._tokens[self._pos]
+        if not (token == "{" or token[:1] in _STRING_START or token in selectors.SELECTORS):
+            self._error("Section value must be a selector call or dictionary or string")
+        namespace[name] = self._value()
+        if not self._at_line_start():
+            self._error("Expected end of statement")
+
+    def _value(self):
+        """Parse and return the literal value beginning at the current token."""
+        token = self._tokens[self._pos]
+        self._pos += 1
+        first = token[:1]
+        if first in _STRING_START:
+            if len(token) < 2:
+                self._pos -= 1
+                self._error("Unterminated string")
+            elif "\\" in token:
+                return ast.literal_eval(token)
+            elif token[:3] in ('"""', "'''"):
+                return token[3:-3]
+            else:
+                return token[1:-1]
+        elif token == "{":
+            return self._dict()
+        elif token == "(":
+            return self._tuple()
+        elif first in _NUMBER_START and token != ".":
+            return self._number(token)
+        elif token in _CONSTANTS:
+            return _CONSTANTS[token]
+        elif token in selectors.SELECTORS and self._tokens[self._pos] == "(":
+            self._pos += 1
+            selections = self._value()
+            self._expect(")")
+            return selectors.SELECTORS[token](selections)
+        elif token == "[":
+            return self._items("]")
+        elif token == "-" and self._tokens[self._pos][:1] in _NUMBER_START:
+            self._pos += 1
+            return -self._number(self._tokens[self._pos-1])
+        self._pos -= 1
+        if first.isalpha() or first == "_":
+            self._error("Unsupported name", repr(token))
+        else:
+            self._error("Unexpected", repr(token))
+
+    def _number(self, token):
+        """Convert number `token` to an int or float as Python would."""
+        if token.isdigit():
+            if token[0] == "0" and token.strip("0"):
+                self._pos -= 1
+                self._error("Invalid number", repr(token))
+            return int(token)
+        return float(token)
+
+    def _items(self, closer):
+        """Parse comma separated values up to punctuation `closer`,  returning a list."""
+        items = []
+        tokens = self._tokens
+        while tokens[self._pos] != closer:
+            items.append(self._value())
+            if tokens[self._pos] != closer:
+                self._expect(",")
+        self._pos += 1
+        return items
+
+    def _dict(self):
+        """Parse the remainder of a dict display."""
+        result = {}
+        tokens = self._tokens
+        while tokens[self._pos] != "}":
+            key = self._value()
+            self._expect(":")
+            result[key] = self._value()
+            if tokens[self._pos] != "}":
+                self._expect(",")
+        self._pos += 1
+        return result
+
+    def _tuple(self):
+        """Parse the remainder of a tuple or parenthesized value."""
+        if self._tokens[self._pos] == ")":
+            self._pos += 1
+            return ()
+        first = self._value()
+        if self._tokens[self._pos] == ")":
+            self._pos += 1
+            return first
+        self._expect(",")
+        return (first,) + tuple(self._items(")"))
@@ -0,0 +1,69 @@
+"""This module defines the persistent parse cache for CRDS mappings.
+
+Mappings are immutable once named,  yet every process which loads a mapping
+reads,  checksums,  and parses it again.   When CRDS_MAPPING_PARSE_CACHE is
+True,  Mapping.from_string() saves the parsed header,  selector,  and comment
+of each mapping whose sha1sum verifies as:
+
+    <CRDS pickles path>/parsed/<mapping basename>.<sha1 of mapping text>.pkl
+
+Later loads of the identical text reuse the entry,  skipping both the parse
+and the mapping checksum.   Each entry records the CRDS version which wrote it
+and is ignored by other versions since the pickled selector classes change.
+Entries are written with heavy_client.cache_atomic_write() so concurrent
+pipeline processes can share the cache.
+
+>>> text_sha1("header = {}")
+'9c9bde74725f564ddf8d69d72f2fd992095e6fa8'
+"""
+import hashlib
+import pickle
+
+from . import log, config, git_version
+
+# ===================================================================
+
+__all__ = [
+    "text_sha1",
+    "dumps",
+    "load",
+    "save",
+    ]
+
+def text_sha1(text):
+    """Return the hex sha1sum of the complete mapping `text`."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def dumps(parsed):
+    """Return the parse cache entry for (header, selector, comment) `parsed` as bytes."""
+    return pickle.dumps(dict(
+        crds_version = git_version.__version__,
+        parsed = parsed,
+        ), protocol=pickle.HIGHEST_PROTOCOL)
+
+def load(basename, sha1):
+    """Return the cached (header, selector, comment) of mapping `basename` with
+    text checksum `sha1`,  or None if there is no usable entry.
+    """
+    path = config.locate_parsed_mapping(basename, sha1)
+    try:
+        with open(path, "rb") as handle:
+            entry = pickle.load(handle)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        log.verbose_warning("Failed loading parse cache entry", repr(path), ":", repr(exc))
+        return None
+    if entry["crds_version"] != git_version.__version__:
+        log.verbose("Ignoring parse cache entry", repr(path), "from a different version of CRDS.")
+        return None
+    log.verbose("Loaded parsed mapping", repr(basename), "from", repr(path), verbosity=55)
+    return entry["parsed"]
+
+def save(basename, sha1, contents):
+    """Save dumps() `contents` as the parse cache entry for mapping `basename`
+    with text checksum `sha1`.
+    """
+    from . import heavy_client
+    path = config.locate_parsed_mapping(basename, sha1)
+    heavy_client.cache_atomic_write(path, contents, "MAPPING PARSE CACHE")
@@ -54,14 +54,19 @@ True
 import os.path
 import glob
 import json
+import functools
+import multiprocessing
+import threading
+import weakref
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict, Counter
+from concurrent import futures
 
 # ===================================================================
 
 from pkg_resources import Requirement
 
-from . import log, utils, config, selectors, substitutions
+from . import log, utils, config, selectors, substitutions, parse_cache
 
 # XXX For backward compatability until refactored away.
 from .config import locate_file, locate_mapping, locate_reference
@@ -70,6 +75,7 @@ from .config import mapping_exists, is_mapping
 from . import exceptions as crexc
 from .custom_dict import LazyFileDict
 from .mapping_verifier import MAPPING_VERIFIER
+from .mapping_reader import read_mapping
 from .log import srepr
 from .constants import ALL_OBSERVATORIES, INSTRUMENT_KEYWORDS
 
@@ -91,6 +97,9 @@ __all__ = [
     "list_mappings",
     "list_references",
     "get_best_references",
+    "get_best_references_batch",
+    "get_bestref_cache_stats",
+    "set_bestref_cache_size",
     "mapping_type",
 ]
 
@@ -100,6 +109,30 @@ Filetype = namedtuple("Filetype","header_keyword,extension,rmap")
 Failure  = namedtuple("Failure","header_keyword,message")
 Filemap  = namedtuple("Filemap","date,file,comment")
 
+# ===================================================================
+
+# Maximum number of lookups memoized by each ReferenceMapping,  0 disables.
+BESTREF_CACHE_SIZE = config.BESTREF_CACHE_SIZE.get()
+
+# Process-wide hit/miss/eviction counts for the ReferenceMapping bestref caches.
+BESTREF_CACHE_STATS = Counter()
+
+def set_bestref_cache_size(size):
+    """Set the maximum number of bestrefs lookups memoized per rmap to `size`,
+    0 disables memoization.  Return the old size.
+    """
+    global BESTREF_CACHE_SIZE
+    old, BESTREF_CACHE_SIZE = BESTREF_CACHE_SIZE, int(size)
+    return old
+
+def get_bestref_cache_stats():
+    """Return a dict of the process-wide bestref cache hits, misses, and evictions."""
+    return { name : BESTREF_CACHE_STATS[name] for name in ["hits", "misses", "evictions"] }
+
+def clear_bestref_cache_stats():
+    """Zero the process-wide bestref cache counters."""
+    BESTREF_CACHE_STATS.clear()
+
 # =============================================================================
 
 class LowerCaseDict(dict):
@@ -257,20 +290,38 @@ class Mapping:
         name of the mapping.
         """
         log.verbose("Loading mapping", repr(basename), verbosity=55)
+        basename, text = cls._read_file(basename, **keys)
+        return cls.from_string(text, basename, *args, **keys)
+
+    @classmethod
+    def _read_file(cls, basename, **keys):
+        """Return (name, text) for mapping file `basename`,  where name includes
+        `path` if it is specified.
+        """
         path = keys.get("path", None)
         if path:
             filename = os.path.join(path, os.path.basename(basename))
             basename = filename
         else:
             filename = config.locate_mapping(basename)
-        text = utils.get_uri_content(filename)
-        return cls.from_string(text, basename, *args, **keys)
+        return basename, utils.get_uri_content(filename)
 
     @classmethod
     def from_string(cls, text, basename="(noname)", *args, **keys):
         """Construct a mapping from string `text` nominally named `basename`."""
         keys.pop("comment", None) #  discard comment if defined
+        use_parse_cache = config.MAPPING_PARSE_CACHE and config.is_mapping(basename)
+        if use_parse_cache:
+            sha1 = parse_cache.text_sha1(text)
+            parsed = parse_cache.load(basename, sha1)
+            if parsed is not None:   # checksum verified when saved
+                header, selector, comment = parsed
+                mapping = cls(basename, header, selector, comment=comment, **keys)
+                mapping._checksum_verified = True
+                return mapping
         header, selector, comment = cls._parse_header_selector(text, basename)
+        if use_parse_cache:
+            entry = parse_cache.dumps((header, selector, comment))
         mapping = cls(basename, header, selector, comment=comment, **keys)
         try:
             mapping._check_hash(text)
@@ -282,6 +333,10 @@ class Mapping:
                 pass
             else:
                 raise
+        else:
+            mapping._checksum_verified = True
+            if use_parse_cache:
+                parse_cache.save(basename, sha1, entry)
         return mapping
 
     @classmethod
@@ -291,6 +346,15 @@ class Mapping:
         """
         with log.augment_exception("Can't load file " + where,
                                    exception_class=crexc.MappingError):
+            if config.FAST_MAPPING_READER:
+                try:
+                    namespace = read_mapping(text)
+                except Exception as exc:
+                    log.verbose("Fast mapping read failed for", repr(where), ":", str(exc),
+                                ": falling back to verified exec.", verbosity=60)
+                else:
+                    header, selector, comment = cls._interpret_namespace(namespace)
+                    return LowerCaseDict(header), selector, comment
             code = MAPPING_VERIFIER.compile_and_check(text)
             header, selector, comment = cls._interpret(code)
         return LowerCaseDict(header), selector, comment
@@ -303,6 +367,13 @@ class Mapping:
         namespace = {}
         namespace.update(selectors.SELECTORS)
         exec(code, namespace)
+        return cls._interpret_namespace(namespace)
+
+    @classmethod
+    def _interpret_namespace(cls, namespace):
+        """Return the header, selector, and comment defined by the mapping
+        assignments in dict `namespace`.
+        """
         header = LowerCaseDict(namespace["header"])
         selector = namespace["selector"]
         comment = namespace.get("comment", None)
@@ -466,6 +537,10 @@ class Mapping:
                         path = path + ((self.filename,),), pars = pars + (self.diff_name,),)
                 else: # either no recursion or key is special and cannot be recursed.
                     nested_diffs = []
+            elif self.selections.same_file(new_mapping.selections, key):
+                # identical names load identical files,  skip loading and comparing them
+                diff = None
+                nested_diffs = []
             elif self._value_name(key) != new_mapping._value_name(key):
                 # replacements in self
                 # different basenames identify context-to-context updates
@@ -736,6 +811,23 @@ class PipelineContext(ContextMapping):
         imap = self.get_imap(instrument)
         return imap.get_best_references(header, include)
 
+    def get_best_references_batch(self, headers, include=None):
+        """Return the list of best references dicts for each of `headers` in order.
+        Headers are grouped by instrument and each group is passed to that instrument's
+        InstrumentContext.get_best_references_batch().
+        """
+        headers = [ dict(header) for header in headers ]   # make copies
+        by_instrument = {}
+        for i, header in enumerate(headers):
+            by_instrument.setdefault(self.get_instrument(header), []).append(i)
+        refs = [None] * len(headers)
+        for instrument, indices in by_instrument.items():
+            imap = self.get_imap(instrument)
+            results = imap.get_best_references_batch([headers[i] for i in indices], include)
+            for i, result in zip(indices, results):
+                refs[i] = result
+        return refs
+
     def get_old_references(self, header, include=None):
         """Return the old references defined in keyword map `header` using this
         context to define the types to return when `include` is None.
@@ -898,7 +990,8 @@ class InstrumentContext(ContextMapping):
         if not include:
             include = self.selections.keys()
         for filekind in include:
-            log.verbose("-"*120, verbosity=55)
+            if log.enabled(55):
+                log.verbose("-"*120, verbosity=55)
             filekind = filekind.lower()
             ref = None
             try:
@@ -911,9 +1004,53 @@ class InstrumentContext(ContextMapping):
                 ref = "NOT FOUND " + str(exc)
             if ref is not None:
                 refs[filekind] = ref
-        log.verbose("-"*120, verbosity=55)
+        if log.enabled(55):
+            log.verbose("-"*120, verbosity=55)
+        return refs
+
+    def get_best_references_batch(self, headers, include=None):
+        """Batch version of get_best_references() returning a list of bestrefs dicts
+        corresponding to each of `headers` in order.   Each rmap evaluates headers
+        which share the same relevant parameter values only once.
+        """
+        headers = list(headers)
+        refs = [ {} for header in headers ]
+        if not include:
+            include = self.selections.keys()
+        for filekind in include:
+            if log.enabled(55):
+                log.verbose("-"*120, verbosity=55)
+            filekind = filekind.lower()
+            try:
+                rmapping = self.get_rmap(filekind)
+            except crexc.IrrelevantReferenceTypeError:
+                results = ["NOT FOUND n/a"] * len(headers)
+            except crexc.OmitReferenceTypeError:
+                results = [None] * len(headers)
+            except Exception as exc:
+                results = ["NOT FOUND " + str(exc)] * len(headers)
+            else:
+                results = rmapping._apply_batch(
+                    functools.partial(self._trapped_best_ref, rmapping), headers)
+            for ref, result in zip(refs, results):
+                if result is not None:
+                    ref[filekind] = result
+        if log.enabled(55):
+            log.verbose("-"*120, verbosity=55)
         return refs
 
+    @staticmethod
+    def _trapped_best_ref(rmapping, header):
+        """Return rmapping.get_best_ref(header) mapping exceptions the same way as get_best_references()."""
+        try:
+            return rmapping.get_best_ref(header)
+        except crexc.IrrelevantReferenceTypeError:
+            return "NOT FOUND n/a"
+        except crexc.OmitReferenceTypeError:
+            return None
+        except Exception as exc:
+            return "NOT FOUND " + str(exc)
+
     def get_old_references(self, header, include=None):
         """Returns a map of old references which were recorded in `header`,
         returning only those types listed in `include` or all types if
@@ -1023,6 +1160,112 @@ class InstrumentContext(ContextMapping):
 
 # ===================================================================
 
+_MISSING = object()   # marks header expression names with no value
+
+class HeaderExpression:
+    """A compiled rmap header expression,  e.g. rmap_relevance,  which is evaluated
+    against only the header keywords it names,  memoizing its value for each distinct
+    tuple of keyword values.
+
+    Names in the expression are resolved against `parkeys` in their original (dotted)
+    form as well as their eval-able form so that headers do not need to be conditioned
+    with utils.condition_header_keys() prior to evaluation.
+
+    >>> source = '(DETECTOR == "UVIS") and (META_EXPOSURE_TYPE != "DARK")'
+    >>> expr = HeaderExpression(source, compile(source, "", "eval"), ["DETECTOR", "META.EXPOSURE.TYPE"])
+    >>> expr.names
+    ('DETECTOR', 'META_EXPOSURE_TYPE')
+    >>> expr({"DETECTOR": "UVIS", "META.EXPOSURE.TYPE": "SCIENCE"})
+    True
+    >>> expr({"DETECTOR": "UVIS", "META_EXPOSURE_TYPE": "DARK"})
+    False
+
+    Missing parkeys are an error unless `define_undefined` is set,  mirroring
+    io.abstract.ensure_keys_defined():
+
+    >>> expr({"DETECTOR": "UVIS"})
+    Traceback (most recent call last):
+    ...
+    NameError: name 'META_EXPOSURE_TYPE' is not defined
+    >>> expr({"DETECTOR": "UVIS"}, define_undefined=True)
+    True
+
+    The (source, code) tuple form returned by ReferenceMapping.get_expr() is still supported:
+
+    >>> source, code = expr
+    >>> source
+    '(DETECTOR == "UVIS") and (META_EXPOSURE_TYPE != "DARK")'
+    """
+    memo_limit = 10000
+
+    def __init__(self, source, code, parkeys=()):
+        self.source = source
+        self.code = code
+        self.names = tuple(sorted(set(code.co_names)))
+        parkeys = set(parkeys)
+        evalable = {}
+        for parkey in sorted(parkeys):
+            evalable.setdefault(parkey.replace(".", "_"), []).append(parkey)
+        # For each name,  the (header key, is_parkey) pairs it can be bound from in order of precedence.
+        self._bindings = []
+        for name in self.names:
+            keys = [key for key in evalable.get(name, []) if key != name] + [name]
+            self._bindings.append((name, tuple((key, key in parkeys) for key in keys)))
+        self._memo = {}
+
+    def __iter__(self):
+        return iter((self.source, self.code))
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(" + repr(self.source) + ")"
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_memo"] = {}
+        return state
+
+    def bind(self, header, define_undefined=False, overrides=None):
+        """Return the tuple of values of self.names from `header`,  _MISSING where undefined."""
+        values = []
+        for name, keys in self._bindings:
+            if overrides and name in overrides:
+                values.append(overrides[name])
+                continue
+            value = _MISSING
+            for key, is_parkey in keys:
+                if define_undefined and is_parkey:
+                    value = header.get(key)
+                    if value is None:
+                        value = "UNDEFINED"
+                    break
+                elif key in header:
+                    value = header[key]
+                    break
+            values.append(value)
+        return tuple(values)
+
+    def evaluate(self, values):
+        """Evaluate this expression with self.names bound to `values`."""
+        namespace = { name : value for (name, value) in zip(self.names, values) if value is not _MISSING }
+        return eval(self.code, {}, namespace)   # secured
+
+    def __call__(self, header, define_undefined=False, overrides=None):
+        """Evaluate this expression in the context of `header`."""
+        values = self.bind(header, define_undefined, overrides)
+        try:
+            return self._memo[values]
+        except KeyError:
+            pass
+        except TypeError:   # unhashable value,  don't memoize
+            return self.evaluate(values)
+        result = self.evaluate(values)
+        if len(self._memo) >= self.memo_limit:
+            self._memo.clear()
+        self._memo[values] = result
+        return result
+
+# ===================================================================
+
 class ReferenceMapping(Mapping):
     """ReferenceMapping manages loading the rmap associated with a single
     reference filetype and instantiate an appropriate selector tree from the
@@ -1083,9 +1326,12 @@ class ReferenceMapping(Mapping):
         del state["_rmap_relevance_expr"]
         del state["_rmap_omit_expr"]
         del state["_parkey_relevance_exprs"]
+        del state["_parkey_relevance_checks"]
         del state["_precondition_header"]
         del state["_fallback_header"]
         del state["_rmap_update_headers"]
+        state.pop("_bestref_cache", None)
+        state.pop("_bestref_lock", None)
         return state
 
     def __setstate__(self, state):
@@ -1100,21 +1346,85 @@ class ReferenceMapping(Mapping):
     def _init_compiled(self):
         """Initialize object fields which contain compiled code objects, special handling for pickling."""
         self._comment_parkeys = tuple(name.lower() for name in self.header.get("comment_parkeys", ()))
-        self._rmap_relevance_expr = self.get_expr(self.header.get("rmap_relevance", "always").replace("always", "True"))
-        self._rmap_omit_expr = self.get_expr(self.header.get("rmap_omit", "False"))
+        self._rmap_relevance_expr = self.get_header_expression(
+            self.header.get("rmap_relevance", "always").replace("always", "True"))
+        self._rmap_omit_expr = self.get_header_expression(self.header.get("rmap_omit", "False"))
 
         relevant  = dict(self.header.get("parkey_relevance", {}))
         relevant.update({
             name : "keep_comments" for name in self._comment_parkeys
         })
         self._parkey_relevance_exprs = {
-            name.lower() : self.get_expr(expr) for (name, expr) in relevant.items()
+            name.lower() : self.get_header_expression(expr) for (name, expr) in relevant.items()
             }
-
-        self._precondition_header = self.get_hook("precondition_header", (lambda self, header: header))
-        self._fallback_header = self.get_hook("fallback_header", (lambda self, header: None))
+        self._parkey_relevance_checks = [
+            (parkey, lparkey, self._parkey_relevance_exprs[lparkey])
+            for (parkey, lparkey) in [(parkey, parkey.lower()) for parkey in self._required_parkeys]
+            if lparkey in self._parkey_relevance_exprs
+            ]
+
+        no_precondition = (lambda self, header: header)
+        no_fallback = (lambda self, header: None)
+        self._precondition_header = self.get_hook("precondition_header", no_precondition)
+        self._fallback_header = self.get_hook("fallback_header", no_fallback)
         self._rmap_update_headers = self.get_hook("rmap_update_headers", None)
 
+        self._bestref_cache = OrderedDict()
+        self._bestref_lock = threading.Lock()
+
+        # Plugin hooks can consult any header keyword so batch grouping falls back to whole headers.
+        if self._precondition_header is no_precondition and self._fallback_header is no_fallback:
+            self._batch_keys = self._get_batch_keys()
+        else:
+            self._batch_keys = None
+
+    def _get_batch_keys(self):
+        """Return the set of eval-able,  upper case keyword names which can affect a bestrefs
+        lookup on this rmap:  the required parkeys and any name referenced by the relevance,
+        omit,  or parkey_relevance expressions.
+        """
+        names = set(self._required_parkeys)
+        exprs = [self._rmap_relevance_expr, self._rmap_omit_expr] + list(self._parkey_relevance_exprs.values())
+        for expr in exprs:
+            names.update(expr.names)
+        return frozenset(name.upper().replace(".", "_") for name in names)
+
+    def _batch_key(self, header):
+        """Return a hashable key for `header` which is identical for any two headers
+        guaranteed to produce the same bestref for this rmap,  or None if no such key
+        can be formed.
+        """
+        if self._batch_keys is None:
+            items = header.items()
+        else:
+            items = [(key, value) for (key, value) in header.items()
+                     if key.upper().replace(".", "_") in self._batch_keys]
+        key = tuple(sorted(items, key=lambda item: item[0]))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _apply_batch(self, func, headers):
+        """Evaluate `func(header)` once for each group of `headers` sharing a batch key,
+        returning the list of results in the same order as `headers`.
+        """
+        results = [None] * len(headers)
+        groups = {}
+        for i, header in enumerate(headers):
+            key = self._batch_key(header)
+            if key is None:
+                key = ("__ungrouped__", i)
+            groups.setdefault(key, []).append(i)
+        log.verbose("Batch bestrefs", repr(self.basename), "evaluating", len(groups),
+                    "unique parameter sets for", len(headers), "headers.", verbosity=55)
+        for indices in groups.values():
+            result = func(headers[indices[0]])
+            for i in indices:
+                results[i] = result
+        return results
+
     def validate(self):
         """Validate the contents of this rmap against the TPN for this
         filekind / reftype.   Each field of each Match tuple must have a value
@@ -1142,6 +1452,11 @@ class ReferenceMapping(Mapping):
         except crexc.MappingFormatError as exc:
             raise crexc.MappingFormatError("Can't load file " + repr(self.basename) + " : " + str(exc)) from exc
 
+    def get_header_expression(self, expr):
+        """Return a HeaderExpression for rmap header expression `expr`,  see get_expr()."""
+        source, compiled = self.get_expr(expr)
+        return HeaderExpression(source, compiled, self._required_parkeys)
+
     def get_hook(self, name, default):
         """Return plugin hook function generically named `name` or `default` if `name` is not defined in
         the associated instrument package or in the rmap header.   Until hooks is defined in header,  get_hook
@@ -1183,10 +1498,26 @@ class ReferenceMapping(Mapping):
                                           "can only compute bestrefs for type", repr(self.filekind), "not", include)
         bestref = self.get_best_ref(header)
         if bestref is not None:
-            return { self.filekind : self.get_best_ref(header) }
+            return { self.filekind : bestref }
         else:
             return {}
 
+    def get_best_references_batch(self, headers, include=None):
+        """Batch version of get_best_references(),  returning a list of bestrefs dicts
+        corresponding to each of `headers` in order.
+        """
+        if include is not None and self.filekind not in include:
+            raise crexc.CrdsUnknownReftypeError(self.__class__.__name__, repr(self.basename),
+                                          "can only compute bestrefs for type", repr(self.filekind), "not", include)
+        return [ { self.filekind : bestref } if bestref is not None else {}
+                 for bestref in self.get_best_ref_batch(headers) ]
+
+    def get_best_ref_batch(self, headers):
+        """Return the list of get_best_ref() results for each of `headers` in order,
+        evaluating headers which share the same relevant parameter values only once.
+        """
+        return self._apply_batch(self.get_best_ref, list(headers))
+
     def get_best_ref(self, header):
         """Return a single best reference value associated with this .rmap and `header`.  Map exceptions
         from nested methods onto simple "NOT FOUND..." strings which are exempted from reference downloads.
@@ -1206,37 +1537,94 @@ class ReferenceMapping(Mapping):
     def _get_best_ref(self, header_in):
         """Return the single reference file basename appropriate for
         `header_in` selected by this ReferenceMapping.
+
+        When BESTREF_CACHE_SIZE is non-zero,  lookup results and exceptions are
+        memoized in a bounded,  thread safe,  LRU cache keyed on the header values
+        which can affect this rmap's result.   A cached exception is raised as a
+        new instance of its class.
         """
+        if BESTREF_CACHE_SIZE <= 0:
+            return self._lookup_best_ref(header_in)
+        key = self._batch_key(header_in)
+        if key is None:
+            return self._lookup_best_ref(header_in)
+        with self._bestref_lock:
+            cached = self._bestref_cache.get(key)
+            if cached is None:
+                BESTREF_CACHE_STATS["misses"] += 1
+            else:
+                BESTREF_CACHE_STATS["hits"] += 1
+                self._bestref_cache.move_to_end(key)
+        if cached is None:
+            try:
+                bestref = self._lookup_best_ref(header_in)
+            except Exception as exc:
+                self._cache_best_ref(key, (None, (exc, exc.__traceback__)))
+                raise
+            self._cache_best_ref(key, (bestref, None))
+            return bestref
+        bestref, error = cached
+        if error is not None:
+            exc, traceback = error
+            raise exc.with_traceback(traceback)   # don't grow the traceback on each hit
+        return bestref
+
+    def _cache_best_ref(self, key, result):
+        """Add (bestref, (exception, original traceback)) `result` to the bestref
+        cache under `key`,  evicting the least recently used entries beyond
+        BESTREF_CACHE_SIZE.
+        """
+        with self._bestref_lock:
+            cache = self._bestref_cache
+            cache[key] = result
+            while len(cache) > BESTREF_CACHE_SIZE:
+                cache.popitem(last=False)
+                BESTREF_CACHE_STATS["evictions"] += 1
+
+    def clear_bestref_cache(self):
+        """Discard any memoized bestrefs lookups for this rmap."""
+        with self._bestref_lock:
+            self._bestref_cache.clear()
+
+    def _lookup_best_ref(self, header_in):
+        """Uncached implementation of _get_best_ref()."""
         header_in = dict(header_in)
-        log.verbose("Getting bestrefs:", self.basename, verbosity=55)
-        expr_header = utils.condition_header_keys(header_in)
-        self.check_rmap_omit(expr_header)     # Should bestref be omitted based on rmap_omit expr?
-        self.check_rmap_relevance(expr_header)  # Should bestref be set N/A based on rmap_relevance expr?
+        verbose = log.enabled(55)
+        if verbose:
+            log.verbose("Getting bestrefs:", self.basename, verbosity=55)
+        self.check_rmap_omit(header_in)     # Should bestref be omitted based on rmap_omit expr?
+        self.check_rmap_relevance(header_in)  # Should bestref be set N/A based on rmap_relevance expr?
         # Some filekinds, .e.g. ACS biasfile, mutate the header
         header = self._precondition_header(self, header_in) # Execute type-specific plugin if applicable
         header = self.map_irrelevant_parkeys_to_na(header)  # Execute rmap parkey_relevance conditions
         try:
             bestref = self.selector.choose(header)
         except Exception as exc:
-            log.verbose("First selection failed:", str(exc), verbosity=55)
+            if verbose:
+                log.verbose("First selection failed:", str(exc), verbosity=55)
             header = self._fallback_header(self, header_in) # Execute type-specific plugin if applicable
             try:
                 if header:
                     header = self.minimize_header(header)
-                    log.verbose("Fallback lookup on", repr(header), verbosity=55)
+                    if verbose:
+                        log.verbose("Fallback lookup on", repr(header), verbosity=55)
                     header = self.map_irrelevant_parkeys_to_na(header) # Execute rmap parkey_relevance conditions
                     bestref = self.selector.choose(header)
                 else:
                     raise
             except Exception as exc:
-                log.verbose("Fallback selection failed:", str(exc), verbosity=55)
+                if verbose:
+                    log.verbose("Fallback selection failed:", str(exc), verbosity=55)
                 if self._reffile_required in ["YES", "NONE"]:
-                    log.verbose("No match found and reference is required:",  str(exc), verbosity=55)
+                    if verbose:
+                        log.verbose("No match found and reference is required:",  str(exc), verbosity=55)
                     raise
                 else:
-                    log.verbose("No match found but reference is not required:",  str(exc), verbosity=55)
+                    if verbose:
+                        log.verbose("No match found but reference is not required:",  str(exc), verbosity=55)
                     raise crexc.IrrelevantReferenceTypeError("No match found and reference type is not required.") from exc
-        log.verbose("Found bestref", repr(self.instrument), repr(self.filekind), "=", repr(bestref), verbosity=55)
+        if verbose:
+            log.verbose("Found bestref", repr(self.instrument), repr(self.filekind), "=", repr(bestref), verbosity=55)
         if MappingSelectionsDict.is_na_value(bestref):
             raise crexc.IrrelevantReferenceTypeError("Rules define this type as Not Applicable for these observation parameters.")
         if MappingSelectionsDict.is_omit_value(bestref):
@@ -1365,14 +1753,15 @@ class ReferenceMapping(Mapping):
     def check_rmap_relevance(self, header):
         """Raise an exception if this rmap's relevance expression evaluated in the context of `header` returns False.
         """
+        expr = self._rmap_relevance_expr
         try:
-            source, compiled = self._rmap_relevance_expr
-            relevant = eval(compiled, {}, header)   # secured
-            log.verbose("Filekind ", repr(self.instrument), repr(self.filekind),
-                        "is relevant:", relevant, repr(source), verbosity=55)
+            relevant = expr(header)
+            if log.enabled(55):
+                log.verbose("Filekind ", repr(self.instrument), repr(self.filekind),
+                            "is relevant:", relevant, repr(expr.source), verbosity=55)
         except Exception as exc:
             log.warning("Failed checking relevance for", repr(self.instrument),
-                        repr(self.filekind), "with expr", repr(source),
+                        repr(self.filekind), "with expr", repr(expr.source),
                         ":", str(exc))
         else:
             if not relevant:
@@ -1381,14 +1770,15 @@ class ReferenceMapping(Mapping):
 
     def check_rmap_omit(self, header):
         """Return True IFF this type should be omitted based on the 'rmap_omit' header expression."""
-        source, compiled = self._rmap_omit_expr
+        expr = self._rmap_omit_expr
         try:
-            omit = eval(compiled, {}, header)   # secured
-            log.verbose("Filekind ", repr(self.instrument), repr(self.filekind),
-                        "should be omitted: ", omit, repr(source), verbosity=55)
+            omit = expr(header)
+            if log.enabled(55):
+                log.verbose("Filekind ", repr(self.instrument), repr(self.filekind),
+                            "should be omitted: ", omit, repr(expr.source), verbosity=55)
         except Exception as exc:
             log.warning("Failed checking OMIT for", repr(self.instrument),
-                        repr(self.filekind), "with expr", repr(source),
+                        repr(self.filekind), "with expr", repr(expr.source),
                         ":", str(exc))
         else:
             if omit:
@@ -1407,22 +1797,20 @@ class ReferenceMapping(Mapping):
         parameter required by the relevance expressions is defined in both datasets and
         reference files.
         """
-        from crds import data_file
-        expr_header = dict(header)
-        expr_header = data_file.ensure_keys_defined(expr_header, needed_keys=self._required_parkeys)
-        expr_header = utils.condition_header_keys(expr_header)
+        expr_header = header
         header = dict(header)  # copy
-        expr_header["keep_comments"] = keep_comments
-        for parkey in self._required_parkeys:  # Only add/overwrite irrelevant
-            lparkey = parkey.lower()
-            if lparkey in self._parkey_relevance_exprs:
-                source, compiled = self._parkey_relevance_exprs[lparkey]
-                relevant = eval(compiled, {}, expr_header)  # secured
+        overrides = { "keep_comments" : keep_comments }
+        verbose = log.enabled(55)
+        for parkey, lparkey, expr in self._parkey_relevance_checks:  # Only add/overwrite irrelevant
+            # Missing parkeys are evaluated as UNDEFINED,  see io.abstract.ensure_keys_defined()
+            relevant = expr(expr_header, define_undefined=True, overrides=overrides)
+            if verbose:
                 log.verbose("Parkey", self.instrument, self.filekind, lparkey,
-                            "is relevant:", relevant, repr(source), verbosity=55)
-                if not relevant:
+                            "is relevant:", relevant, repr(expr.source), verbosity=55)
+            if not relevant:
+                if log.enabled():
                     log.verbose("Setting irrelevant parkey", repr(parkey), "to N/A")
-                    header[parkey] = "N/A"
+                header[parkey] = "N/A"
         return header
 
     def insert_reference(self, reffile):
@@ -1521,6 +1909,7 @@ class ReferenceMapping(Mapping):
         new = self.copy()
         new.selector.insert(header, value,
             self.tpn_valid_values if not config.ALLOW_BAD_PARKEY_VALUES else {})
+        new.clear_bestref_cache()
         return new
 
     def delete(self, terminal):
@@ -1530,6 +1919,7 @@ class ReferenceMapping(Mapping):
         deleted_count = new.selector.delete(terminal)
         if deleted_count == 0:
             raise crexc.CrdsError("Terminal '%s' could not be found and deleted." % terminal)
+        new.clear_bestref_cache()
         return new
 
     def todict(self, recursive=10):
@@ -1624,9 +2014,78 @@ def _load_mapping(mapping, **keys):
             raise ValueError("Unknown mapping type for " + repr(mapping))
 
     if config.S3_ENABLED:
-        return cls.from_s3(mapping, **keys)
+        loaded = cls.from_s3(mapping, **keys)
     else:
-        return cls.from_file(mapping, **keys)
+        loaded = cls.from_file(mapping, **keys)
+    if keys["loader"] is get_cached_mapping:
+        loaded = intern_mapping(loaded)
+    return loaded
+
+# =============================================================================
+
+# Canonical ReferenceMappings shared by loaded contexts,  keyed on (name, sha1sum)
+_INTERNED_MAPPINGS = weakref.WeakValueDictionary()
+
+# { (name, sha1sum) : count of duplicate ReferenceMappings replaced by the canonical one }
+_INTERN_DUPLICATES = Counter()
+
+_INTERN_LOCK = threading.Lock()
+
+def intern_mapping(mapping):
+    """Return the canonical ReferenceMapping with the same name and sha1sum as
+    ReferenceMapping `mapping`,  registering `mapping` as canonical if there is
+    none yet,  so that every context which loads the same named rmap shares one
+    object.   Other mappings,  and rmaps whose checksums were not verified,  are
+    returned unchanged.   Disabled by CRDS_INTERN_MAPPINGS=0.
+    """
+    if (not isinstance(mapping, ReferenceMapping) or
+        not mapping.__dict__.get("_checksum_verified", False) or
+        not config.INTERN_MAPPINGS):
+        return mapping
+    key = (mapping.basename, mapping.header["sha1sum"])
+    with _INTERN_LOCK:
+        canonical = _INTERNED_MAPPINGS.get(key)
+        if canonical is None:
+            _INTERNED_MAPPINGS[key] = canonical = mapping
+        elif canonical is not mapping:
+            _INTERN_DUPLICATES[key] += 1
+    return canonical
+
+def intern_context(context):
+    """Replace the loaded ReferenceMappings of `context` and its loaded
+    InstrumentContexts with their intern_mapping() canonical versions,
+    nominally to share rmaps between contexts loaded from pickles or
+    snapshots.   Return `context`.
+    """
+    if isinstance(context, ContextMapping):
+        for key, value in context.selections.loaded_items():
+            if isinstance(value, ContextMapping):
+                intern_context(value)
+            elif isinstance(value, ReferenceMapping):
+                context.selections.replace_loaded(key, intern_mapping(value))
+    return context
+
+def get_mapping_intern_stats(sizes=False):
+    """Return a dict describing the sharing of interned ReferenceMappings:
+
+    mappings    -- number of canonical rmaps currently alive
+    shared      -- number of duplicate rmaps replaced by canonical ones
+    bytes_saved -- if `sizes`,  the approximate bytes of the replaced duplicates,
+                   which requires walking the canonical rmaps.
+    """
+    with _INTERN_LOCK:
+        interned = dict(_INTERNED_MAPPINGS.items())
+        duplicates = dict(_INTERN_DUPLICATES)
+    stats = dict(mappings=len(interned), shared=sum(duplicates.values()))
+    if sizes:
+        stats["bytes_saved"] = sum(count * utils.approximate_size(interned[key])
+                                   for (key, count) in duplicates.items() if key in interned)
+    return stats
+
+def clear_mapping_intern_stats():
+    """Reset the counts of duplicate ReferenceMappings replaced by interning."""
+    with _INTERN_LOCK:
+        _INTERN_DUPLICATES.clear()
 
 def asmapping(filename_or_mapping, cached=False, **keys):
     """Return the Mapping object corresponding to `filename_or_mapping`.
@@ -1658,6 +2117,92 @@ def asmapping(filename_or_mapping, cached=False, **keys):
 
 # =============================================================================
 
+_MAPPING_CLASSES = {
+    ".pmap" : PipelineContext,
+    ".imap" : InstrumentContext,
+    ".rmap" : ReferenceMapping,
+    }
+
+def cache_mapping_closure(mappings, threads=None, processes=None, **keys):
+    """Load mapping name or list of names `mappings` and every mapping they
+    refer to directly or indirectly,  adding all of them to the
+    get_cached_mapping() cache in one step.
+
+    get_cached_mapping() demand loads submappings one at a time as each context
+    is accessed.   Here the submappings of each context are discovered from
+    its selector as soon as it is read,  up to `threads` mapping files are read,
+    checksummed,  and parsed concurrently,  and .rmaps are parsed by a pool of
+    `processes` worker processes.  `threads` and `processes` default to
+    CRDS_CLOSURE_LOAD_THREADS and CRDS_CLOSURE_LOAD_PROCESSES.   With fewer
+    than 2 processes .rmaps are parsed by the reading threads.
+
+    Mappings which fail to load are reported at verbose level and not cached,
+    leaving get_cached_mapping() to raise the error on demand.
+
+    Return the list of mapping names added to the cache.
+    """
+    if isinstance(mappings, str):
+        mappings = [mappings]
+    keys["loader"] = get_cached_mapping
+    threads = threads or config.CLOSURE_LOAD_THREADS.get()
+    processes = config.CLOSURE_LOAD_PROCESSES.get() if processes is None else processes
+    parse_pool = None
+    if processes > 1:
+        parse_pool = futures.ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+    added, pending, seen, names = [], {}, set(), list(mappings)
+    try:
+        with futures.ThreadPoolExecutor(max(threads, 1)) as read_pool:
+            while names or pending:
+                for name in names:
+                    if name in seen or os.path.splitext(name)[1] not in _MAPPING_CLASSES:
+                        continue
+                    seen.add(name)
+                    cached = _load_mapping.get(_load_mapping.cache_key(name, **keys))
+                    if cached is None:
+                        future = read_pool.submit(_read_closure_mapping, name, parse_pool is None, keys)
+                        pending[future] = name
+                    elif isinstance(cached, ContextMapping):
+                        names.extend(cached.selections.normal_names())
+                names = []
+                if not pending:
+                    break
+                done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    with log.verbose_warning_on_exception("Failed bulk loading mapping", repr(name)):
+                        result = future.result()
+                        if isinstance(result, tuple):   # .rmap (basename, text) for a worker process
+                            pending[parse_pool.submit(_parse_closure_mapping, *result, keys)] = name
+                            continue
+                        _load_mapping.setdefault(_load_mapping.cache_key(name, **keys), result)
+                        added.append(name)
+                        if isinstance(result, ContextMapping):
+                            names.extend(result.selections.normal_names())
+    finally:
+        if parse_pool is not None:
+            parse_pool.shutdown()
+    return added
+
+def _read_closure_mapping(name, parse_rmaps, keys):
+    """Read mapping `name` for cache_mapping_closure() returning the loaded Mapping,
+    or (basename, text) for an .rmap when `parse_rmaps` is False.
+    """
+    cls = _MAPPING_CLASSES[os.path.splitext(name)[1]]
+    log.verbose("Loading mapping", repr(name), verbosity=55)
+    if config.S3_ENABLED:
+        basename, text = name, utils.get_uri_content(config.get_uri(name))
+    else:
+        basename, text = cls._read_file(name, **keys)
+    if cls is ReferenceMapping and not parse_rmaps:
+        return basename, text
+    return cls.from_string(text, basename, **keys)
+
+def _parse_closure_mapping(basename, text, keys):
+    """Worker process function of cache_mapping_closure() which parses .rmap `text`."""
+    return ReferenceMapping.from_string(text, basename, **keys)
+
+# =============================================================================
+
 class MappingSelectionsDict(LazyFileDict):
     """MappingSelectionsDict is a LazyFileDict with customized special values specific to CRDS.
     Mappings.
@@ -1739,6 +2284,29 @@ def list_pickles(glob_pattern, observatory, full_path=False):
         pickles = [pkl for pkl in pickles if not os.path.isdir(pkl)]
     return sorted(set(pickles))
 
+def list_snapshots(glob_pattern, observatory, full_path=False):
+    """Return the list of cached context snapshots for `observatory` which match `glob_pattern`."""
+    pattern = config.locate_snapshot(glob_pattern, observatory)
+    snapshots = _glob_list(pattern, full_path)
+    if full_path:
+        snapshots = [snap for snap in snapshots if not os.path.isdir(snap)]
+    return sorted(set(snapshots))
+
+def list_parsed_mappings(glob_pattern, observatory, full_path=False):
+    """Return the list of parse cache entries for `observatory` whose mapping names match `glob_pattern`."""
+    pattern = config.locate_parsed_mapping(glob_pattern, "*", observatory)
+    return _glob_list(pattern, full_path)
+
+def list_split_pickles(glob_pattern, observatory, full_path=False):
+    """Return the list of cached split pickle context shells for `observatory` which match `glob_pattern`."""
+    pattern = config.locate_split_pickle(glob_pattern, observatory)
+    return _glob_list(pattern, full_path)
+
+def list_closure_indexes(glob_pattern, observatory, full_path=False):
+    """Return the list of closure index entries for `observatory` whose mapping names match `glob_pattern`."""
+    pattern = config.locate_closure_index(glob_pattern, "*", observatory)
+    return _glob_list(pattern, full_path)
+
 def _glob_list(pattern, full_path=False):
     """Return the sorted glob of `pattern`, with/without path depending on `full_path`."""
     if full_path:
@@ -1823,6 +2391,19 @@ def get_best_references(context_file, header, include=None, condition=True):
         minheader = utils.condition_header(minheader)
     return ctx.get_best_references(minheader, include=include)
 
+def get_best_references_batch(context_file, headers, include=None, condition=True):
+    """Compute the best references for each of `headers` for the given CRDS
+    `context_file`,  returning a list of bestrefs dicts in the same order as
+    `headers`.   Headers with identical relevant parameters are evaluated
+    only once per rmap.   See get_best_references().
+    """
+    ctx = asmapping(context_file, cached=True)
+    minheaders = [ ctx.minimize_header(header) for header in headers ]
+    if condition:
+        minheaders = utils.condition_headers(minheaders)
+    log.verbose("Batch bestrefs for", len(minheaders), "headers.", verbosity=55)
+    return ctx.get_best_references_batch(minheaders, include=include)
+
 
 def test():
     """Run module doctests."""
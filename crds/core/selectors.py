@@ -86,12 +86,14 @@ with ClosestTime utilizing "time" and SelectVersion utilizing "sw_version".
 # ==============================================================================
 
 import re
+import bisect
 import fnmatch
 import sys
 import numbers
 from collections import namedtuple
 import ast
 import copy
+import datetime
 from pprint import pprint as pp
 
 # import numpy as np
@@ -542,10 +544,17 @@ class Selector:
         """Given `header`,  operate on self.keys() to choose one of self.choices()."""
         self._check_defined(header)
         lookup_key = self._validate_header(header)  # may return header or a key
+        return self._choose_from(self.get_selection(lookup_key), header)
+
+    def _choose_from(self, selections, header):
+        """Return the choice of the first of `selections` which resolves for `header`,
+        or raise CrdsLookupError noting the last failed attempt.
+        """
         last_exc = None
-        for selection in self.get_selection(lookup_key):  # iterate over weighted selections, best match first.
+        for selection in selections:  # iterate over weighted selections, best match first.
             try:
-                log.verbose("Trying", selection, verbosity=60)
+                if log.enabled(60):
+                    log.verbose("Trying", selection, verbosity=60)
                 return self.get_choice(selection, header) # recursively,  what's final choice?
             except CrdsLookupError as exc:
                 last_exc = exc
@@ -820,8 +829,16 @@ class Selector:
         """Remove all instances of `terminal` from `self`."""
         deleted = self._delete(self._selections, terminal)
         deleted += self._delete( self._raw_selections, terminal)
+        if deleted:
+            self._selections_changed()
         return deleted
 
+    def _selections_changed(self):
+        """Overridable hook to rebuild lookup structures derived from
+        self._selections after it is mutated in place,  e.g. by delete().
+        """
+        pass
+
     def _delete(self, selections, terminal):
         """Remove all instances of `terminal` from `selections`.   Directly mutates selections."""
         deleted = 0
@@ -1644,6 +1661,160 @@ class MatchSelection(Selection):
     reduces to a single merged choice.
     """
 
+# ==============================================================================
+
+class MatchColumn:
+    """MatchColumn is the compiled form of one parameter position across all of
+    a MatchSelector's match tuples.   Plain literal Matchers are hashed into
+    exact value buckets,  N/A matchers are kept as an always-surviving set,  and
+    everything else (globs, regexes, inequalities, NOT, etc.) is kept in a small
+    residual list which is evaluated the hard way.
+
+    lookup() returns (survivors, hits) as frozensets of match ids where
+    survivors are the ids which did not return -1 and hits are the ids which
+    returned 1.   Results are memoized per header value since the vocabulary of
+    matching values (detectors, filters, apertures...) is tiny.
+
+    >>> col = MatchColumn([Matcher("A"), Matcher("B"), NaMatcher(), matcher("A|C")])
+
+    >>> sorted(col.lookup("A")[0]), sorted(col.lookup("A")[1])
+    ([0, 2, 3], [0, 3])
+
+    >>> sorted(col.lookup("C")[0]), sorted(col.lookup("C")[1])
+    ([2, 3], [3])
+
+    >>> sorted(col.lookup("*")[0]), sorted(col.lookup("*")[1])
+    ([0, 1, 2, 3], [0, 1, 3])
+
+    >>> sorted(col.lookup("N/A")[0]), sorted(col.lookup("N/A")[1])
+    ([0, 1, 2, 3], [])
+    """
+    memo_limit = 1000
+
+    def __init__(self, matchers):
+        self._exact = {}
+        self._residual = []
+        plain, na_ids = set(), set()
+        for match_id, matcher_obj in enumerate(matchers):
+            if type(matcher_obj) is Matcher:
+                self._exact.setdefault(matcher_obj._key, set()).add(match_id)
+                plain.add(match_id)
+            elif type(matcher_obj) is NaMatcher:
+                na_ids.add(match_id)
+            else:
+                self._residual.append((match_id, matcher_obj))
+        self._exact = { key : frozenset(ids) for (key, ids) in self._exact.items() }
+        self._plain = frozenset(plain)
+        self._na = frozenset(na_ids)
+        self._memo = {}
+
+    def __getstate__(self):
+        """Don't pickle the memo table,  it is rebuilt on demand."""
+        state = dict(self.__dict__)
+        state["_memo"] = {}
+        return state
+
+    def lookup(self, value):
+        """Return (survivors, hits) frozensets of match ids for header `value`."""
+        try:
+            return self._memo[value]
+        except KeyError:
+            result = self._lookup(value)
+            if len(self._memo) >= self.memo_limit:
+                self._memo.clear()
+            self._memo[value] = result
+            return result
+        except TypeError:   # unhashable value,  don't memoize
+            return self._lookup(value)
+
+    def _lookup(self, value):
+        """Evaluate every matcher of this column against `value`,  see Matcher.match()."""
+        try:
+            bucket = self._exact.get(value, frozenset())
+        except TypeError:
+            bucket = frozenset(match_id for (key, ids) in self._exact.items()
+                               if key == value for match_id in ids)
+        if value == "*":
+            survivors, hits = set(self._plain), set(self._plain)
+        elif value == "N/A":
+            survivors, hits = set(self._plain), set(bucket)
+        else:
+            survivors, hits = set(bucket), set(bucket)
+        survivors |= self._na
+        for match_id, matcher_obj in self._residual:
+            status = matcher_obj.match(value)
+            if status != -1:
+                survivors.add(match_id)
+                if status == 1:
+                    hits.add(match_id)
+        return frozenset(survivors), frozenset(hits)
+
+class MatchIndex:
+    """MatchIndex is a decision table compiled from MatchSelector selections
+    at rmap load time.   Winnowing becomes an intersection of per-parameter
+    candidate id sets rather than a Python loop over every match tuple for
+    every parameter.
+
+    The results are the same as the original linear winnowing:  for each
+    surviving match tuple the weight is minus the number of parameters which
+    matched exactly (1),  "don't care" (0) matches don't contribute,  and
+    any parameter which doesn't match (-1) eliminates the match tuple.
+
+    >>> index = MatchIndex(("DETECTOR", "FILTER"), {
+    ...     ("UVIS", "N/A") : MatchSelection(((matcher("UVIS"), matcher("N/A")), "a.fits")),
+    ...     ("UVIS", "F555W") : MatchSelection(((matcher("UVIS"), matcher("F555W")), "b.fits")),
+    ...     ("IR", "*") : MatchSelection(((matcher("IR"), matcher("*")), "c.fits")),
+    ... })
+
+    >>> weights, remaining = index.winnow({"DETECTOR" : "UVIS", "FILTER" : "F555W"})
+    >>> weights
+    {('UVIS', 'N/A'): -1, ('UVIS', 'F555W'): -2}
+    >>> list(remaining)
+    [('UVIS', 'N/A'), ('UVIS', 'F555W')]
+
+    >>> index.winnow({"DETECTOR" : "IR", "FILTER" : "F555W"})[0]
+    {('IR', '*'): -2}
+
+    >>> index.winnow({"DETECTOR" : "HRC", "FILTER" : "F555W"})
+    ({}, {})
+    """
+    def __init__(self, parameters, match_selections):
+        self._parameters = tuple(parameters)
+        self._match_tuples = list(match_selections.keys())
+        self._selections = [match_selections[match_tuple] for match_tuple in self._match_tuples]
+        self._columns = [
+            MatchColumn([selection[0][i] for selection in self._selections])
+            for i in range(len(self._parameters))
+        ]
+
+    def winnow(self, header):
+        """Based on the parkey values in `header`,  return the weights and
+        selections of the match tuples which can possibly match,  in the
+        original selection order.
+
+        returns   ( {match_tuple:weight ...},   { match_tuple : MatchSelection ...} )
+        """
+        candidates = None
+        hit_sets = []
+        verbose = log.enabled(60)
+        for parkey, column in zip(self._parameters, self._columns):
+            value = header.get(parkey, "UNDEFINED")
+            if verbose:
+                log.verbose("Binding", repr(parkey), "=", repr(value), verbosity=60)
+            survivors, hits = column.lookup(value)
+            candidates = survivors if candidates is None else candidates & survivors
+            if not candidates:
+                break
+            hit_sets.append(hits)
+        if candidates is None:   # no parameters,  everything matches as don't care.
+            candidates = range(len(self._match_tuples))
+        weights, remaining = {}, {}
+        for match_id in sorted(candidates):
+            match_tuple = self._match_tuples[match_id]
+            weights[match_tuple] = -sum(1 for hits in hit_sets if match_id in hits)
+            remaining[match_tuple] = self._selections[match_id]
+        return weights, remaining
+
 class MatchSelector(Selector):
     """Matching selector does a modified dictionary lookup by directly matching
     the runtime (header) parameters to the selector keys.
@@ -1823,8 +1994,15 @@ Restore original debug behavior:
     def __init__(self, parameters, selections, rmap_header={}):
         super(MatchSelector, self).__init__(parameters, selections, rmap_header)
         self._match_selections = self.get_matcher_selections(dict_wo_dups(self._selections))
+        self._match_index = MatchIndex(self._parameters, self._match_selections)
         self._value_map = self.get_value_map()
 
+    def __setstate__(self, state):
+        """Restore pickled MatchSelector,  compiling the match index if the pickle predates it."""
+        self.__dict__.update(state)
+        if "_match_index" not in state:
+            self._match_index = MatchIndex(self._parameters, self._match_selections)
+
     def _equal_keys(self, key1, key2):
         """Return True IFF `key1` is equivalent to `key2` for rmap modification.  Ignore comment pars."""
         key1, key2 = self.condition_key(key1), self.condition_key(key2)
@@ -1898,7 +2076,7 @@ Restore original debug behavior:
         Successively yield any survivors,  in the order of most specific
         matching value (fewest *'s) to least specific matching value.
         """
-        weights, remaining = self._winnow(header, dict(self._match_selections))
+        weights, remaining = self._winnow(header)
 
         sorted_candidates = self._rank_candidates(weights, remaining)
 
@@ -1915,35 +2093,22 @@ Restore original debug behavior:
                     selector = subselectors
             else:
                 selector = remaining[match_tuples[0]].choice
-            log.verbose("Matched", repr(match_tuples[0]), "returning", repr(selector), verbosity=60)
+            if log.enabled(60):
+                log.verbose("Matched", repr(match_tuples[0]), "returning", repr(selector), verbosity=60)
             yield MatchSelection((match_tuples, selector))
         raise MatchingError("No match found.")
 
-    def _winnow(self, header, remaining):
+    def _winnow(self, header):
         """Based on the parkey values in `header`, winnow out selections
-        from `remaining` which cannot possibly match.  For each surviving
-        selection,  weight each parkey which matches exactly as -1 and
-        "don't care" matches as 0.
+        which cannot possibly match.  For each surviving selection,  weight
+        each parkey which matches exactly as -1 and "don't care" matches as 0.
+
+        Winnowing is done against the precompiled MatchIndex as set
+        intersections of candidate ids rather than a linear scan.
 
         returns   ( {match_tuple:weight ...},   remaining_selections
         """
-        # weights counts the # of parkey value matches, establishing a
-        # goodness-of-match weighting.  negative weights are better matches
-        weights = { match_tuple:0 for match_tuple in remaining.keys() }
-
-        for i, parkey in enumerate(self._parameters):
-            value = header.get(parkey, "UNDEFINED")
-            log.verbose("Binding", repr(parkey), "=", repr(value), verbosity=60)
-            for match_tuple, (matchers, _subselector) in list(remaining.items()):
-                # Match the key to the current header vaue
-                match_status = matchers[i].match(value)
-                # returns 1 (match), 0 (don't care), or -1 (no match)
-                if match_status == -1:
-                    log.verbose("Eliminating", match_tuple, "based on", parkey + "=" + repr(value), verbosity=60)
-                    del remaining[match_tuple]   # winnow!
-                else: # matched or don't care,  set weights accordingly
-                    weights[match_tuple] -= match_status
-        return weights, remaining
+        return self._match_index.winnow(header)
 
     def _rank_candidates(self, weights, remaining):
         """Rank the possible matches in `remaining` according to
@@ -1961,7 +2126,8 @@ Restore original debug behavior:
         # Sort candidates into:  [ (weight, [match_tuples...]) ... ]
         # Lowest weight is best match
         candidates = sorted([(x[0], tuple(x[1])) for x in candidates.items()])
-        log.verbose("Candidates:\n", log.PP(candidates), verbosity=60)
+        if log.enabled(60):
+            log.verbose("Candidates:\n", log.PP(candidates), verbosity=60)
         return candidates
 
     @utils.cached
@@ -2162,6 +2328,17 @@ Empty UseAfterSelectors always raise an exception on choose():
     ...
     UseAfterError: No selection <= '2003-09-01 01:28:00'
 
+Deleting a file recompiles the searched key array:
+
+    >>> u = UseAfterSelector(("DATE-OBS", "TIME-OBS"), {
+    ...        '2003-09-26 01:28:00':'nal1503ij_bia.fits',
+    ...        '2004-02-14 00:00:00':'o3913216j_bia.fits',
+    ... })
+    >>> u.delete('o3913216j_bia.fits')
+    2
+    >>> u.choose({'DATE-OBS': '2005-01-01', 'TIME-OBS': '00:00:00'})
+    'nal1503ij_bia.fits'
+
 Restore debug configuration.
 
     >>> _jnk = log.set_exception_trap(old_debug)
@@ -2169,29 +2346,40 @@ Restore debug configuration.
     """
     error_class = UseAfterError
 
+    def __init__(self, *args, **keys):
+        super(UseAfterSelector, self).__init__(*args, **keys)
+        self._compile_keys()
+
+    def __setstate__(self, state):
+        """Restore pickled selector,  compiling the key array if the pickle predates it."""
+        self.__dict__.update(state)
+        if "_keys" not in state:
+            self._compile_keys()
+
+    def _compile_keys(self):
+        """Precompute the sorted array of selection keys searched by bsearch()."""
+        self._keys = [selection.key for selection in self._selections]
+
+    def _selections_changed(self):
+        """Recompile the key array after self._selections is mutated in place."""
+        self._compile_keys()
+
     def get_selection(self, date):
-        log.verbose("Matching", date, " ", verbosity=60)
-        yield self.bsearch(date, self._selections)
+        if log.enabled(60):
+            log.verbose("Matching", date, " ", verbosity=60)
+        yield self._selections[self.bsearch(date)]
+
+    def bsearch(self, date):
+        """Do a binary search over the sorted key array for the greatest key <= `date`.
 
-    def bsearch(self, date, selections):
-        """Do a binary search over a sorted selections list."""
-        if len(selections) == 0:
+        Return the index of the corresponding selection.
+        """
+        index = bisect.bisect_right(self._keys, date) - 1
+        if index < 0:
             raise self.error_class("No selection <= " + repr(date))
-        elif len(selections) > 1:
-            left = selections[:len(selections)//2]
-            right = selections[len(selections)//2:]
-            compared = right[0].key
-            log.verbose("...against", compared, end="", verbosity=60)
-            if date >= compared:
-                return self.bsearch(date, right)
-            else:
-                return self.bsearch(date, left)
-        else:
-            if date >= selections[0].key:
-                log.verbose("matched", repr(selections[0]), verbosity=60)
-                return selections[0]
-            else:
-                raise self.error_class("No selection <= " + repr(date))
+        if log.enabled(60):
+            log.verbose("matched", repr(self._selections[index]), verbosity=60)
+        return index
 
     def _validate_raw_key(self, key, valid_values_map):
         """Validate a selector date/time field for this UseAfter."""
@@ -2425,7 +2613,90 @@ Restore debug configuration.
 
 # ==============================================================================
 
-class ClosestTimeSelector(UseAfterSelector):
+class NearestKeyMixin:
+    """Mixin for Selectors which choose the selection whose key is numerically
+    nearest the lookup value,  e.g. ClosestTime and GeometricallyNearest.
+
+    The selection keys are converted to numbers once,  sorted,  and searched
+    with numpy.searchsorted() so each lookup only compares the two bracketing
+    keys.   When two keys are equidistant the earlier selection wins.
+
+    get_selections() and choose_many() resolve many lookup values or headers
+    in a single vectorized search.
+    """
+    def __init__(self, *args, **keys):
+        super(NearestKeyMixin, self).__init__(*args, **keys)
+        self._compile_nearest()
+
+    def __setstate__(self, state):
+        """Restore pickled selector,  compiling the key arrays if the pickle predates them."""
+        parent_setstate = getattr(super(NearestKeyMixin, self), "__setstate__", None)
+        if parent_setstate is not None:
+            parent_setstate(state)
+        else:
+            self.__dict__.update(state)
+        if "_nearest_keys" not in state:
+            self._compile_nearest()
+
+    def _selections_changed(self):
+        """Recompile the numeric key arrays after self._selections is mutated in place."""
+        super(NearestKeyMixin, self)._selections_changed()
+        self._compile_nearest()
+
+    def _compile_nearest(self):
+        """Precompute the sorted numeric key array and the selection index of each element."""
+        import numpy as np
+        numbers = np.array([self._key_number(key) for key in self.keys()], dtype=np.float64)
+        self._nearest_order = np.argsort(numbers, kind="stable")
+        self._nearest_keys = numbers[self._nearest_order]
+
+    @classmethod
+    def _key_number(cls, key):
+        """Return selection or lookup `key` as a float for distance computations."""
+        raise NotImplementedError(cls.__name__ + " hasn't defined _key_number.")
+
+    def _nearest_indices(self, lookup_keys):
+        """Return the array of selection indices nearest each of `lookup_keys`."""
+        import numpy as np
+        keys, order = self._nearest_keys, self._nearest_order
+        nkeys = len(keys)
+        if not nkeys:
+            error_class = getattr(self, "error_class", MatchingError)
+            raise error_class("No selection near " + repr(lookup_keys))
+        values = np.array([self._key_number(key) for key in lookup_keys], dtype=np.float64)
+        upper = np.searchsorted(keys, values, side="left")
+        lower = upper - 1
+        upper_clipped, lower_clipped = np.minimum(upper, nkeys-1), np.maximum(lower, 0)
+        lower_delta = np.where(lower >= 0, values - keys[lower_clipped], np.inf)
+        upper_delta = np.where(upper < nkeys, keys[upper_clipped] - values, np.inf)
+        lower_index, upper_index = order[lower_clipped], order[upper_clipped]
+        use_lower = (lower_delta < upper_delta) | ((lower_delta == upper_delta) & (lower_index < upper_index))
+        return np.where(use_lower, lower_index, upper_index)
+
+    def get_selection(self, lookup_key):
+        yield self._selections[self._nearest_indices([lookup_key])[0]]
+
+    def get_selections(self, lookup_keys):
+        """Return the list of nearest selections for each of `lookup_keys` in one vectorized search."""
+        return [self._selections[index] for index in self._nearest_indices(lookup_keys)]
+
+    def choose_many(self, headers):
+        """Return the list of choose() results for each of `headers`,  searching
+        the keys for all headers at once and then recursing into any nested
+        selectors header by header.
+        """
+        lookup_keys = []
+        for header in headers:
+            self._check_defined(header)
+            lookup_keys.append(self._validate_header(header))
+        if not lookup_keys:
+            return []
+        if not len(self._nearest_keys):
+            return [self.choose(header) for header in headers]  # raise exactly as choose() does
+        selections = self.get_selections(lookup_keys)
+        return [self._choose_from([selection], header) for (selection, header) in zip(selections, headers)]
+
+class ClosestTimeSelector(NearestKeyMixin, UseAfterSelector):
     """ClosestTime chooses the selection whose time most closely matches the
     choose() method "time" keyword parameter
 
@@ -2452,16 +2723,19 @@ class ClosestTimeSelector(UseAfterSelector):
 
     >>> t.choose({"time":"2019-04-16 00:00:00"})
     'cref_flatfield_123.fits'
+
+    Many lookup times can be resolved in one vectorized search:
+
+    >>> [selection.choice for selection in t.get_selections(["2016-05-05 00:00:00", "2018-02-02 00:00:00"])]
+    ['cref_flatfield_123.fits', 'cref_flatfield_222.fits']
     """
-    def get_selection(self, date):
-        import numpy as np
-        diff = np.array([abs_time_delta(date, key) for key in self.keys()], 'f')
-        index = np.argmin(diff)
-        yield self._selections[index]
+    @classmethod
+    def _key_number(cls, key):
+        return epoch_seconds(key)
 
 # ==============================================================================
 
-class GeometricallyNearestSelector(Selector):
+class GeometricallyNearestSelector(NearestKeyMixin, Selector):
     """GeometricallyNearest selects the choice whose key is at the smallest
     distance from the specified condition value.
 
@@ -2495,6 +2769,23 @@ class GeometricallyNearestSelector(Selector):
     >>> r.choose({"effective_wavelength":'5.1'})
     'cref_flatfield_137.fits'
 
+Several headers can be resolved with one vectorized search:
+
+    >>> r.choose_many([{"effective_wavelength":'1.0'}, {"effective_wavelength":'3.26'}])
+    ['cref_flatfield_120.fits', 'cref_flatfield_137.fits']
+
+and fail just as choose() does when a nested selector can't resolve a header:
+
+    >>> n = GeometricallyNearestSelector(("effective_wavelength",), {
+    ...    '1.2': UseAfterSelector(("DATE-OBS", "TIME-OBS"), {'2020-01-01 00:00:00': 'cref_flatfield_120.fits'}),
+    ...    '3.5': 'cref_flatfield_124.fits',
+    ... })
+
+    >>> n.choose_many([{"effective_wavelength":'3.3'}, {"effective_wavelength":'1.0', "DATE-OBS":'2019-01-01', "TIME-OBS":'00:00:00'}])
+    Traceback (most recent call last):
+    ...
+    CrdsLookupError: All lookup attempts failed. last exception: No selection <= '2019-01-01 00:00:00'
+
 A GeometricallyNearestSelector doesn't know now to resolve an ambiguous match by
 merging two selectors:
 
@@ -2517,12 +2808,9 @@ Effective_wavelength doesn't have to be covered by valid_values_map:
     def condition_key(cls, key):
         return utils.condition_value(key)
 
-    def get_selection(self, keyval):
-        import numpy as np
-        nkeys = np.array(self.keys(), dtype='f')
-        diff = np.abs(nkeys - keyval)
-        index = np.argmin(diff)
-        yield self._selections[index]
+    @classmethod
+    def _key_number(cls, key):
+        return float(key)
 
     def _validate_raw_key(self, key, valid_values_map):
         parname = self._parameters[0]
@@ -2877,6 +3165,16 @@ def abs_time_delta(time1, time2):
     date2 = timestamp.parse_date(time2)
     return abs((date1-date2).total_seconds())
 
+EPOCH = datetime.datetime(1970, 1, 1)
+
+def epoch_seconds(time1):
+    """Return date/time string `time1` as seconds since 1970-01-01,  ignoring time zones.
+
+    >>> epoch_seconds("1970-01-02 00:00:01")
+    86401.0
+    """
+    return (timestamp.parse_date(time1) - EPOCH).total_seconds()
+
 # ==============================================================================
 
 class Parameters:
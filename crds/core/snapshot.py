@@ -0,0 +1,289 @@
+"""This module defines the CRDS context snapshot,  a compact versioned file
+format for a fully expanded context,  and a reader which materializes mappings
+from it lazily.
+
+A context pickle stores the entire mapping tree as one object which must be
+unpickled,  and every rmap recompiled,  before the first bestref is computed.
+A snapshot instead stores each mapping of the context as an independent record
+so a process only loads the .imaps and .rmaps it actually touches:
+
+    MAGIC      8 bytes     b"CRDSSNAP"
+    HEADER     8 bytes     format version, index length (little endian uint32)
+    INDEX                  pickled dict: format version, CRDS version, root mapping,
+                           string table,  { mapping basename : (offset, length) }
+    RECORDS                one pickle per mapping,  without loaded submappings
+
+Strings in the records are stored once in the shared string table and are
+referred to by index,  so the many repeated parkey names and values of a
+context load as single interned objects.  Selectors are pickled with their
+precomputed match indexes.   The file is memory mapped read-only so concurrent
+pipeline workers share one copy in the OS page cache.
+
+For multiprocessing bestrefs,  a parent which has already loaded a context can
+publish it as a SharedContext,  a snapshot written once into a named shared
+memory segment.   Worker processes call attach_shared_context() with the
+segment name to get a root Mapping reading records directly from the shared
+segment,  so each worker only materializes the mappings its headers select:
+
+    with snapshot.SharedContext(pmap) as shared:
+        with multiprocessing.Pool(initializer=snapshot.attach_shared_context,
+                                  initargs=(shared.name,)) as pool:
+            ...  # workers:  snapshot.attach_shared_context(name).get_best_references(header)
+
+>>> ContextSnapshot.from_bytes(b"not a snapshot")
+Traceback (most recent call last):
+...
+crds.core.exceptions.SnapshotFormatError: Not a CRDS context snapshot '(bytes)'
+"""
+import os
+import io
+import sys
+import mmap
+import struct
+import pickle
+from multiprocessing import shared_memory
+
+from . import rmap, log, git_version
+from .custom_dict import LazyFileDict
+from .exceptions import SnapshotFormatError
+
+# ===================================================================
+
+__all__ = [
+    "ContextSnapshot",
+    "SharedContext",
+    "attach_shared_context",
+    "dumps",
+    "SNAPSHOT_FORMAT_VERSION",
+    ]
+
+SNAPSHOT_MAGIC = b"CRDSSNAP"
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<II")
+
+# ===================================================================
+
+class _SnapshotPickler(pickle.Pickler):
+    """Pickler which writes strings as indexes into a shared string table and
+    omits the loaded submappings of context selections.
+    """
+
+    def __init__(self, file, strings):
+        super(_SnapshotPickler, self).__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._strings = strings
+
+    def persistent_id(self, obj):
+        if obj.__class__ is str:
+            try:
+                return self._strings[obj]
+            except KeyError:
+                self._strings[obj] = index = len(self._strings)
+                return index
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, LazyFileDict):
+            return obj.reduce_unloaded()
+        return NotImplemented
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    """Unpickler which resolves string table indexes written by _SnapshotPickler."""
+
+    def __init__(self, file, strings):
+        super(_SnapshotUnpickler, self).__init__(file)
+        self._strings = strings
+
+    def persistent_load(self, index):
+        return self._strings[index]
+
+# ===================================================================
+
+def _collect(mapping, mappings):
+    """Add `mapping` and all of its descendents to dict `mappings`,  keyed by basename."""
+    mappings[mapping.basename] = mapping
+    if isinstance(mapping, rmap.ContextMapping):
+        for child in mapping.selections.normal_values():
+            _collect(child, mappings)
+    return mappings
+
+def dumps(context):
+    """Return the snapshot file contents for loaded Mapping `context` as bytes.
+
+    NOTE:  this requires a full load of `context`.
+    """
+    mappings = _collect(context, {})
+    strings = {}
+    records, blobs, offset = {}, [], 0
+    for name in sorted(mappings):
+        blob = io.BytesIO()
+        _SnapshotPickler(blob, strings).dump(mappings[name])
+        blob = blob.getvalue()
+        records[name] = (offset, len(blob))
+        blobs.append(blob)
+        offset += len(blob)
+    index = pickle.dumps(dict(
+        format_version = SNAPSHOT_FORMAT_VERSION,
+        crds_version = git_version.__version__,
+        root = context.basename,
+        strings = sorted(strings, key=strings.get),
+        records = records,
+        ), protocol=pickle.HIGHEST_PROTOCOL)
+    return SNAPSHOT_MAGIC + _HEADER.pack(SNAPSHOT_FORMAT_VERSION, len(index)) + index + b"".join(blobs)
+
+# ===================================================================
+
+class ContextSnapshot:
+    """Read-only view of a context snapshot which loads mappings on demand.
+
+    Mappings loaded from the snapshot are cached by the snapshot,  so each name
+    corresponds to exactly one Mapping object,  and their selections demand load
+    submappings from the snapshot rather than from the CRDS cache.   Loaded
+    rmaps are interned so they are shared with other contexts in the process.
+    """
+
+    def __init__(self, data, filename="(bytes)"):
+        self.filename = filename
+        self._data = data
+        prefix = len(SNAPSHOT_MAGIC) + _HEADER.size
+        if len(data) < prefix or data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise SnapshotFormatError("Not a CRDS context snapshot", repr(filename))
+        version, index_length = _HEADER.unpack(data[len(SNAPSHOT_MAGIC):prefix])
+        if version != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotFormatError(
+                "Unsupported snapshot format version", version, "for", repr(filename))
+        index = pickle.loads(data[prefix:prefix + index_length])
+        if index["crds_version"] != git_version.__version__:
+            raise SnapshotFormatError(
+                "Snapshot", repr(filename), "was written by a different version of CRDS.")
+        self.root = index["root"]
+        self._records = index["records"]
+        self._strings = [sys.intern(string) for string in index["strings"]]
+        self._records_offset = prefix + index_length
+        self._loaded = {}
+
+    @classmethod
+    def from_file(cls, filename):
+        """Memory map snapshot `filename` and return a ContextSnapshot for it."""
+        with open(filename, "rb") as handle:
+            data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data, filename)
+
+    @classmethod
+    def from_shared_memory(cls, name):
+        """Attach to the shared memory segment `name` written by SharedContext
+        and return a ContextSnapshot reading records in place from it.
+        """
+        try:
+            segment = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            raise SnapshotFormatError("Shared context segment", repr(name), "does not exist.")
+        snapshot = cls(segment.buf, "shm:" + name)
+        snapshot._segment = segment   # keep the mapping open while the snapshot lives
+        return snapshot
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Return a ContextSnapshot for snapshot contents `data`,  e.g. from dumps()."""
+        return cls(data)
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(" + repr(self.filename) + ")"
+
+    def __contains__(self, name):
+        return os.path.basename(name) in self._records
+
+    def names(self):
+        """Return the sorted basenames of all mappings in this snapshot."""
+        return sorted(self._records)
+
+    def loaded_names(self):
+        """Return the sorted basenames of the mappings materialized so far."""
+        return sorted(self._loaded)
+
+    def load_root(self):
+        """Return the root Mapping of this snapshot."""
+        return self.load(self.root)
+
+    def load(self, name, **keys):
+        """Return the Mapping named `name` from this snapshot,  loading it on first use.
+
+        The signature matches the rmap loaders so that this method can serve as
+        the "loader" of a ContextMapping's selections.
+        """
+        name = os.path.basename(name)
+        try:
+            return self._loaded[name]
+        except KeyError:
+            pass
+        try:
+            offset, length = self._records[name]
+        except KeyError:
+            raise SnapshotFormatError("Mapping", repr(name), "is not in snapshot", repr(self.filename))
+        start = self._records_offset + offset
+        log.verbose("Loading mapping", repr(name), "from snapshot", repr(self.filename), verbosity=55)
+        with log.augment_exception("Can't load", repr(name), "from snapshot", repr(self.filename)):
+            mapping = _SnapshotUnpickler(io.BytesIO(self._data[start:start + length]), self._strings).load()
+        if isinstance(mapping, rmap.ContextMapping):
+            mapping.selections.set_loader(self.load)
+        else:
+            mapping = rmap.intern_mapping(mapping)
+        self._loaded[name] = mapping
+        return mapping
+
+# ===================================================================
+
+class SharedContext:
+    """The snapshot of a loaded context published in a named shared memory
+    segment for worker processes on the same host.
+
+    The segment is created and filled once by the parent and is read-only by
+    convention thereafter.   Workers attach with attach_shared_context(name),
+    mapping the same physical pages rather than each loading and holding its
+    own copy of the context tree.   The parent owns the segment and removes it
+    with close(),  or on exit from a with-block,  after the workers finish.
+    """
+
+    def __init__(self, context):
+        data = dumps(context)
+        self.root = context.basename
+        self.size = len(data)
+        self._segment = shared_memory.SharedMemory(create=True, size=self.size)
+        self._segment.buf[:self.size] = data
+        self.name = self._segment.name
+        log.verbose("Shared context", repr(self.root), "in segment", repr(self.name),
+                    "of", self.size, "bytes.", verbosity=55)
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(" + repr(self.root) + ", name=" + repr(self.name) + ")"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release and remove the shared memory segment.   Workers must be done."""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment.unlink()
+            self._segment = None
+
+_ATTACHED = {}
+
+def attach_shared_context(name):
+    """Return the root Mapping of the SharedContext in segment `name`.
+
+    The snapshot is attached once per process and reused by later calls,  so
+    this function works both as a multiprocessing Pool initializer and as the
+    way workers obtain the context for each task.
+    """
+    try:
+        return _ATTACHED[name].load_root()
+    except KeyError:
+        pass
+    _ATTACHED[name] = snapshot = ContextSnapshot.from_shared_memory(name)
+    log.verbose("Attached shared context", repr(snapshot.root), "from segment", repr(name), verbosity=55)
+    return snapshot.load_root()
@@ -11,6 +11,10 @@ import re
 import hashlib
 import io
 import functools
+from concurrent import futures
+import threading
+import time
+import types
 from collections import Counter, defaultdict
 import datetime
 import ast
@@ -166,6 +170,9 @@ def cached(func):
     .uncached(*args, **keys)    -- original unwrapped function
     .readonly(*args, **keys)    -- function variant which uses but doesn't update cache
     .cache_key(*args, **keys)   -- returns tuple used to locate a function call result
+    .clear()                    -- empties the cache
+    .stats()                    -- returns dict of entries, hits, misses, evictions, bytes, ...
+    .set_limits(...)            -- bounds the cache,  see xcached
 
     >>> @cached
     ... def sum(x,y):
@@ -196,7 +203,7 @@ def cached(func):
 
     Clear the cache like this:
 
-    >>> sum.cache.clear()
+    >>> sum.clear()
     >>> sum(1,2)
     really doing it.
     3
@@ -204,7 +211,7 @@ def cached(func):
     A variant of the function which reads but does not update the cache is available.
     After calling the read_only variant the cache is not updated:
 
-    >>> sum.cache.clear()
+    >>> sum.clear()
     >>> sum.readonly(1,2)
     really doing it.
     3
@@ -240,6 +247,26 @@ class xcached:
 
     >>> sum.readonly(2,2,3)
     6
+
+    maxsize bounds the number of cached results,  evicting the least recently
+    used:
+
+    >>> @xcached(maxsize=2)
+    ... def square(x):
+    ...     return x * x
+
+    >>> square(1), square(2), square(1), square(3)
+    (1, 4, 1, 9)
+
+    >>> square.cache
+    {(1,): 1, (3,): 9}
+
+    >>> stats = square.stats()
+    >>> stats["entries"], stats["hits"], stats["misses"], stats["evictions"]
+    (2, 1, 3, 1)
+
+    maxweight bounds the total weight of cached results as computed by weigher,
+    by default approximate_size().   ttl expires results after ttl seconds.
     """
     def __init__(self, *args, **keys):
         """Stash the decorator parameters"""
@@ -258,31 +285,146 @@ class xcached:
 class CachedFunction:
     """Class to support the @cached function decorator.   Called at runtime
     for typical caching version of function.
+
+    By default the cache is unbounded.   Optionally it is limited to `maxsize`
+    entries and/or `maxweight` total weight of values measured by `weigher`,
+    evicting least recently used entries first,  and entries expire `ttl`
+    seconds after they are added.   Access to the cache is thread-safe but
+    the function itself is called without holding the lock.
+
+    Calls which add to the cache are single-flight:  while one thread computes
+    the result for a key,  other threads calling with the same key wait for
+    and share that result or exception rather than computing it again.   The
+    in-flight calls are tracked in lock stripes selected by key hash so that
+    threads computing unrelated keys rarely contend.
     """
 
     cache_set = set()
 
-    def __init__(self, func, omit_from_key=None):
+    stripe_count = 16
+
+    def __init__(self, func, omit_from_key=None, maxsize=None, ttl=None, maxweight=None, weigher=None):
         self.cache = dict()
         self.uncached = func
         self.omit_from_key = [] if omit_from_key is None else omit_from_key
+        self._lock = threading.Lock()
+        self._stripes = [_Stripe() for _i in range(self.stripe_count)]
+        self._expires = {}
+        self._weights = {}
+        self._weight = 0
+        self.hits = self.misses = self.evictions = 0
+        self.set_limits(maxsize, ttl, maxweight, weigher)
         self.cache_set.add(self)
         self.__doc__ = self.uncached.__doc__
         self.__module__ = self.uncached.__module__
         self.__name__ = self.uncached.__name__ + " [cached]"
 
+    def set_limits(self, maxsize=None, ttl=None, maxweight=None, weigher=None):
+        """(Re)define the bounds of this cache,  evicting entries as needed.
+        None means unlimited.
+        """
+        weigher = approximate_size if weigher is None else weigher
+        weights = { key : weigher(value) for (key, value) in list(self.cache.items()) } if maxweight is not None else {}
+        with self._lock:
+            self.maxsize, self.ttl, self.maxweight, self.weigher = maxsize, ttl, maxweight, weigher
+            self._bounded = maxsize is not None or maxweight is not None
+            self._weights = weights
+            self._weight = sum(weights.values())
+            if ttl is None:
+                self._expires = {}
+            elif not self._expires:
+                expires = time.monotonic() + ttl
+                self._expires = { key : expires for key in self.cache }
+            self._trim()
+
     def cache_key(self, *args, **keys):
         """Compute the cache key for the given parameters."""
         args = tuple([ a for (i, a) in enumerate(args) if i not in self.omit_from_key])
         keys = tuple([item for item in keys.items() if item[0] not in self.omit_from_key])
         return args + keys
 
+    def get(self, key, default=None):
+        """Return the cached result for `key` or `default` if there is none."""
+        with self._lock:
+            return self._get(key, default)
+
+    def setdefault(self, key, value):
+        """Add `value` to the cache under `key` unless a result is already cached,
+        returning the cached result.
+        """
+        weight = self.weigher(value) if self.maxweight is not None else 0
+        with self._lock:
+            result = self._get(key, _MISSING)
+            if result is _MISSING:
+                self._add(key, value, weight)
+                result = value
+            return result
+
+    def clear(self):
+        """Remove all results from the cache."""
+        with self._lock:
+            self.cache = dict()
+            self._expires = {}
+            self._weights = {}
+            self._weight = 0
+
+    def _get(self, key, default, count=True):
+        """Look up `key` in the cache,  updating recency and,  if `count`,  statistics.  Lock held."""
+        try:
+            value = self.cache[key]
+        except KeyError:
+            self.misses += count
+            return default
+        if self._expires and self._expires[key] <= time.monotonic():
+            self._discard(key)
+            self.misses += count
+            return default
+        if self._bounded:
+            del self.cache[key]
+            self.cache[key] = value
+        self.hits += count
+        return value
+
+    def _add(self, key, value, weight):
+        """Add `value` with precomputed `weight` to the cache under `key`.  Lock held."""
+        if key in self.cache:
+            self._discard(key)
+        self.cache[key] = value
+        if self.ttl is not None:
+            self._expires[key] = time.monotonic() + self.ttl
+        if self.maxweight is not None:
+            self._weights[key] = weight
+            self._weight += weight
+        self._trim()
+
+    def _discard(self, key):
+        """Remove `key` and its bookkeeping from the cache.  Lock held."""
+        self.cache.pop(key, None)
+        self._expires.pop(key, None)
+        self._weight -= self._weights.pop(key, 0)
+
+    def _trim(self):
+        """Drop expired entries then evict least recently used entries until
+        the cache is within its bounds.  Lock held.
+        """
+        if self._expires:
+            now = time.monotonic()
+            for key, expires in list(self._expires.items()):
+                if expires <= now:
+                    self._discard(key)
+                    self.evictions += 1
+        while self.cache and ((self.maxsize is not None and len(self.cache) > self.maxsize) or
+                              (self.maxweight is not None and self._weight > self.maxweight)):
+            self._discard(next(iter(self.cache)))
+            self.evictions += 1
+
     def _readonly(self, *args, **keys):
         """Compute (cache_key, func(*args, **keys)).   Do not add to cache."""
         key = self.cache_key(*args, **keys)
-        if key in self.cache:
+        result = self.get(key, _MISSING)
+        if result is not _MISSING:
             log.verbose("Cached call", self.uncached.__name__, repr(key), verbosity=80)
-            return key, self.cache[key]
+            return key, result
         else:
             log.verbose("Uncached call", self.uncached.__name__, repr(key), verbosity=80)
             return key, self.uncached(*args, **keys)
@@ -298,24 +440,151 @@ class CachedFunction:
         """Compute or fetch func(*args, **keys).  Add the result to the cache.
         return func(*args, **keys)
         """
-        key, result = self._readonly(*args, **keys)
-        self.cache[key] = result
+        key = self.cache_key(*args, **keys)
+        result = self.get(key, _MISSING)
+        if result is not _MISSING:
+            log.verbose("Cached call", self.uncached.__name__, repr(key), verbosity=80)
+            return result
+        stripe = self._stripes[hash(key) % len(self._stripes)]
+        with stripe.lock:
+            with self._lock:
+                result = self._get(key, _MISSING, count=False)
+            if result is not _MISSING:   # completed since the first check
+                return result
+            future = stripe.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = stripe.in_flight[key] = futures.Future()
+                future.thread = threading.get_ident()
+        if not leader and future.thread != threading.get_ident():
+            log.verbose("Waiting for call", self.uncached.__name__, repr(key), verbosity=80)
+            return future.result()
+        log.verbose("Uncached call", self.uncached.__name__, repr(key), verbosity=80)
+        try:
+            result = self.uncached(*args, **keys)
+            weight = self.weigher(result) if self.maxweight is not None else 0
+            with self._lock:
+                self._add(key, result, weight)
+        except BaseException as exc:
+            if leader:
+                self._land(stripe, key, future)
+                future.set_exception(exc)
+            raise
+        if leader:
+            self._land(stripe, key, future)
+            future.set_result(result)
         return result
 
+    def _land(self, stripe, key, future):
+        """Remove in-flight `future` for `key` from `stripe`."""
+        with stripe.lock:
+            if stripe.in_flight.get(key) is future:
+                del stripe.in_flight[key]
+
     def __get__(self, obj, objtype):
         '''Support instance methods.'''
         return functools.partial(self.__call__, obj)
 
+    @property
+    def qualified_name(self):
+        """Return the module qualified name of the cached function."""
+        return self.uncached.__module__ + "." + self.uncached.__qualname__
+
+    def stats(self):
+        """Return a dict of statistics describing this cache.  Computing "bytes",
+        the approximate size of the cached results,  walks all of them.
+        """
+        with self._lock:
+            values = list(self.cache.values())
+            stats = dict(
+                name = self.qualified_name,
+                entries = len(values),
+                hits = self.hits,
+                misses = self.misses,
+                evictions = self.evictions,
+                maxsize = self.maxsize,
+                maxweight = self.maxweight,
+                ttl = self.ttl,
+                )
+        seen = set()
+        stats["bytes"] = sum(approximate_size(value, seen) for value in values)
+        return stats
+
+_MISSING = object()
+
+class _Stripe:
+    """A lock and the dict of { key : Future } for the in-flight calls of a
+    CachedFunction which hash to it.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
 def clear_function_caches():
     "Clear all the caches created using @utils.cached or @utils.xcached."""
     for cache_func in CachedFunction.cache_set:
         log.verbose("Clearing cache for", repr(cache_func.uncached), verbosity=80)
-        cache_func.cache = dict()
+        cache_func.clear()
+    clear_condition_value_memo()
+
+def get_cached_functions():
+    """Return the functions supporting caching under @utils.cached or @utils.xcached,
+    sorted by qualified name.
+    """
+    return sorted(CachedFunction.cache_set, key=lambda cache_func: cache_func.qualified_name)
+
+def get_cached_function_stats():
+    """Return a list of CachedFunction.stats() dicts for all cached functions
+    sorted by name.
+    """
+    return [cache_func.stats() for cache_func in get_cached_functions()]
 
 def list_cached_functions():
-    """List all the functions supporting caching under @utils.cached or @utils.xcached."""
-    for cache_func in sorted(CachedFunction.cache_set):
-        print(repr(cache_func.uncached))
+    """List all the functions supporting caching under @utils.cached or @utils.xcached,
+    along with the entries,  hits,  misses,  evictions,  and approximate bytes of
+    each cache.
+    """
+    for stats in get_cached_function_stats():
+        print("{name}  entries={entries} hits={hits} misses={misses} evictions={evictions} bytes={bytes}".format(**stats))
+
+_ATOMIC_TYPES = (str, bytes, int, float, complex, bool, type(None))
+
+_SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+                 types.MethodType, types.CodeType)
+
+def approximate_size(obj, seen=None):
+    """Return the approximate number of bytes used by `obj` and the objects
+    reachable from it through containers and instance dicts.  Objects whose ids
+    are in set `seen` are skipped,  and `seen` is updated,  so that shared objects
+    are counted once.   Classes,  modules,  and functions are not counted.
+
+    >>> approximate_size("x" * 1000) > 1000
+    True
+
+    >>> shared = list(range(100))
+    >>> approximate_size([shared, shared]) < 2 * approximate_size(shared)
+    True
+    """
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, _ATOMIC_TYPES):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        instance_dict = getattr(obj, "__dict__", None)
+        if isinstance(instance_dict, dict):
+            stack.append(instance_dict)
+    return size
 
 # ===================================================================
 
@@ -592,7 +861,10 @@ def create_path(path, mode=DEFAULT_DIR_PERMS):
         subdir = os.path.abspath(os.path.join(*current))
         if not os.path.exists(subdir):
             log.verbose("Creating", repr(subdir), "with permissions %o" % mode)
-            os.mkdir(subdir, mode)
+            try:
+                os.mkdir(subdir, mode)
+            except FileExistsError:   # created concurrently,  e.g. by another download
+                continue
             with log.verbose_warning_on_exception(
                     "Failed chmod'ing new directory", repr(subdir), "to %o." % mode):
                 os.chmod(subdir, mode)
@@ -835,10 +1107,38 @@ DONT_CARE_RE = re.compile(r"^" + r"|".join([
 
 NUMBER_RE = re.compile(r"^([-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?|[+-]?[0-9]+\.)$")
 
+# Header vocabularies are small so conditioned values are memoized and interned.
+CONDITION_VALUE_MEMO = {}
+CONDITION_VALUE_MEMO_LIMIT = 100000
+CONDITION_VALUE_STATS = Counter()
+
+def clear_condition_value_memo():
+    """Discard all memoized condition_value() results and zero the hit/miss counts."""
+    CONDITION_VALUE_MEMO.clear()
+    CONDITION_VALUE_STATS.clear()
+
+def get_condition_value_stats():
+    """Return a dict describing condition_value() memo performance.
+
+    >>> clear_condition_value_memo()
+    >>> [condition_value(val) for val in ["wfc", "WFC", "wfc", 1, True]]
+    ['WFC', 'WFC', 'WFC', '1.0', 'T']
+    >>> get_condition_value_stats()
+    {'hits': 1, 'misses': 4, 'size': 4, 'hit_rate': 0.2}
+    """
+    hits, misses = CONDITION_VALUE_STATS["hits"], CONDITION_VALUE_STATS["misses"]
+    return {
+        "hits" : hits,
+        "misses" : misses,
+        "size" : len(CONDITION_VALUE_MEMO),
+        "hit_rate" : hits / (hits + misses) if hits + misses else 0.0,
+    }
+
 def condition_value(value):
     """Condition `value`,  ostensibly taken from a FITS header or CDBS
     reference file table,  such that it is suitable for appearing in or
-    matching an rmap MatchSelector key.
+    matching an rmap MatchSelector key.   Results are memoized by type
+    and value,  or repr for floats,  and returned as interned strings.
 
     >>> condition_value('ANY')
     '*'
@@ -885,7 +1185,32 @@ def condition_value(value):
 
     >>> condition_value('2013-11-05 15:21:34')
     '2013-11-05 15:21:34'
+
+    >>> [condition_value(val) for val in [0.0, -0.0, float("nan"), float("nan")]]
+    ['0.0', '-0.0', 'NAN', 'NAN']
     """
+    if isinstance(value, float):   # 0.0 == -0.0 and nan != nan but each conditions by repr
+        key = (value.__class__, repr(value))
+    else:
+        key = (value.__class__, value)   # True == 1 but conditions differently
+    try:
+        result = CONDITION_VALUE_MEMO[key]
+    except KeyError:
+        pass
+    except TypeError:   # unhashable,  don't memoize
+        return _condition_value(value)
+    else:
+        CONDITION_VALUE_STATS["hits"] += 1
+        return result
+    CONDITION_VALUE_STATS["misses"] += 1
+    result = sys.intern(_condition_value(value))
+    if len(CONDITION_VALUE_MEMO) >= CONDITION_VALUE_MEMO_LIMIT:
+        CONDITION_VALUE_MEMO.clear()
+    CONDITION_VALUE_MEMO[key] = result
+    return result
+
+def _condition_value(value):
+    """Uncached implementation of condition_value()."""
     value = str(value).strip().upper()
     if NUMBER_RE.match(value):
         value = str(float(value))
@@ -913,6 +1238,17 @@ def condition_header(header, needed_keys=None):
     conditioned = { key:condition_value(header[key]) for key in needed_keys }
     return conditioned
 
+def condition_headers(headers, needed_keys=None):
+    """Return the list of condition_header() results for each of `headers`.
+
+    >>> condition_headers([{"detector": "wfc", "ccdgain": 2}, {"DETECTOR": "wfc", "CCDGAIN": "1"}])
+    [{'DETECTOR': 'WFC', 'CCDGAIN': '2.0'}, {'DETECTOR': 'WFC', 'CCDGAIN': '1.0'}]
+
+    >>> condition_headers([{"X": 0.0}, {"X": -0.0}]), condition_headers([{"X": -0.0}, {"X": 0.0}])
+    ([{'X': '0.0'}, {'X': '-0.0'}], [{'X': '-0.0'}, {'X': '0.0'}])
+    """
+    return [ condition_header(header, needed_keys) for header in headers ]
+
 def _eval_keys(keys):
     """Return the replacement mapping from rmap-visible parkeys to eval-able keys.
 
@@ -71,7 +71,7 @@ def clear_header_cache():
     """Flush the header cache,  nominally to recover storage taken by array attributes
     brought in for certify.
     """
-    get_free_header.cache.clear()
+    get_free_header.clear()
 
 # ================================================================================================================
 
@@ -18,7 +18,7 @@ import re
 
 import crds
 from crds.core import config, log, pysh, utils, rmap
-from crds.core import cmdline, naming
+from crds.core import cmdline, naming, closure_index
 from crds import rowdiff, sync
 
 # ============================================================================
@@ -705,16 +705,15 @@ def get_updated_files(context1, context2):
     extension1 = os.path.splitext(context1)[1]
     extension2 = os.path.splitext(context2)[1]
     assert extension1 == extension2, "Only compare mappings of same type/extension."
-    old_map = crds.get_cached_mapping(context1)
-    old_files = set(old_map.mapping_names() + old_map.reference_names())
-    all_mappings = rmap.list_mappings("*"+extension1, old_map.observatory)
+    observatory = crds.get_cached_mapping(context1).observatory
+    old_files = set(closure_index.get_closure(context1))
+    all_mappings = rmap.list_mappings("*"+extension1, observatory)
     updated = set()
     context1, context2 = os.path.basename(context1), os.path.basename(context2)
     for new in all_mappings:
         new = os.path.basename(new)
         if context1 < new <= context2:
-            new_map = crds.get_cached_mapping(new)
-            updated |= set(new_map.mapping_names() + new_map.reference_names())
+            updated |= set(closure_index.get_closure(new))
     return sorted(list(updated - old_files))
 
 # ==============================================================================================================
@@ -47,7 +47,7 @@ def tables(filename):
 
 def clear_cache():
     """Clear the cached values for the tables interface."""
-    tables.cache.clear()
+    tables.clear()
 
 
 class SimpleTable:
@@ -2,7 +2,7 @@ import os
 
 from crds.core import rmap
 from crds import config
-from crds.hst import locate
+# from crds.hst import locate     # deferred,  crds.hst imports this module via crds.certify
 
 
 _COS_PARAMETRIZED_COMPONENTS = {
@@ -146,6 +146,7 @@ def make_filename(reftype):
     """
     Create a unique name for the specified synphot graph or lookup reftype.
     """
+    from crds.hst import locate
     return locate.generate_unique_name_core(SYNPHOT_INSTRUMENT, reftype, ".fits")
 
 
@@ -7,7 +7,8 @@ removed by specifying --purge-mappings or --purge-references::
   % crds sync --range 1:2 --purge-mappings --purge-references
 
 will remove references or mappings not required by hst_0001.pmap or
-hst_0002.pmap in addition to downloading the required files.
+hst_0002.pmap in addition to downloading the required files.   These also remove
+the hidden .part files of downloads which failed or were interrupted.
 
 Or explicitly list the files you want cached:
 
@@ -222,9 +223,9 @@ class SyncScript(cmdline.ContextsScript):
         self.add_argument('--fetch-references', action='store_true', dest="fetch_references",
                           help='Cache all the references for the specified contexts.')
         self.add_argument('--purge-references', action='store_true', dest="purge_references",
-                          help='Remove reference files not referred to by contexts from the cache.')
+                          help='Remove reference files not referred to by contexts,  and partial reference downloads,  from the cache.')
         self.add_argument('--purge-mappings', action='store_true', dest="purge_mappings",
-                          help='Remove mapping files not referred to by contexts from the cache.')
+                          help='Remove mapping files not referred to by contexts,  and partial mapping downloads,  from the cache.')
         self.add_argument('--dry-run', action="store_true",
                           help= "Don't remove purged files, or repair files,  just print out their names.")
 
@@ -414,11 +415,26 @@ class SyncScript(cmdline.ContextsScript):
             log.warning("Errors occurred during sync,  skipping CRDS cache config and context update.")
 
     def clear_pickles(self):
-        """Remove all pickles."""
+        """Remove all pickles,  context snapshots,  parsed mappings,  and closure indexes."""
         log.info("Removing all context pickles.  Use --save-pickles to recreate for specified contexts.")
         for path in rmap.list_pickles("*.pmap", self.observatory, full_path=True):
             if os.path.exists(path):
                 utils.remove(path, self.observatory)
+        for path in rmap.list_snapshots("*.pmap", self.observatory, full_path=True):
+            if os.path.exists(path):
+                utils.remove(path, self.observatory)
+        for path in rmap.list_split_pickles("*.pmap", self.observatory, full_path=True):
+            if os.path.exists(path):
+                utils.remove(path, self.observatory)
+        for path in rmap.list_pickles("*.imap", self.observatory, full_path=True):
+            if os.path.exists(path):
+                utils.remove(path, self.observatory)
+        for path in rmap.list_parsed_mappings("*", self.observatory, full_path=True):
+            if os.path.exists(path):
+                utils.remove(path, self.observatory)
+        for path in rmap.list_closure_indexes("*", self.observatory, full_path=True):
+            if os.path.exists(path):
+                utils.remove(path, self.observatory)
 
     def pickle_contexts(self, contexts):
         """Save pickled versions of `contexts` in the CRDS cache.
@@ -462,6 +478,7 @@ class SyncScript(cmdline.ContextsScript):
         purge_maps = set(rmap.list_mappings('*.[pir]map', self.observatory))
         keep = set(self.get_context_mappings())
         self.remove_files(sorted(purge_maps-keep), "mapping")
+        self.remove_partial_downloads(rmap.list_mappings(".*.part", self.observatory, full_path=True))
 
     # ------------------------------------------------------------------------------------------
 
@@ -505,6 +522,22 @@ class SyncScript(cmdline.ContextsScript):
         else:
             keep = set(keep)
         self.remove_files(sorted(purge_refs - keep), "reference")
+        self.remove_partial_downloads(rmap.list_references(".*.part", self.observatory, full_path=True))
+
+    def remove_partial_downloads(self, paths):
+        """Remove the partial download files at `paths` left by failed or interrupted
+        downloads,  skipping any still being downloaded.
+        """
+        if config.get_cache_readonly():
+            for path in paths:
+                log.info("READONLY CACHE would remove partial download", repr(path))
+            return
+        for path in paths:
+            with log.error_on_exception("Failed removing partial download", repr(path)):
+                if api.remove_partial_download(path):
+                    log.verbose("Removed partial download", repr(path))
+                else:
+                    log.verbose("Skipping partial download in progress", repr(path))
 
     def remove_files(self, files, kind):
         """Remove the list of `files` basenames which are converted to fully
@@ -569,8 +602,8 @@ class SyncScript(cmdline.ContextsScript):
         basenames = [os.path.basename(file) for file in files]
         try:
             log.verbose("Downloading verification info for", len(basenames), "files.", verbosity=10)
-            infos = api.get_file_info_map(observatory=self.observatory, files=basenames,
-                                         fields=["size","rejected","blacklisted","state","sha1sum"])
+            infos = api.get_file_info_map_unlimited(observatory=self.observatory, files=basenames,
+                                                    fields=["size","rejected","blacklisted","state","sha1sum"])
         except Exception as exc:
             log.error("Failed getting file info.  CACHE VERIFICATION FAILED.  Exception: ", repr(str(exc)))
             return
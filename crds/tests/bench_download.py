@@ -0,0 +1,217 @@
+"""This module benchmarks FileCacher downloads against a local stand-in for the
+CRDS file server,  comparing serial and concurrent downloads.
+
+A temporary directory of random files is served by a threaded HTTP server on
+localhost which delays each response by --latency seconds to stand in for the
+round trip and server time of a remote request.   Each run downloads all of the
+files with FileCacher.fetch_files() using a given number of threads,  verifying
+their sizes and sha1sums,  and reports elapsed seconds,  the HTTP connections
+opened and reused by the shared keep-alive session,  and speedup over serial:
+
+% python -m crds.tests.bench_download --files 50 --size 100000 --latency 0.05 --threads 1 4 8
+"""
+import os
+import sys
+import json
+import gzip
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import functools
+from http import server
+
+from crds.core import log
+from crds.client import api, proxy
+
+# ===================================================================
+
+class _DelayedHandler(server.SimpleHTTPRequestHandler):
+    """Serves files from a directory after a simulated request latency,  honoring
+    simple "bytes=N-" Range requests.   If `cut_after` is set,  the first response
+    for each file is cut off after that many bytes to simulate a dropped connection.
+    The Range header of each request is recorded in `ranges` by file name.
+
+    JSON RPC POSTs call the functions of `rpc_methods` by method name,  recording
+    each method called in `calls`,  or the list of methods of a JSON-RPC 2.0 batch
+    request.   If `batches` is False,  batch requests are answered with a JSON RPC
+    error,  and if `batch_status` is set,  with that HTTP error status.
+    """
+
+    protocol_version = "HTTP/1.1"   # keep-alive
+    disable_nagle_algorithm = True
+    latency = 0.0
+    cut_after = None
+    ranges = None
+    rpc_methods = None
+    calls = None
+    batches = True
+    batch_status = None
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        name = os.path.basename(self.path)
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as handle:
+            data = handle.read()
+        requested = self.headers.get("Range")
+        first = name not in self.ranges
+        self.ranges.setdefault(name, []).append(requested)
+        offset = int(requested[len("bytes="):-1]) if requested else 0
+        if requested:
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(offset, len(data) - 1, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data) - offset))
+        self.end_headers()
+        if first and self.cut_after is not None:
+            self.wfile.write(data[offset:offset + self.cut_after])
+            self.close_connection = True
+        else:
+            self.wfile.write(data[offset:])
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        jsonrpc = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if isinstance(jsonrpc, list) and self.batch_status:
+            self.calls.append("batch")
+            self.send_error(self.batch_status)
+            return
+        if isinstance(jsonrpc, list) and self.batches:
+            self.calls.append([request["method"] for request in jsonrpc])
+            response = [self.rpc_response(request) for request in jsonrpc]
+        elif isinstance(jsonrpc, list):
+            self.calls.append("batch")
+            response = dict(id=None, result=None, error=dict(message="Batch requests are not supported."))
+        else:
+            self.calls.append(jsonrpc["method"])
+            response = self.rpc_response(jsonrpc)
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def rpc_response(self, jsonrpc):
+        """Return the JSON RPC response to request `jsonrpc`."""
+        try:
+            params = jsonrpc["params"]
+            method = self.rpc_methods[jsonrpc["method"]]
+            result = method(**params) if isinstance(params, dict) else method(*params)
+            return dict(id=jsonrpc["id"], result=result, error=None)
+        except Exception as exc:
+            return dict(id=jsonrpc["id"], result=None, error=dict(message=str(exc)))
+
+    def log_message(self, *args):
+        pass
+
+class StandInServer:
+    """Threaded HTTP server on localhost serving the files of `directory`."""
+
+    def __init__(self, directory, latency=0.0, cut_after=None, rpc_methods=None, batches=True,
+                 batch_status=None):
+        self.ranges = {}
+        self.calls = []
+        handler = type("Handler", (_DelayedHandler,), dict(
+            latency=latency, cut_after=cut_after, ranges=self.ranges,
+            rpc_methods=rpc_methods or {}, calls=self.calls, batches=batches,
+            batch_status=batch_status))
+        self.httpd = server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), functools.partial(handler, directory=directory))
+        self.url = "http://127.0.0.1:{}/".format(self.httpd.server_address[1])
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class StandInFileCacher(api.FileCacher):
+    """FileCacher which downloads from a StandInServer instead of the CRDS server."""
+
+    def __init__(self, url, info_map, raise_exceptions=True):
+        super(StandInFileCacher, self).__init__("hst.pmap", raise_exceptions=raise_exceptions)
+        self.url = url
+        self.info_map = info_map
+
+    def get_url(self, filename):
+        return self.url + filename
+
+# ===================================================================
+
+def make_files(directory, files, size):
+    """Write `files` random files of `size` bytes to `directory`,  returning
+    the server catalog style info map { name : { "size" : ..., "sha1sum" : ... } }.
+    """
+    info_map = {}
+    for i in range(files):
+        name = "bench_{:05d}_ref.fits".format(i)
+        data = os.urandom(size)
+        with open(os.path.join(directory, name), "wb") as handle:
+            handle.write(data)
+        info_map[name] = dict(size=str(size), sha1sum=hashlib.sha1(data).hexdigest())
+    return info_map
+
+def run_downloads(url, info_map, output_dir, threads, raise_exceptions=True):
+    """Download all files of `info_map` from `url` to `output_dir` using `threads`,
+    returning (seconds, bytes downloaded).
+    """
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    names = sorted(info_map)
+    localpaths = { name : os.path.join(output_dir, name) for name in names }
+    cacher = StandInFileCacher(url, info_map, raise_exceptions=raise_exceptions)
+    start = time.perf_counter()
+    n_bytes = cacher.fetch_files(names, localpaths, threads=threads)
+    return time.perf_counter() - start, n_bytes
+
+def run_benchmark(files, size, latency, thread_counts):
+    """Return { threads : (seconds, bytes, connection counts) } for downloading
+    `files` files of `size` bytes from a stand-in server with `latency`.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        served_dir = os.path.join(temp_dir, "served")
+        os.makedirs(served_dir)
+        info_map = make_files(served_dir, files, size)
+        with StandInServer(served_dir, latency) as stand_in:
+            for threads in thread_counts:
+                proxy.reset_session()
+                results[threads] = run_downloads(
+                    stand_in.url, info_map, os.path.join(temp_dir, "cache"), threads) + (
+                    proxy.get_session().counts(),)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark concurrent FileCacher downloads.")
+    parser.add_argument("--files", type=int, default=50, help="Number of files to download.")
+    parser.add_argument("--size", type=int, default=100000, help="Size of each file in bytes.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request.")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8], help="Thread counts to time.")
+    args = parser.parse_args(argv)
+
+    log.set_verbose(0)
+    log.remove_console_handler()   # omit per-file progress messages
+    results = run_benchmark(args.files, args.size, args.latency, args.threads)
+    serial = results.get(1, (None,))[0]
+    for threads, (seconds, n_bytes, counts) in sorted(results.items()):
+        speedup = "{:6.2f}x".format(serial / seconds) if serial else ""
+        print("{:3d} threads {:8.3f} s {:10.2f} MB/s {:4d} connections opened {:4d} reused {}".format(
+            threads, seconds, n_bytes / seconds / 1e6, counts["opened"], counts["reused"], speedup))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
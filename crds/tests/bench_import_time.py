@@ -0,0 +1,99 @@
+"""This module benchmarks the time taken by a plain "import crds",  as paid by
+every pipeline step,  using the interpreter's own import profiler:
+
+    python -X importtime -c "import crds"
+
+Each run is a fresh interpreter.  The reported time is the best cumulative
+import time of the crds package over --repeat runs,  followed by the slowest
+modules of that run.  It also reports any of the DEFERRED_MODULES which the
+package root imported,  since those should only load on first use.
+
+--save writes the results to a JSON file and --compare reports a regression,
+exiting with status 1,  when the import is slower than a saved run by more
+than --tolerance or a deferred module is imported:
+
+% python -m crds.tests.bench_import_time --save baseline.json
+% python -m crds.tests.bench_import_time --compare baseline.json
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+from crds.tests import bench_util
+
+# ===================================================================
+
+# Modules which "import crds" should not load.
+DEFERRED_MODULES = [
+    "crds.core.rmap",
+    "crds.core.heavy_client",
+    "crds.client.api",
+    "crds.client.proxy",
+    "crds.bestrefs",
+    "astropy",
+    "numpy",
+    ]
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)\s*$")
+
+# ===================================================================
+
+def run_import(module="crds"):
+    """Import `module` in a fresh interpreter with -X importtime,  returning
+    { imported module name : cumulative microseconds }.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([_package_root()] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                             stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, env=env,
+                             universal_newlines=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            times[match.group(2)] = int(match.group(1))
+    return times
+
+def _package_root():
+    """Return the directory containing the crds package being benchmarked."""
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def run_benchmark(repeat, module="crds"):
+    """Return (usecs, times) for the fastest of `repeat` imports of `module`."""
+    runs = [run_import(module) for _ in range(repeat)]
+    times = min(runs, key=lambda run: run[module])
+    return times[module], times
+
+def deferred_imports(times):
+    """Return the DEFERRED_MODULES found in import `times`."""
+    return [name for name in DEFERRED_MODULES if name in times]
+
+def new_deferred(deferred, baseline):
+    """Print the `deferred` imports missing from `baseline`,  returning their count."""
+    added = sorted(set(deferred) - set(baseline.get("deferred", [])))
+    for name in added:
+        print("REGRESSION import crds now imports", name)
+    return len(added)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the time taken by 'import crds'.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of fresh interpreter imports to time.")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest modules to list.")
+    bench_util.add_baseline_arguments(parser)
+    args = parser.parse_args(argv)
+
+    usecs, times = run_benchmark(args.repeat)
+    deferred = deferred_imports(times)
+    print("{:<40s} {:10d} us".format("import crds", usecs))
+    for name, module_usecs in sorted(times.items(), key=lambda item: -item[1])[1:args.top+1]:
+        print("    {:<36s} {:10d} us".format(name, module_usecs))
+    for name in deferred:
+        print("DEFERRED MODULE IMPORTED", name)
+
+    return bench_util.save_and_compare(args, {"import crds" : usecs}, extra=dict(deferred=deferred),
+                                       check=lambda baseline: new_deferred(deferred, baseline))
+
+if __name__ == "__main__":
+    sys.exit(main())
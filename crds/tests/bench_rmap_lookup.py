@@ -0,0 +1,140 @@
+"""This module is a microbenchmark suite for the ReferenceMapping bestrefs lookup path.
+
+Each case times one stage-heavy lookup against an rmap in crds/tests/data:
+
+    selector       plain Match/UseAfter selection
+    precondition   instrument precondition_header hook (ACS BIASFILE)
+    relevance      parkey_relevance and rmap_relevance expressions (WFC3 DARKFILE)
+    irrelevant     rmap_relevance evaluating False,  returning N/A
+    fallback       first selection fails,  fallback_header hook succeeds (WFPC2 FLATFILE)
+    rmap-context   ReferenceMapping.get_best_references(),  the .rmap-as-context path
+
+Results are printed in microseconds per lookup.  --save writes them to a JSON
+file and --compare reports any case slower than a saved run by more than
+--tolerance,  exiting with status 1 when a regression is found:
+
+% python -m crds.tests.bench_rmap_lookup --save baseline.json
+% python -m crds.tests.bench_rmap_lookup --compare baseline.json
+"""
+import sys
+import timeit
+import argparse
+
+from crds.core import rmap, log
+from crds.tests import test_config, bench_util
+
+# ===================================================================
+
+# (case name, rmap basename, method name, header, expected result)
+CASES = [
+    ("selector", "hst_cos_bpixtab_0252.rmap", "get_best_ref", {
+        "DETECTOR": "FUV",
+        "DATE-OBS": "2010-01-01",
+        "TIME-OBS": "00:00:00",
+        }, "z1r1943fl_bpix.fits"),
+
+    ("precondition", "hst_acs_biasfile.rmap", "get_best_ref", {
+        "DETECTOR": "WFC",
+        "CCDAMP": "ABCD",
+        "CCDGAIN": "2.0",
+        "APERTURE": "WFC1",
+        "NUMCOLS": "4144.0",
+        "NUMROWS": "2068.0",
+        "LTV1": "24.0",
+        "LTV2": "0.0",
+        "XCORNER": "0.0",
+        "YCORNER": "0.0",
+        "CCDCHIP": "1.0",
+        "BIASCORR": "PERFORM",
+        "DATE-OBS": "2002-05-01",
+        "TIME-OBS": "00:00:00",
+        }, "m991609nj_bia.fits"),
+
+    ("relevance", "hst_wfc3_darkfile.rmap", "get_best_ref", {
+        "DETECTOR": "UVIS",
+        "CCDAMP": "ABCD",
+        "BINAXIS1": "1.0",
+        "BINAXIS2": "1.0",
+        "CCDGAIN": "1.5",
+        "SAMP_SEQ": "NONE",
+        "SUBTYPE": "N/A",
+        "DARKCORR": "PERFORM",
+        "DATE-OBS": "2008-03-01",
+        "TIME-OBS": "00:00:00",
+        }, "t3420177i_drk.fits"),
+
+    ("irrelevant", "hst_wfc3_darkfile.rmap", "get_best_ref", {
+        "DETECTOR": "UVIS",
+        "CCDAMP": "ABCD",
+        "BINAXIS1": "1.0",
+        "BINAXIS2": "1.0",
+        "CCDGAIN": "1.5",
+        "SAMP_SEQ": "NONE",
+        "SUBTYPE": "N/A",
+        "DARKCORR": "OMIT",
+        "DATE-OBS": "2008-03-01",
+        "TIME-OBS": "00:00:00",
+        }, "NOT FOUND n/a"),
+
+    ("fallback", "hst_wfpc2_flatfile.rmap", "get_best_ref", {
+        "MODE": "AREA",
+        "FILTER1": "4.0",
+        "FILTER2": "2.0",
+        "IMAGETYP": "EXT",
+        "FILTNAM1": "F555W",
+        "FILTNAM2": "N/A",
+        "LRFWAVE": "5000.0",
+        "DATE-OBS": "2000-01-01",
+        "TIME-OBS": "00:00:00",
+        }, "j4t11109u.r4h"),
+
+    ("rmap-context", "hst_cos_bpixtab_0252.rmap", "get_best_references", {
+        "DETECTOR": "FUV",
+        "DATE-OBS": "2010-01-01",
+        "TIME-OBS": "00:00:00",
+        }, {"bpixtab": "z1r1943fl_bpix.fits"}),
+    ]
+
+# ===================================================================
+
+def load_case(basename):
+    """Load test data rmap `basename` uncached."""
+    return rmap.ReferenceMapping.from_file(basename, path=test_config.TEST_DATA, ignore_checksum=True)
+
+def run_case(name, basename, method, header, expected, number):
+    """Time `number` calls of `method` on rmap `basename` for `header`,
+    returning microseconds per call.
+    """
+    mapping = load_case(basename)
+    lookup = getattr(mapping, method)
+    result = lookup(header)
+    assert result == expected, \
+        "Benchmark case " + repr(name) + " returned " + repr(result) + " not " + repr(expected)
+    seconds = min(timeit.repeat(lambda: lookup(header), number=number, repeat=5))
+    return seconds / number * 1e6
+
+def run_cases(number, names=None):
+    """Run the benchmark CASES,  or only those in `names`,  returning { name : usecs_per_lookup }."""
+    old_size = rmap.set_bestref_cache_size(0)   # time the real lookup path
+    try:
+        return { case[0] : run_case(*case, number=number)
+                 for case in CASES if not names or case[0] in names }
+    finally:
+        rmap.set_bestref_cache_size(old_size)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks for rmap bestrefs lookups.")
+    parser.add_argument("cases", nargs="*", help="Names of cases to run,  default all.")
+    parser.add_argument("--number", type=int, default=2000, help="Lookups per timing repeat.")
+    bench_util.add_baseline_arguments(parser)
+    args = parser.parse_args(argv)
+
+    log.set_verbose(0)
+    results = run_cases(args.number, args.cases)
+    for name, usecs in results.items():
+        print("{:<14s} {:10.2f} us/lookup".format(name, usecs))
+
+    return bench_util.save_and_compare(args, results)
+
+if __name__ == "__main__":
+    sys.exit(main())
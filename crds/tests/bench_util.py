@@ -0,0 +1,54 @@
+"""This module holds the baseline handling shared by the crds.tests benchmarks.
+
+A benchmark adds the --save,  --compare,  and --tolerance options to its parser
+with add_baseline_arguments() and passes its { case name : microseconds } timings
+to save_and_compare(),  which writes them to the --save JSON file and reports any
+case slower than the --compare JSON file by more than --tolerance:
+
+% python -m crds.tests.bench_rmap_lookup --save baseline.json
+% python -m crds.tests.bench_rmap_lookup --compare baseline.json
+"""
+import json
+
+# ===================================================================
+
+def add_baseline_arguments(parser):
+    """Add the --save,  --compare,  and --tolerance options to argparse `parser`."""
+    parser.add_argument("--save", default=None, help="Write results to this JSON file.")
+    parser.add_argument("--compare", default=None, help="Compare results to this JSON file from --save.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Fractional slowdown relative to --compare reported as a regression.")
+
+def compare(timings, baseline, tolerance):
+    """Print slowdowns of `timings` relative to `baseline` exceeding `tolerance`,
+    returning the count of regressions.
+    """
+    regressions = 0
+    for name, usecs in sorted(timings.items()):
+        if name not in baseline:
+            continue
+        ratio = usecs / baseline[name]
+        if ratio > 1.0 + tolerance:
+            print("REGRESSION {:<14s} {:10.2f} us vs {:10.2f} us  ({:+.0%})".format(
+                name, usecs, baseline[name], ratio - 1.0))
+            regressions += 1
+    return regressions
+
+def save_and_compare(args, timings, extra=None, check=None):
+    """Write `timings` and any `extra` JSON fields to args.save and compare them to
+    args.compare,  returning the exit status,  1 if a regression was found.
+
+    `check(baseline)` optionally reports regressions beyond slower timings,
+    returning their count.
+    """
+    if args.save:
+        with open(args.save, "w+") as handle:
+            json.dump(dict(timings, **(extra or {})), handle, indent=4, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        regressions = compare(timings, baseline, args.tolerance)
+        if check is not None:
+            regressions += check(baseline)
+        return 1 if regressions else 0
+    return 0
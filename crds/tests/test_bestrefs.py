@@ -513,6 +513,31 @@ class TestBestrefs(test_config.CRDSTestCase):
 
         os.remove(test_copy)
 
+    def test_bestrefs_instrument_headers_batched(self):
+        from unittest import mock
+        from crds.client import api, proxy
+        from crds.bestrefs import headers
+        from crds.tests import bench_download
+        ids = ["I{}:I{}".format(i, i) for i in range(7)]
+        rpc_methods = dict(
+            get_dataset_ids=lambda context, instrument, since: ids,
+            get_dataset_headers_by_id=lambda context, dataset_ids, since: {
+                dataset_id : dict(INSTRUME="COS") for dataset_id in dataset_ids })
+        os.makedirs(self.temp("served"))
+        with bench_download.StandInServer(self.temp("served"), rpc_methods=rpc_methods) as stand_in:
+            with mock.patch.object(api, "S", proxy.CheckingProxy(stand_in.url)), \
+                 mock.patch.dict(os.environ, CRDS_RPC_BATCH_SIZE="3"):
+                for save_pickles in [True, False]:
+                    generator = headers.InstrumentHeaderGenerator(
+                        "hst.pmap", ["cos"], None, save_pickles, dict(max_headers_per_rpc=2))
+                    generator.segment_size = 2
+                    self.assertEqual(generator.header("I0:I0")["INSTRUME"], "COS")
+                    self.assertEqual(sorted(generator.headers), ids[:6] if save_pickles else ids[:2])
+                    self.assertEqual(generator.header("I6:I6")["INSTRUME"], "COS")
+        self.assertEqual(stand_in.calls, ["get_dataset_ids", ["get_dataset_headers_by_id"] * 3,
+                                          "get_dataset_headers_by_id",
+                                          "get_dataset_ids", "get_dataset_headers_by_id",
+                                          "get_dataset_headers_by_id"])
 
 # ==================================================================================
 
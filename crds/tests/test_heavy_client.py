@@ -214,6 +214,32 @@ def dt_pickled_mappings(mapping):
     >>> test_config.cleanup(old_state)
     """
 
+def dt_context_snapshots():
+    """
+    >>> old_state = test_config.setup()
+
+    >>> snapshot_file = config.locate_snapshot("jwst_0016.pmap","jwst")
+    >>> snapshot_file   # doctest: +ELLIPSIS
+    '.../pickles/jwst/jwst_0016.pmap.snap'
+
+    >>> _ = heavy_client.get_pickled_mapping.uncached("jwst_0016.pmap", use_snapshots=True, save_snapshots=True)  # doctest: +ELLIPSIS
+    CRDS - INFO -  Saved context snapshot '.../crds-cache-default-test/pickles/jwst/jwst_0016.pmap.snap'
+    >>> assert os.path.exists(snapshot_file)
+
+    >>> pmap = heavy_client.load_context_snapshot("jwst_0016.pmap")
+    CRDS - INFO -  Loaded context snapshot 'jwst_0016.pmap'
+    >>> pmap
+    PipelineContext('jwst_0016.pmap')
+    >>> pmap.get_imap("miri").get_rmap("flat")
+    ReferenceMapping('jwst_miri_flat_0002.rmap')
+
+    >>> heavy_client.remove_context_snapshot("jwst_0016.pmap")  # doctest: +ELLIPSIS
+    CRDS - INFO -  Removed snapshot for context '.../pickles/jwst/jwst_0016.pmap.snap'
+    >>> assert not os.path.exists(snapshot_file)
+
+    >>> test_config.cleanup(old_state)
+    """
+
 def dt_check_parameters():
     """
     >>> old_state = test_config.setup(url="https://jwst-crds-serverless.stsci.edu", observatory="jwst")
@@ -5,6 +5,7 @@ import os
 import json
 from pprint import pprint as pp
 import pickle
+from unittest import mock
 
 from crds import rmap, log, config, tests, utils
 from crds.client import api
@@ -496,6 +497,30 @@ def dt_pickling():
 
 # ==================================================================================
 
+ACS_WFC_HEADER = {
+    "INSTRUME" : "ACS",
+    "DETECTOR" : "WFC",
+    "CCDAMP" : "ABCD",
+    "CCDGAIN" : "2.0",
+    "APERTURE" : "WFC1",
+    "NUMCOLS" : "4144.0",
+    "NUMROWS" : "2068.0",
+    "LTV1" : "24.0",
+    "LTV2" : "0.0",
+    "XCORNER" : "0.0",
+    "YCORNER" : "0.0",
+    "CCDCHIP" : "1.0",
+    "BIASCORR" : "PERFORM",
+    "DATE-OBS" : "2002-05-01",
+    "TIME-OBS" : "00:00:00",
+    }
+
+def _shared_context_bestrefs(args):
+    """Multiprocessing worker computing bestrefs from a SharedContext segment."""
+    from crds.core import snapshot
+    name, include = args
+    return os.getpid(), snapshot.attach_shared_context(name).get_best_references(ACS_WFC_HEADER, include=include)
+
 class TestRmap(test_config.CRDSTestCase):
 
     def test_rmap_get_imap_except(self):
@@ -581,6 +606,333 @@ selector = Match({
         with self.assertRaises(CrdsUnknownReftypeError):
             r.get_best_references(header, include=["flatfile"])
 
+    def test_rmap_get_best_references_batch(self):
+        r = rmap.get_cached_mapping("data/hst_cos_bpixtab_0252.rmap")
+        headers = [
+            {'DETECTOR': 'FUV', 'DATE-OBS': '2010-01-01', 'TIME-OBS': '00:00:00', 'ROOTNAME': 'A'},
+            {'DETECTOR': 'NUV', 'DATE-OBS': '2000-01-01', 'TIME-OBS': '00:00:00', 'ROOTNAME': 'B'},
+            {'DETECTOR': 'FUV', 'DATE-OBS': '2010-01-01', 'TIME-OBS': '00:00:00', 'ROOTNAME': 'C'},
+            {'DETECTOR': 'FOO', 'DATE-OBS': '2010-01-01', 'TIME-OBS': '00:00:00', 'ROOTNAME': 'D'},
+        ]
+        self.assertEqual(r.get_best_references_batch(headers),
+                         [r.get_best_references(header) for header in headers])
+        self.assertEqual([refs["bpixtab"] for refs in r.get_best_references_batch(headers[:3])],
+                         ['z1r1943fl_bpix.fits', 's7g1700pl_bpix.fits', 'z1r1943fl_bpix.fits'])
+
+    def test_get_best_references_batch_conditioned(self):
+        headers = [
+            {'detector': 'fuv', 'date-obs': '2010-01-01', 'time-obs': '00:00:00'},
+            {'detector': 'nuv', 'date-obs': '2000-01-01', 'time-obs': '00:00:00'},
+            {'detector': 'fuv', 'date-obs': '2010-01-01', 'time-obs': '00:00:00'},
+        ]
+        self.assertEqual(
+            rmap.get_best_references_batch("data/hst_cos_bpixtab_0252.rmap", headers),
+            [rmap.get_best_references("data/hst_cos_bpixtab_0252.rmap", header) for header in headers])
+
+    def test_rmap_bestref_cache(self):
+        r = rmap.ReferenceMapping.from_file("hst_cos_bpixtab_0252.rmap", path=self.data_dir, ignore_checksum=True)
+        old_size = rmap.set_bestref_cache_size(2)
+        rmap.clear_bestref_cache_stats()
+        try:
+            fuv = {'DETECTOR': 'FUV', 'DATE-OBS': '2010-01-01', 'TIME-OBS': '00:00:00'}
+            nuv = {'DETECTOR': 'NUV', 'DATE-OBS': '2010-01-01', 'TIME-OBS': '00:00:00'}
+            bad = {'DETECTOR': 'FOO', 'DATE-OBS': '2010-01-01', 'TIME-OBS': '00:00:00'}
+            for _ in range(2):
+                self.assertEqual(r.get_best_ref(fuv), 'z1r1943fl_bpix.fits')
+                self.assertEqual(r.get_best_ref(dict(fuv, ROOTNAME='X')), 'z1r1943fl_bpix.fits')
+            self.assertEqual(rmap.get_bestref_cache_stats(), dict(hits=3, misses=1, evictions=0))
+            self.assertEqual(r.get_best_ref(nuv), 'uas19356l_bpix.fits')
+            self.assertTrue(r.get_best_ref(bad).startswith("NOT FOUND"))
+            self.assertTrue(r.get_best_ref(bad).startswith("NOT FOUND"))
+            self.assertEqual(rmap.get_bestref_cache_stats(), dict(hits=4, misses=3, evictions=1))
+            r2 = r.delete('uas19356l_bpix.fits')
+            self.assertEqual(len(r2._bestref_cache), 0)
+            self.assertEqual(r2.get_best_ref(nuv), 's7g1700pl_bpix.fits')
+        finally:
+            rmap.set_bestref_cache_size(old_size)
+            rmap.clear_bestref_cache_stats()
+
+    def test_rmap_bestref_cache_errors_and_threads(self):
+        from concurrent import futures
+        r = rmap.ReferenceMapping.from_file("hst_cos_bpixtab_0252.rmap", path=self.data_dir, ignore_checksum=True)
+        old_size = rmap.set_bestref_cache_size(2)
+        try:
+            bad = {'DETECTOR': 'FOO', 'DATE-OBS': '2010-01-01', 'TIME-OBS': '00:00:00'}
+            errors = []
+            for _ in range(2):
+                with self.assertRaises(Exception) as context:
+                    r._get_best_ref(bad)
+                errors.append(context.exception)
+            self.assertIs(errors[0], errors[1])
+            class LookupFailure(Exception):
+                def __init__(self, detector):
+                    super(LookupFailure, self).__init__("no lookup for " + detector)
+            def lookup(header):
+                try:
+                    raise KeyError(header["DETECTOR"])
+                except KeyError as exc:
+                    raise LookupFailure(header["DETECTOR"]) from exc
+            bad = dict(bad, DETECTOR="BAR")
+            with mock.patch.object(r, "_lookup_best_ref", side_effect=lookup) as lookup_best_ref:
+                for _ in range(2):
+                    with self.assertRaises(LookupFailure) as context:
+                        r._get_best_ref(bad)
+                    self.assertIsInstance(context.exception.__cause__, KeyError)
+            self.assertEqual(lookup_best_ref.call_count, 1)
+            headers = [{'DETECTOR': detector, 'DATE-OBS': '20{:02d}-01-01'.format(year), 'TIME-OBS': '00:00:00'}
+                       for detector in ['FUV', 'NUV'] for year in range(0, 20)] * 10
+            with futures.ThreadPoolExecutor(4) as pool:
+                results = list(pool.map(r.get_best_ref, headers))
+            self.assertFalse([result for result in results if result.startswith("NOT FOUND")])
+        finally:
+            rmap.set_bestref_cache_size(old_size)
+            rmap.clear_bestref_cache_stats()
+
+    def test_rmap_get_best_references_single_lookup(self):
+        r = rmap.get_cached_mapping("data/hst_cos_bpixtab_0252.rmap")
+        header = {'DETECTOR': 'FUV', 'DATE-OBS': '2010-01-01', 'TIME-OBS': '00:00:00'}
+        with mock.patch.object(r, "get_best_ref", wraps=r.get_best_ref) as get_best_ref:
+            self.assertEqual(r.get_best_references(header), {'bpixtab': 'z1r1943fl_bpix.fits'})
+        self.assertEqual(get_best_ref.call_count, 1)
+
+    def test_rmap_lookup_benchmark_cases(self):
+        from crds.tests import bench_rmap_lookup
+        results = bench_rmap_lookup.run_cases(number=1)
+        self.assertEqual(sorted(results), sorted(case[0] for case in bench_rmap_lookup.CASES))
+
+    def test_import_time_benchmark(self):
+        from crds.tests import bench_import_time
+        usecs, times = bench_import_time.run_benchmark(repeat=1)
+        self.assertGreater(usecs, 0)
+        self.assertEqual(bench_import_time.deferred_imports(times), [])
+
+    def test_benchmark_save_and_compare(self):
+        import argparse
+        from crds.tests import bench_util
+        parser = argparse.ArgumentParser()
+        bench_util.add_baseline_arguments(parser)
+        path = os.path.join(self.temp_dir, "baseline.json")
+        args = parser.parse_args(["--save", path])
+        self.assertEqual(bench_util.save_and_compare(args, {"case" : 10.0}, extra=dict(deferred=[])), 0)
+        with open(path) as handle:
+            self.assertEqual(json.load(handle), {"case" : 10.0, "deferred" : []})
+        args = parser.parse_args(["--compare", path, "--tolerance", "0.5"])
+        self.assertEqual(bench_util.save_and_compare(args, {"case" : 14.0}), 0)
+        self.assertEqual(bench_util.save_and_compare(args, {"case" : 16.0}), 1)
+        self.assertEqual(bench_util.save_and_compare(args, {"case" : 10.0}, check=lambda baseline: 1), 1)
+
+    def test_import_crds_attributes(self):
+        import subprocess, sys
+        attributes = ["crds.client", "crds.bestrefs", "crds.api", "crds.rmap", "crds.core.rmap",
+                      "crds.core.heavy_client", "crds.core.utils", "crds.misc.uniqname",
+                      "crds.refactoring.checksum", "crds.client.api.get_default_context",
+                      "crds.bestrefs.BestrefsScript", "crds.getreferences"]
+        script = "import crds\n" + "".join("assert {} is not None\n".format(name) for name in attributes)
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        subprocess.run([sys.executable, "-c", script], check=True,
+                       env=dict(os.environ, PYTHONPATH=root))
+        with self.assertRaises(AttributeError):
+            import crds.core
+            crds.core.no_such_module
+
+    def test_rmap_context_snapshot(self):
+        from crds.core import snapshot
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        pmap = rmap.load_mapping("data/hst.pmap")
+        snapshot_file = os.path.join(self.temp_dir, "hst.pmap.snap")
+        with open(snapshot_file, "wb+") as handle:
+            handle.write(snapshot.dumps(pmap))
+        snap = snapshot.ContextSnapshot.from_file(snapshot_file)
+        self.assertEqual(len(snap.names()), len(pmap.mapping_names()))
+        loaded = snap.load_root()
+        self.assertEqual(snap.loaded_names(), ["hst.pmap"])
+        header = ACS_WFC_HEADER
+        self.assertEqual(loaded.get_best_references(header, include=["biasfile"]),
+                         pmap.get_best_references(header, include=["biasfile"]))
+        self.assertEqual(snap.loaded_names(), ["hst.pmap", "hst_acs.imap", "hst_acs_biasfile.rmap"])
+        self.assertIs(loaded.get_imap("acs"), snap.load("hst_acs.imap"))
+        loaded.force_load()
+        self.assertEqual(loaded.mapping_names(), pmap.mapping_names())
+        self.assertEqual(loaded.reference_names(), pmap.reference_names())
+
+    def test_rmap_context_snapshot_bad_format(self):
+        from crds.core import snapshot
+        with self.assertRaises(SnapshotFormatError):
+            snapshot.ContextSnapshot.from_bytes(b"CRDSSNAP")
+        with self.assertRaises(SnapshotFormatError):
+            snapshot.ContextSnapshot.from_bytes(b"CRDSSNAP" + snapshot._HEADER.pack(99, 0))
+
+    def test_rmap_shared_context_workers(self):
+        import multiprocessing
+        from crds.core import snapshot
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        pmap = rmap.load_mapping("data/hst.pmap")
+        includes = [["biasfile"], ["darkfile"], ["biasfile", "darkfile"], ["biasfile"]]
+        with snapshot.SharedContext(pmap) as shared:
+            with multiprocessing.Pool(2, initializer=snapshot.attach_shared_context,
+                                      initargs=(shared.name,)) as pool:
+                results = pool.map(_shared_context_bestrefs, [(shared.name, include) for include in includes])
+            name = shared.name
+        for include, (pid, bestrefs) in zip(includes, results):
+            self.assertNotEqual(pid, os.getpid())
+            self.assertEqual(bestrefs, pmap.get_best_references(ACS_WFC_HEADER, include=include))
+        with self.assertRaises(SnapshotFormatError):
+            snapshot.attach_shared_context(name)
+
+    def test_rmap_difference_skips_identical_names(self):
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        old = rmap.load_mapping("data/hst.pmap")
+        new = rmap.load_mapping("data/hst.pmap")
+        self.assertEqual(old.difference(new, include_header_diffs=True), [])
+        self.assertEqual(old.selections.loaded_items(), [])
+        self.assertEqual(new.selections.loaded_items(), [])
+
+    def test_rmap_closure_index(self):
+        from crds.core import closure_index
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        os.environ["CRDS_PICKLEPATH_SINGLE"] = self.temp_dir
+        pmap = rmap.load_mapping("hst.pmap")
+        expected = sorted(pmap.mapping_names() + pmap.reference_names())
+        closure_index._get_closure.clear()
+        self.assertEqual(closure_index.get_closure("hst.pmap"), expected)
+        self.assertEqual(len(rmap.list_closure_indexes("*", "hst")), len(pmap.mapping_names()))
+        closure_index._get_closure.clear()
+        with mock.patch.object(rmap, "fetch_mapping") as fetch_mapping:
+            self.assertEqual(closure_index.get_closure("hst.pmap"), expected)
+        fetch_mapping.assert_not_called()
+        closure_index._get_closure.clear()
+
+    def test_rmap_fast_reader_matches_exec(self):
+        for filename in ["hst_acs_biasfile.rmap", "hst_acs_darkfile_comment.rmap", "hst_wfpc2_flatfile.rmap",
+                         "jwst_miri_ipc_0002.rmap", "synphot_thermal.rmap", "hst_acs.imap", "hst.pmap"]:
+            with open(os.path.join(self.data_dir, filename)) as handle:
+                text = handle.read()
+            fast = rmap.Mapping._parse_header_selector(text, filename)
+            with mock.patch.object(config, "FAST_MAPPING_READER", False):
+                slow = rmap.Mapping._parse_header_selector(text, filename)
+            self.assertEqual(dict(fast[0]), dict(slow[0]))
+            self.assertEqual(type(fast[1]), type(slow[1]))
+            if isinstance(slow[1], dict):
+                self.assertEqual(fast[1], slow[1])
+            else:
+                self.assertEqual(fast[1].todict(), slow[1].todict())
+            self.assertEqual(fast[2], slow[2])
+
+    def test_rmap_fast_reader_fallback(self):
+        r = rmap.ReferenceMapping.from_string(str(self._get_rmap()).replace(
+            "'derived_from' : 'hst_wfc3_darkfile_0379.rmap'",
+            "'derived_from' : 'hst_wfc3_darkfile_' '0379.rmap'"), ignore_checksum=True)
+        self.assertEqual(r.header["derived_from"], "hst_wfc3_darkfile_0379.rmap")
+        with self.assertRaises(MappingError):
+            rmap.ReferenceMapping.from_string(str(self._get_rmap()).replace(
+                "'derived_from' : 'hst_wfc3_darkfile_0379.rmap'",
+                "'derived_from' : __import__('os')"), ignore_checksum=True)
+
+    def test_rmap_cached_mapping_threads(self):
+        import threading
+        from concurrent import futures
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        expected = rmap.load_mapping("data/hst.pmap").get_best_references(ACS_WFC_HEADER)
+        utils.clear_function_caches()
+        barrier = threading.Barrier(16)
+        def worker(i):
+            barrier.wait()
+            pmap = rmap.get_cached_mapping("data/hst.pmap")
+            if i % 2:
+                pmap.force_load()
+            return pmap, pmap.get_best_references(ACS_WFC_HEADER)
+        with mock.patch.object(rmap.Mapping, "_read_file", wraps=rmap.Mapping._read_file) as read_file:
+            with futures.ThreadPoolExecutor(16) as pool:
+                results = list(pool.map(worker, range(64)))
+        pmaps = {id(pmap) for (pmap, bestrefs) in results}
+        self.assertEqual(len(pmaps), 1)
+        self.assertEqual([bestrefs for (pmap, bestrefs) in results], [expected] * 64)
+        loaded = [call[0][0] for call in read_file.call_args_list]
+        self.assertEqual(sorted(loaded), sorted(set(loaded)))
+        self.assertEqual(len(loaded), len(results[0][0].mapping_names()))
+
+    def test_rmap_intern_pickled_contexts(self):
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        pmap = rmap.load_mapping("data/hst.pmap")
+        pmap.force_load()
+        pickled = pickle.dumps(pmap)
+        rmap.clear_mapping_intern_stats()
+        old = rmap.intern_context(pickle.loads(pickled))
+        new = rmap.intern_context(pickle.loads(pickled))
+        self.assertIsNot(old.get_imap("acs"), new.get_imap("acs"))
+        self.assertIs(old.get_imap("acs").get_rmap("biasfile"), new.get_imap("acs").get_rmap("biasfile"))
+        self.assertIs(rmap.get_cached_mapping("hst_acs_biasfile.rmap"), old.get_imap("acs").get_rmap("biasfile"))
+        self.assertEqual(new.get_best_references(ACS_WFC_HEADER), pmap.get_best_references(ACS_WFC_HEADER))
+        stats = rmap.get_mapping_intern_stats(sizes=True)
+        self.assertGreaterEqual(stats["shared"], len([name for name in pmap.mapping_names() if name.endswith(".rmap")]))
+        self.assertGreater(stats["bytes_saved"], 0)
+        unverified = rmap.ReferenceMapping.from_string(
+            str(old.get_imap("acs").get_rmap("biasfile")).replace("'ALWAYS'", "'always'"),
+            "hst_acs_biasfile.rmap", ignore_checksum=True)
+        self.assertIs(rmap.intern_mapping(unverified), unverified)
+
+    def test_rmap_split_pickled_context(self):
+        from crds.core import heavy_client
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        os.environ["CRDS_PICKLEPATH_SINGLE"] = self.temp_dir
+        os.environ["CRDS_SPLIT_PICKLED_CONTEXTS"] = "1"
+        pmap = rmap.get_cached_mapping("hst.pmap")
+        heavy_client.save_pickled_mapping("hst.pmap", pmap)
+        self.assertTrue(os.path.exists(config.locate_split_pickle("hst.pmap")))
+        self.assertTrue(os.path.exists(config.locate_pickle("hst_acs.imap")))
+        self.assertFalse(os.path.exists(config.locate_pickle("hst.pmap")))
+        utils.clear_function_caches()
+        with mock.patch.object(rmap.Mapping, "_read_file", side_effect=AssertionError("not pickled")):
+            loaded = heavy_client.load_pickled_mapping("hst.pmap")
+            self.assertEqual(loaded.selections.loaded_items(), [])
+            self.assertEqual(loaded.get_best_references(ACS_WFC_HEADER), pmap.get_best_references(ACS_WFC_HEADER))
+        self.assertEqual([key for (key, value) in loaded.selections.loaded_items()], ["acs"])
+        self.assertIs(loaded.get_imap("acs"), heavy_client.load_pickled_instrument("hst_acs.imap"))
+        os.remove(config.locate_pickle("hst_cos.imap"))
+        self.assertEqual(loaded.get_imap("cos").mapping_names(), pmap.get_imap("cos").mapping_names())
+
+    def test_rmap_parse_cache(self):
+        from crds.core import parse_cache
+        os.environ["CRDS_PICKLEPATH_SINGLE"] = self.temp_dir
+        os.environ["CRDS_MAPPING_PARSE_CACHE"] = "1"
+        with open(self.data("hst_acs_biasfile.rmap")) as handle:
+            text = handle.read()
+        r1 = rmap.ReferenceMapping.from_string(text, "hst_acs_biasfile.rmap")
+        self.assertEqual(rmap.list_parsed_mappings("*", "hst"),
+                         ["hst_acs_biasfile.rmap." + parse_cache.text_sha1(text) + ".pkl"])
+        with mock.patch.object(rmap.Mapping, "_parse_header_selector", side_effect=AssertionError("not cached")):
+            r2 = rmap.ReferenceMapping.from_string(text, "hst_acs_biasfile.rmap")
+        self.assertEqual(str(r2), str(r1))
+        self.assertEqual(r2.reference_names(), r1.reference_names())
+        bad = text.replace("'hst_acs_biasfile.rmap'", "'hst_acs_biasfile_bad.rmap'")
+        with self.assertRaises(ChecksumError):
+            rmap.ReferenceMapping.from_string(bad, "hst_acs_biasfile.rmap")
+        rmap.ReferenceMapping.from_string(bad, "hst_acs_biasfile.rmap", ignore_checksum=True)
+        self.assertEqual(len(rmap.list_parsed_mappings("*", "hst")), 1)
+
+    def test_rmap_cache_mapping_closure(self):
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        pmap = rmap.load_mapping("data/hst.pmap")
+        utils.clear_function_caches()
+        added = rmap.cache_mapping_closure("data/hst.pmap", threads=4)
+        self.assertEqual(sorted(os.path.basename(name) for name in added),
+                         sorted(os.path.basename(name) for name in pmap.mapping_names()))
+        self.assertEqual(rmap.cache_mapping_closure("data/hst.pmap"), [])
+        with mock.patch.object(rmap.Mapping, "_read_file", side_effect=AssertionError("not cached")):
+            loaded = rmap.get_cached_mapping("data/hst.pmap")
+            loaded.force_load()
+        self.assertEqual(loaded.mapping_names(), pmap.mapping_names())
+        self.assertEqual(loaded.reference_names(), pmap.reference_names())
+
+    def test_rmap_cache_mapping_closure_processes(self):
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        utils.clear_function_caches()
+        added = rmap.cache_mapping_closure("hst_acs.imap", processes=2)
+        imap = rmap.get_cached_mapping("hst_acs.imap")
+        self.assertEqual(sorted(os.path.basename(name) for name in added),
+                         sorted(os.path.basename(name) for name in imap.mapping_names()))
+        self.assertIs(imap.get_rmap("biasfile"), rmap.get_cached_mapping("hst_acs_biasfile.rmap"))
+
     def test_rmap_get_parkey_map(self):
         i = rmap.get_cached_mapping("hst_acs.imap")
         i.get_parkey_map() == {'APERTURE': ['*',
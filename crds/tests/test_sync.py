@@ -2,9 +2,11 @@
 a CRDS cache of rules and references.
 """
 import os
+from unittest import mock
 
 import crds
-from crds.core import config, rmap
+from crds.core import config, rmap, utils
+from crds.client import proxy
 from crds.sync import SyncScript
 from crds.tests import test_config
 
@@ -80,6 +82,189 @@ class TestSync(test_config.CRDSTestCase):
         self.assertEqual(rmap.list_references("*", "hst"), ['w3m1716tj_imp.fits', 'w3m17170j_imp.fits', 'w3m17171j_imp.fits'])
         self.assertEqual(rmap.list_mappings("*", "hst"), ['hst_acs_imphttab.rmap'])
 
+    def test_sync_concurrent_downloads(self):
+        from crds.tests import bench_download
+        served_dir, cache_dir = self.temp("served"), self.temp("cache")
+        os.makedirs(served_dir)
+        info_map = bench_download.make_files(served_dir, 6, 5000)
+        with bench_download.StandInServer(served_dir) as stand_in:
+            seconds, n_bytes = bench_download.run_downloads(stand_in.url, info_map, cache_dir, threads=3)
+            self.assertEqual(n_bytes, 6 * 5000)
+            self.assertEqual(sorted(os.listdir(cache_dir)), sorted(info_map))
+            bad = sorted(info_map)[2]
+            info_map[bad] = dict(info_map[bad], sha1sum="0" * 40)
+            seconds, n_bytes = bench_download.run_downloads(
+                stand_in.url, info_map, cache_dir, threads=3, raise_exceptions=False)
+            self.assertEqual(n_bytes, 5 * 5000)
+            self.assertEqual(sorted(os.listdir(cache_dir)), sorted(set(info_map) - {bad}))
+            with self.assertRaises(crds.CrdsDownloadError):
+                bench_download.run_downloads(stand_in.url, info_map, cache_dir, threads=3)
+            self.assertNotIn(bad, os.listdir(cache_dir))
+
+    def test_sync_concurrent_download_progress(self):
+        from crds.client import api
+        from crds.tests import bench_download
+        served_dir, cache_dir = self.temp("served"), self.temp("cache")
+        os.makedirs(served_dir)
+        info_map = {}
+        for size in [399, 427, 358]:
+            info_map.update({ "{}_{}".format(size, name) : info for (name, info) in
+                              bench_download.make_files(served_dir, 1, size).items() })
+            os.rename(os.path.join(served_dir, "bench_00000_ref.fits"),
+                      os.path.join(served_dir, "{}_bench_00000_ref.fits".format(size)))
+        with bench_download.StandInServer(served_dir) as stand_in:
+            with mock.patch.object(api.log, "info") as info:
+                bench_download.run_downloads(stand_in.url, info_map, cache_dir, threads=3)
+        messages = [" ".join(call[0][0].split()) for call in info.call_args_list]
+        self.assertEqual([message.split(" bytes ", 1)[1] for message in messages], [
+            "(1 / 3 files) (0 / 1.2 K bytes)",
+            "(2 / 3 files) (358 / 1.2 K bytes)",
+            "(3 / 3 files) (757 / 1.2 K bytes)"])
+
+    def test_sync_download_streaming_checksum(self):
+        from crds.tests import bench_download
+        served_dir, cache_dir = self.temp("served"), self.temp("cache")
+        os.makedirs(served_dir)
+        info_map = bench_download.make_files(served_dir, 2, 5000)
+        with bench_download.StandInServer(served_dir) as stand_in:
+            with mock.patch.object(utils, "checksum") as checksum:
+                bench_download.run_downloads(stand_in.url, info_map, cache_dir, threads=1)
+            checksum.assert_not_called()
+            self.assertEqual(sorted(os.listdir(cache_dir)), sorted(info_map))
+            bad = sorted(info_map)[0]
+            info_map[bad] = dict(info_map[bad], sha1sum="0" * 40)
+            with self.assertRaises(crds.CrdsDownloadError):
+                bench_download.run_downloads(stand_in.url, info_map, cache_dir, threads=1)
+            self.assertEqual(os.listdir(cache_dir), [])
+
+    def test_sync_download_resumes_partial(self):
+        from crds.tests import bench_download
+        served_dir, cache_dir = self.temp("served"), self.temp("cache")
+        os.makedirs(served_dir)
+        info_map = bench_download.make_files(served_dir, 3, 5000)
+        config.enable_retries(3, 0)
+        try:
+            with bench_download.StandInServer(served_dir, cut_after=2000) as stand_in:
+                seconds, n_bytes = bench_download.run_downloads(stand_in.url, info_map, cache_dir, threads=1)
+        finally:
+            config.disable_retries()
+        self.assertEqual(n_bytes, 3 * 5000)
+        self.assertEqual(sorted(os.listdir(cache_dir)), sorted(info_map))
+        for name in info_map:
+            self.assertEqual(stand_in.ranges[name], [None, "bytes=2000-"])
+            self.assertEqual(utils.checksum(os.path.join(cache_dir, name)), info_map[name]["sha1sum"])
+
+    def test_sync_partial_download_cleanup(self):
+        from crds.client import api
+        from crds.tests import bench_download
+        served_dir, cache_dir = self.temp("served"), self.temp("cache")
+        os.makedirs(served_dir)
+        info_map = bench_download.make_files(served_dir, 1, 5000)
+        info_map["missing_ref.fits"] = dict(size="5000", sha1sum="0" * 40)
+        with bench_download.StandInServer(served_dir) as stand_in:
+            bench_download.run_downloads(stand_in.url, info_map, cache_dir, threads=1, raise_exceptions=False)
+        self.assertEqual(os.listdir(cache_dir), ["bench_00000_ref.fits"])
+        refpath = os.path.dirname(config.locate_file("foo_ref.fits", "hst"))
+        os.makedirs(refpath, exist_ok=True)
+        for name in [".foo_ref.fits.part", ".bar_ref.fits.part"]:
+            with open(os.path.join(refpath, name), "wb") as handle:
+                handle.write(b"partial")
+        parts = rmap.list_references(".*.part", "hst", full_path=True)
+        self.assertEqual([os.path.basename(path) for path in parts], [".bar_ref.fits.part", ".foo_ref.fits.part"])
+        script = SyncScript("crds.sync --purge-references")
+        with open(parts[0], "ab") as in_progress:
+            self.assertTrue(api._lock_file(in_progress))
+            script.remove_partial_downloads(parts)
+        self.assertEqual(rmap.list_references(".*.part", "hst", full_path=True), parts[:1])
+
+    def test_sync_download_reuses_connections(self):
+        from crds.tests import bench_download
+        served_dir, cache_dir = self.temp("served"), self.temp("cache")
+        os.makedirs(served_dir)
+        info_map = bench_download.make_files(served_dir, 4, 5000)
+        proxy.reset_session()
+        with bench_download.StandInServer(served_dir) as stand_in:
+            bench_download.run_downloads(stand_in.url, info_map, cache_dir, threads=1)
+        self.assertEqual(proxy.get_session().counts(), dict(opened=1, reused=3, requests=4))
+        self.assertEqual(sorted(os.listdir(cache_dir)), sorted(info_map))
+
+    def test_sync_rpc_pooled_gzip(self):
+        from crds.tests import bench_download
+        served_dir = self.temp("served")
+        os.makedirs(served_dir)
+        rpc_methods = dict(get_server_info=lambda: dict(observatory="hst"),
+                           get_file_info=lambda context, name: dict(name=name, size="5000"))
+        proxy.reset_session()
+        with bench_download.StandInServer(served_dir, rpc_methods=rpc_methods) as stand_in:
+            service = proxy.CheckingProxy(stand_in.url)
+            self.assertEqual(service.get_server_info(), dict(observatory="hst"))
+            self.assertEqual(service.get_file_info("hst.pmap", "foo.fits"), dict(name="foo.fits", size="5000"))
+            with self.assertRaises(crds.ServiceError):
+                service.get_bogus_info()
+        self.assertEqual(stand_in.calls, ["get_server_info", "get_file_info", "get_bogus_info"])
+        self.assertEqual(proxy.get_session().counts(), dict(opened=1, reused=2, requests=3))
+
+    def test_sync_rpc_batch(self):
+        from crds.tests import bench_download
+        served_dir = self.temp("served")
+        os.makedirs(served_dir)
+        rpc_methods = dict(get_file_info=lambda context, name: dict(name=name))
+        with bench_download.StandInServer(served_dir, rpc_methods=rpc_methods) as stand_in:
+            with proxy.CheckingProxy(stand_in.url)._batch() as batch:
+                calls = [batch.get_file_info("hst.pmap", name) for name in ["a.fits", "b.fits"]]
+                bogus = batch.get_bogus_info()
+            self.assertEqual([call.result() for call in calls], [dict(name="a.fits"), dict(name="b.fits")])
+            with self.assertRaises(crds.ServiceError):
+                bogus.result()
+        self.assertEqual(stand_in.calls, [["get_file_info", "get_file_info", "get_bogus_info"]])
+
+    def test_sync_rpc_batch_unsupported(self):
+        from crds.tests import bench_download
+        served_dir = self.temp("served")
+        os.makedirs(served_dir)
+        rpc_methods = dict(get_file_info=lambda context, name: dict(name=name))
+        with bench_download.StandInServer(served_dir, rpc_methods=rpc_methods, batches=False) as stand_in:
+            try:
+                for _ in range(2):
+                    batch = proxy.CheckingProxy(stand_in.url)._batch()
+                    calls = [batch.get_file_info("hst.pmap", name) for name in ["a.fits", "b.fits"]]
+                    self.assertEqual([call.result() for call in calls], [dict(name="a.fits"), dict(name="b.fits")])
+            finally:
+                proxy._BATCH_UNSUPPORTED.discard(stand_in.url)
+        self.assertEqual(stand_in.calls, ["batch", "get_file_info", "get_file_info", "get_file_info", "get_file_info"])
+
+    def test_sync_rpc_batch_http_errors(self):
+        from crds.tests import bench_download
+        served_dir = self.temp("served")
+        os.makedirs(served_dir)
+        rpc_methods = dict(get_file_info=lambda context, name: dict(name=name))
+        for status, unsupported in [(503, False), (404, True)]:
+            with bench_download.StandInServer(served_dir, rpc_methods=rpc_methods, batch_status=status) as stand_in:
+                try:
+                    batch = proxy.CheckingProxy(stand_in.url)._batch()
+                    calls = [batch.get_file_info("hst.pmap", name) for name in ["a.fits", "b.fits"]]
+                    self.assertEqual([call.result() for call in calls], [dict(name="a.fits"), dict(name="b.fits")])
+                    self.assertEqual(stand_in.url in proxy._BATCH_UNSUPPORTED, unsupported)
+                finally:
+                    proxy._BATCH_UNSUPPORTED.discard(stand_in.url)
+            self.assertEqual(stand_in.calls, ["batch", "get_file_info", "get_file_info"])
+
+    def test_sync_file_info_map_unlimited(self):
+        from crds.client import api
+        from crds.tests import bench_download
+        served_dir = self.temp("served")
+        os.makedirs(served_dir)
+        rpc_methods = dict(get_file_info_map=lambda observatory, files, fields: {
+            name : dict(size="1", fields=fields) for name in files })
+        with bench_download.StandInServer(served_dir, rpc_methods=rpc_methods) as stand_in:
+            with mock.patch.object(api, "S", proxy.CheckingProxy(stand_in.url)), \
+                 mock.patch.object(api, "MAX_FILES_PER_RPC", 2):
+                infos = api.get_file_info_map_unlimited("hst", ["e.fits", "d.fits", "c.fits", "b.fits", "a.fits"],
+                                                        fields=["size", "sha1sum"])
+        self.assertEqual(sorted(infos), ["a.fits", "b.fits", "c.fits", "d.fits", "e.fits"])
+        self.assertEqual(infos["a.fits"], dict(size="1", fields=["sha1sum", "size"]))
+        self.assertEqual(stand_in.calls, [["get_file_info_map"] * 3])
+
 # ==================================================================================
 
 
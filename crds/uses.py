@@ -26,6 +26,7 @@ def load_all_mappings(observatory, pattern="*map"):
     onto the loaded Mapping object.
     """
     all_mappings = rmap.list_mappings(pattern, observatory)
+    rmap.cache_mapping_closure(all_mappings)
     loaded = {}
     for name in all_mappings:
         with log.error_on_exception("Failed loading", repr(name)):